@@ -6,7 +6,13 @@ from sqlmodel import Session, select, func
 from models import VendorInvoice, SyncOperation
 from db.session import get_session
 from api.auth import get_current_user, User
+from core.ai_parser import ai_parser
+from core.ai_scheduler import ai_scheduler
+from core.pdf_renderer import pdf_renderer
+from core.parse_metrics import parse_metrics, summarize_parse_costs
+from datetime import datetime, timedelta
 from typing import Dict, Any
+import asyncio
 
 router = APIRouter()
 
@@ -71,3 +77,72 @@ async def get_dashboard_stats(
         ]
     }
 
+
+
+@router.get("/parse-costs")
+async def get_parse_costs(
+    days: int = 30,
+    by_tier: bool = False,
+    session: Session = Depends(get_session),
+    current_user: User = Depends(get_current_user)
+):
+    """Get parse cost and latency aggregated by vendor and file type (and optionally tier)"""
+    since = datetime.utcnow() - timedelta(days=days)
+    rows = session.exec(
+        select(VendorInvoice.vendor_name, VendorInvoice.extra_metadata)
+        .where(VendorInvoice.created_at >= since)
+    ).all()
+
+    group_by = ("vendor_name", "file_type", "tier") if by_tier else ("vendor_name", "file_type")
+    groups = summarize_parse_costs(
+        ((vendor_name, (metadata or {}).get("parse_metrics")) for vendor_name, metadata in rows),
+        group_by=group_by
+    )
+    return {
+        "days": days,
+        "parses": sum(group["parses"] for group in groups),
+        "total_cost_usd": round(sum(group["total_cost_usd"] for group in groups), 6),
+        "groups": groups,
+    }
+
+
+@router.get("/model-cascade")
+async def get_model_cascade_stats(
+    current_user: User = Depends(get_current_user)
+):
+    """Get per-model latency and fast-model escalation rate since startup"""
+    return parse_metrics.cascade_stats()
+
+
+@router.get("/parse-cache")
+async def get_parse_cache_stats(
+    current_user: User = Depends(get_current_user)
+):
+    """Get AI parse cache hit/miss statistics"""
+    return ai_parser.cache.stats()
+
+
+@router.get("/page-cache")
+async def get_page_cache_stats(
+    current_user: User = Depends(get_current_user)
+):
+    """Get rendered page cache hit/miss statistics"""
+    if pdf_renderer.page_cache is None:
+        return {"enabled": False}
+    return pdf_renderer.page_cache.stats()
+
+
+@router.get("/layout-templates")
+async def get_layout_template_stats(
+    current_user: User = Depends(get_current_user)
+):
+    """Get learned vendor layout template statistics"""
+    return await asyncio.to_thread(ai_parser.templates.stats)
+
+
+@router.get("/ai-scheduler")
+async def get_ai_scheduler_stats(
+    current_user: User = Depends(get_current_user)
+):
+    """Get OpenAI call queue depth, wait time and retry statistics"""
+    return ai_scheduler.stats()
@@ -68,6 +68,13 @@ async def get_current_user(
     return user
 
 
+async def get_current_admin(current_user: User = Depends(get_current_user)) -> User:
+    """Get current user, who must be an admin"""
+    if current_user.role != "admin" and not current_user.is_superuser:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+    return current_user
+
+
 @router.post("/register")
 async def register(
     email: str = Body(...),
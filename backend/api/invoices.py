@@ -2,18 +2,77 @@
 Invoice API endpoints
 """
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Body
+from fastapi.responses import StreamingResponse
 from sqlmodel import Session, select
-from typing import List, Optional
+from typing import Any, AsyncIterator, Dict, List, Optional
+import asyncio
+import json
 from models import VendorInvoice
-from db.session import get_session
+from db.session import get_session, engine
 from api.auth import get_current_user, User
 from services.storage_service import storage_service
 from core.ai_parser import ai_parser
+from core.parse_metrics import invoice_metadata
 from loguru import logger
 
 router = APIRouter()
 
 
+def _apply_parsed_data(invoice: VendorInvoice, parsed_data: Dict[str, Any]):
+    """Copy parse results onto the invoice record"""
+    invoice.invoice_number = parsed_data.get("invoice_number", "PENDING")
+    invoice.vendor_name = parsed_data.get("vendor_name", "PENDING")
+    invoice.invoice_date = parsed_data.get("invoice_date")
+    invoice.due_date = parsed_data.get("due_date")
+    invoice.total_amount = parsed_data.get("total_amount")
+    invoice.tax_amount = parsed_data.get("tax_amount")
+    invoice.subtotal = parsed_data.get("subtotal")
+    invoice.po_numbers = parsed_data.get("po_numbers", [])
+    invoice.line_items = parsed_data.get("line_items", [])
+    invoice.parsed_data = parsed_data
+    invoice.confidence_score = parsed_data.get("confidence", 0.0)
+    invoice.raw_text = parsed_data.get("raw_text", "")
+    invoice.extra_metadata = invoice_metadata(invoice.extra_metadata, parsed_data)
+    invoice.status = "parsed"
+
+
+def _start_parse(file_content: bytes, file_name: str, on_field=None) -> asyncio.Task:
+    """
+    Parse the upload from memory, concurrently with saving it to storage
+
+    The file is validated first so rejected uploads never reach the model.
+    """
+    storage_service.validate_file(file_content, file_name)
+    return asyncio.create_task(ai_parser.parse_invoice(
+        file_content,
+        on_field=on_field,
+        file_type=file_name.split(".")[-1].lower()
+    ))
+
+
+async def _create_invoice_record(session: Session, file_content: bytes, file_name: str) -> VendorInvoice:
+    """Save the uploaded file (off the event loop) and create its pending invoice record"""
+    file_path = await asyncio.to_thread(
+        storage_service.save_file,
+        file_content=file_content,
+        file_name=file_name
+    )
+
+    invoice = VendorInvoice(
+        invoice_number="PENDING",
+        vendor_name="PENDING",
+        file_path=file_path,
+        file_type=file_name.split(".")[-1].lower(),
+        file_size=len(file_content),
+        status="received"
+    )
+
+    session.add(invoice)
+    session.commit()
+    session.refresh(invoice)
+    return invoice
+
+
 @router.post("/upload")
 async def upload_invoice(
     file: UploadFile = File(...),
@@ -25,44 +84,20 @@ async def upload_invoice(
         # Read file content
         file_content = await file.read()
         
-        # Save file
-        file_path = storage_service.save_file(
-            file_content=file_content,
-            file_name=file.filename
-        )
-        
-        # Create invoice record
-        invoice = VendorInvoice(
-            invoice_number="PENDING",
-            vendor_name="PENDING",
-            file_path=file_path,
-            file_type=file.filename.split(".")[-1].lower(),
-            file_size=len(file_content),
-            status="received"
-        )
-        
-        session.add(invoice)
-        session.commit()
-        session.refresh(invoice)
+        # Parse from memory while the file is saved and the record created
+        parse_task = _start_parse(file_content, file.filename)
+        try:
+            invoice = await _create_invoice_record(session, file_content, file.filename)
+        except Exception:
+            parse_task.cancel()
+            raise
         
         # Parse invoice with AI (async)
         try:
-            parsed_data = await ai_parser.parse_invoice(file_path)
+            parsed_data = await parse_task
             
             # Update invoice with parsed data
-            invoice.invoice_number = parsed_data.get("invoice_number", "PENDING")
-            invoice.vendor_name = parsed_data.get("vendor_name", "PENDING")
-            invoice.invoice_date = parsed_data.get("invoice_date")
-            invoice.due_date = parsed_data.get("due_date")
-            invoice.total_amount = parsed_data.get("total_amount")
-            invoice.tax_amount = parsed_data.get("tax_amount")
-            invoice.subtotal = parsed_data.get("subtotal")
-            invoice.po_numbers = parsed_data.get("po_numbers", [])
-            invoice.line_items = parsed_data.get("line_items", [])
-            invoice.parsed_data = parsed_data
-            invoice.confidence_score = parsed_data.get("confidence", 0.0)
-            invoice.raw_text = parsed_data.get("raw_text", "")
-            invoice.status = "parsed"
+            _apply_parsed_data(invoice, parsed_data)
             
             session.add(invoice)
             session.commit()
@@ -86,6 +121,73 @@ async def upload_invoice(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/upload/stream")
+async def upload_invoice_stream(
+    file: UploadFile = File(...),
+    session: Session = Depends(get_session),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Upload and parse invoice, streaming fields as they are extracted
+
+    Responds with newline-delimited JSON events:
+    - {"event": "created", "id": ...}
+    - {"event": "field", "field": "po_numbers", "value": [...]} (one per field)
+    - {"event": "complete", "id": ..., "invoice_number": ..., "status": ..., "confidence": ...}
+    """
+    file_content = await file.read()
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def on_field(field: str, value: Any):
+        await queue.put({"event": "field", "field": field, "value": value})
+
+    # Parse from memory while the file is saved and the record created
+    try:
+        task = _start_parse(file_content, file.filename, on_field=on_field)
+    except ValueError as e:
+        logger.warning(f"Rejected upload {file.filename}: {e}")
+        raise HTTPException(status_code=400, detail=str(e))
+    task.add_done_callback(lambda _: queue.put_nowait(None))
+    try:
+        invoice = await _create_invoice_record(session, file_content, file.filename)
+    except Exception:
+        task.cancel()
+        raise
+    invoice_id = invoice.id
+
+    async def events() -> AsyncIterator[str]:
+        yield json.dumps({"event": "created", "id": invoice_id}) + "\n"
+
+        try:
+            while (event := await queue.get()) is not None:
+                yield json.dumps(event, default=str) + "\n"
+        finally:
+            if not task.done():
+                task.cancel()
+
+        # Session of its own: the request's session may be closed while streaming
+        with Session(engine) as stream_session:
+            stream_invoice = stream_session.get(VendorInvoice, invoice_id)
+            try:
+                _apply_parsed_data(stream_invoice, await task)
+                logger.success(f"Parsed invoice {invoice_id}: {stream_invoice.invoice_number}")
+            except Exception as e:
+                logger.error(f"AI parsing failed for invoice {invoice_id}: {e}")
+                stream_invoice.status = "failed"
+            stream_session.add(stream_invoice)
+            stream_session.commit()
+
+            yield json.dumps({
+                "event": "complete",
+                "id": invoice_id,
+                "invoice_number": stream_invoice.invoice_number,
+                "status": stream_invoice.status,
+                "confidence": stream_invoice.confidence_score
+            }) + "\n"
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+
 @router.get("")
 async def list_invoices(
     skip: int = 0,
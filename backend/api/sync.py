@@ -7,12 +7,15 @@ from pydantic import BaseModel
 from typing import Optional
 from models import VendorInvoice, PlexInvoice, SyncOperation, PurchaseOrder
 from db.session import get_session
-from api.auth import get_current_user, User
+from api.auth import get_current_admin, get_current_user, User
 from core.plex_client import plex_client
 from core.matcher import po_matcher
 from core.learning import learning_system
+from core.learning_replay import MAX_PARTITIONS, rebuild_learning
+from core.po_mirror import po_mirror
 from datetime import datetime, timezone
 from loguru import logger
+import asyncio
 import httpx
 
 router = APIRouter()
@@ -23,12 +26,81 @@ class SyncRequest(BaseModel):
     po_number: str
 
 
+@router.get("/po-mirror")
+async def get_po_mirror_status(
+    current_user: User = Depends(get_current_user)
+):
+    """Get local PO mirror sync status"""
+    return po_mirror.status()
+
+
+@router.post("/po-mirror/refresh")
+async def refresh_po_mirror(
+    full: bool = False,
+    current_user: User = Depends(get_current_user)
+):
+    """Pull PO changes from Plex now (``full`` reloads all open POs)"""
+    try:
+        count = await (po_mirror.full_sync() if full else po_mirror.delta_sync())
+    except httpx.HTTPError as e:
+        logger.error(f"PO mirror refresh failed: {e}")
+        raise HTTPException(status_code=502, detail=f"Failed to fetch purchase orders: {str(e)}")
+    return {"upserted": count, **po_mirror.status()}
+
+
+@router.post("/learning/replay")
+async def replay_learning(
+    partitions: int = 1,
+    dry_run: bool = False,
+    current_user: User = Depends(get_current_admin)
+):
+    """
+    Rebuild learned patterns from sync operation history (admins only)
+
+    ``partitions`` parallel processes, at most one per CPU. This worker
+    reloads at once; the others pick up the counters and correction ring on
+    their next refresh (LEARNING_CACHE_TTL).
+    """
+    if not 1 <= partitions <= MAX_PARTITIONS:
+        raise HTTPException(status_code=400, detail=f"partitions must be between 1 and {MAX_PARTITIONS}")
+    stats = await asyncio.to_thread(rebuild_learning, partitions=partitions, dry_run=dry_run)
+    if not dry_run and learning_system.persist:
+        await asyncio.to_thread(learning_system.load)
+    return stats
+
+
+@router.get("/line-match/{vendor_invoice_id}/{po_number}")
+async def get_line_match(
+    vendor_invoice_id: int,
+    po_number: str,
+    session: Session = Depends(get_session),
+    current_user: User = Depends(get_current_user)
+):
+    """Match invoice lines to PO lines with per-line price and quantity variances"""
+    vendor_invoice = session.get(VendorInvoice, vendor_invoice_id)
+    if not vendor_invoice:
+        raise HTTPException(status_code=404, detail="Vendor invoice not found")
+
+    po = session.exec(select(PurchaseOrder).where(PurchaseOrder.po_number == po_number)).first()
+    if not po:
+        po = await po_mirror.refresh_po(po_number)
+    if not po:
+        raise HTTPException(status_code=404, detail="Purchase order not found")
+
+    return po_matcher.match_line_items(vendor_invoice, po)
+
+
 @router.get("/purchase-order/{po_number}")
 async def get_purchase_order(
     po_number: str,
+    session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user)
 ):
-    """Get purchase order details from Plex"""
+    """Get purchase order details (local mirror first, then Plex)"""
+    po = session.exec(select(PurchaseOrder).where(PurchaseOrder.po_number == po_number)).first()
+    if po is not None and po.plex_data:
+        return po.plex_data
+
     try:
         po_data = await plex_client.get_purchase_order(po_number)
         
@@ -63,6 +135,9 @@ async def sync_invoice(
     
     # Get PO
     po = session.exec(select(PurchaseOrder).where(PurchaseOrder.po_number == request.po_number)).first()
+    if not po:
+        # Created in Plex since the mirror's last poll
+        po = await po_mirror.refresh_po(request.po_number)
     if not po:
         raise HTTPException(status_code=404, detail="Purchase order not found")
     
@@ -117,9 +192,6 @@ async def sync_invoice(
             sync_op.po_type = po.po_type
             sync_op.vendor_pattern = vendor_invoice.vendor_name
             
-            # Learn from sync
-            learning_system.learn_from_sync_operation(sync_op)
-            
             logger.success(f"Successfully synced invoice {vendor_invoice.invoice_number}")
         else:
             sync_op.success = False
@@ -141,6 +213,13 @@ async def sync_invoice(
     session.commit()
     session.refresh(sync_op)
     
+    if sync_op.success:
+        # Learn from the committed sync (its id goes with any corrections);
+        # the invoice's vendor name now maps to the PO's vendor
+        with learning_system.batch():
+            learning_system.learn_from_sync_operation(sync_op)
+            learning_system.learn_vendor_alias(vendor_invoice.vendor_name, po.vendor_name)
+    
     return {
         "success": sync_op.success,
         "sync_operation_id": sync_op.id,
@@ -0,0 +1,141 @@
+"""
+Synthetic invoice corpus for benchmarks
+Digital (text-layer) PDFs, scanned PDFs, multi-page files and TIFFs,
+generated on the fly so benchmarks need no real customer documents
+"""
+from pathlib import Path
+from typing import Dict, List, Tuple
+from PIL import Image, ImageDraw
+
+TextLine = Tuple[float, float, str]  # x, y (PDF points from bottom-left), text
+
+
+def make_text_pdf(path: Path, pages: List[List[TextLine]], width: int = 612, height: int = 792):
+    """Write a PDF with a real text layer (one Helvetica run per line)"""
+    objects: List[bytes] = [b"<< /Type /Catalog /Pages 2 0 R >>", b""]
+    page_refs = []
+    for lines in pages:
+        ops = []
+        for x, y, text in lines:
+            text = text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+            ops.append(f"BT /F1 10 Tf {x} {y} Td ({text}) Tj ET")
+        stream = "\n".join(ops).encode("latin-1")
+        page_number = len(objects) + 1
+        page_refs.append(f"{page_number} 0 R")
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {width} {height}] "
+            f"/Resources << /Font << /F1 FONT 0 R >> >> /Contents {page_number + 1} 0 R >>".encode()
+        )
+        objects.append(b"<< /Length " + str(len(stream)).encode() + b" >>\nstream\n" + stream + b"\nendstream")
+
+    font_number = len(objects) + 1
+    objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    objects = [body.replace(b"FONT", str(font_number).encode()) for body in objects]
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(page_refs)}] /Count {len(page_refs)} >>".encode()
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for offset in offsets:
+        out += f"{offset:010d} 00000 n \n".encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    path.write_bytes(bytes(out))
+
+
+def invoice_lines(number: int, pages: int = 1, rows: int = 25, with_po: bool = True) -> List[List[TextLine]]:
+    """Text lines of a typical vendor invoice, split over ``pages``"""
+    header = [
+        (50, 740, "Acme Industrial Supply Inc."),
+        (50, 726, "100 Industrial Way, Springfield"),
+        (400, 740, f"Invoice Number: INV-{number:05d}"),
+        (400, 726, "Invoice Date: 01/15/2024"),
+        (400, 712, "Due Date: 02/14/2024"),
+    ]
+    if with_po:
+        header.append((400, 698, f"PO Number: PO-{number + 4000}"))
+
+    result: List[List[TextLine]] = []
+    subtotal = 0.0
+    row = 0
+    for page_number in range(1, pages + 1):
+        lines = list(header) if page_number == 1 else [(50, 740, f"Invoice INV-{number:05d} (continued)")]
+        y = 660
+        for _ in range(rows):
+            row += 1
+            amount = 12.5 * row
+            subtotal += amount
+            lines.append((50, y, f"{row:>3}  Widget {row:04d}  qty {row}  @ 12.50  {amount:,.2f}"))
+            y -= 20
+        result.append(lines)
+
+    tax = round(subtotal * 0.08, 2)
+    result[-1] += [
+        (400, 110, f"Subtotal: {subtotal:,.2f}"),
+        (400, 96, f"Tax: {tax:,.2f}"),
+        (400, 82, f"Total Due: {subtotal + tax:,.2f}"),
+    ]
+    return result
+
+
+def render_scan(pages: List[List[TextLine]], dpi: int = 200, skew: float = 0.0) -> List[Image.Image]:
+    """Rasterize text lines the way a scanner would see them"""
+    scale = dpi / 72
+    images = []
+    for lines in pages:
+        image = Image.new("L", (int(612 * scale), int(792 * scale)), 255)
+        draw = ImageDraw.Draw(image)
+        for x, y, text in lines:
+            draw.text((x * scale, (792 - y) * scale), text, fill=0)
+        if skew:
+            image = image.rotate(skew, resample=Image.BICUBIC, fillcolor=255)
+        images.append(image)
+    return images
+
+
+def make_corpus(directory: Path) -> List[Dict[str, str]]:
+    """Write the standard benchmark corpus; returns [{"name", "kind", "path"}]"""
+    directory.mkdir(parents=True, exist_ok=True)
+    corpus = []
+
+    def add(name: str, kind: str, path: Path):
+        corpus.append({"name": name, "kind": kind, "path": str(path)})
+
+    # Digital PDFs: one the text fast path can finish, one that needs the model
+    path = directory / "digital_fast_path.pdf"
+    make_text_pdf(path, invoice_lines(1))
+    add("digital_fast_path", "digital_pdf", path)
+
+    path = directory / "digital_no_po.pdf"
+    make_text_pdf(path, invoice_lines(2, with_po=False))
+    add("digital_no_po", "digital_pdf", path)
+
+    path = directory / "digital_3_pages.pdf"
+    make_text_pdf(path, invoice_lines(3, pages=3, with_po=False))
+    add("digital_3_pages", "multi_page_pdf", path)
+
+    # Scanned PDFs (image only, slightly skewed)
+    scans = render_scan(invoice_lines(4), skew=1.5)
+    path = directory / "scanned_1_page.pdf"
+    scans[0].save(path, resolution=200)
+    add("scanned_1_page", "scanned_pdf", path)
+
+    scans = render_scan(invoice_lines(5, pages=3), skew=-1.0)
+    path = directory / "scanned_3_pages.pdf"
+    scans[0].save(path, save_all=True, append_images=scans[1:], resolution=200)
+    add("scanned_3_pages", "scanned_pdf", path)
+
+    # Uploaded images
+    scans = render_scan(invoice_lines(6, pages=2))
+    path = directory / "fax_2_pages.tiff"
+    scans[0].save(path, save_all=True, append_images=scans[1:], compression="tiff_deflate", dpi=(200, 200))
+    add("fax_2_pages", "tiff", path)
+
+    path = directory / "photo.png"
+    render_scan(invoice_lines(7))[0].save(path)
+    add("photo", "png", path)
+
+    return corpus
@@ -0,0 +1,170 @@
+"""
+Mock OpenAI server
+Minimal OpenAI-compatible /v1/chat/completions endpoint for offline
+benchmarks: fixed latency, canned response, streaming supported
+
+Usage:
+    python benchmarks/mock_openai.py [--port 8089] [--latency-ms 800] [--response canned.json]
+
+Then point the client at it with OPENAI_BASE_URL=http://127.0.0.1:8089/v1
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional
+
+CANNED_RESPONSE = {
+    "invoice_number": "INV-00002",
+    "vendor_name": "Acme Industrial Supply Inc.",
+    "invoice_date": "2024-01-15",
+    "due_date": "2024-02-14",
+    "total_amount": 4387.5,
+    "tax_amount": 325.0,
+    "subtotal": 4062.5,
+    "po_numbers": ["PO-4002"],
+    "line_items": [
+        {"line_number": n, "description": f"Widget {n:04d}", "quantity": n, "unit_price": 12.5, "line_total": 12.5 * n}
+        for n in range(1, 26)
+    ],
+    "confidence": 92,
+}
+
+
+class MockOpenAIServer:
+    """
+    Threaded stub server
+
+    - ``latency_ms``: time to first token
+    - ``tokens_per_second``: generation speed (0 = instant), applied to
+      the canned content at ~4 characters per token
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency_ms: float = 800,
+        tokens_per_second: float = 0,
+        response: Optional[Dict[str, Any]] = None
+    ):
+        self.latency_ms = latency_ms
+        self.tokens_per_second = tokens_per_second
+        self.content = json.dumps(response or CANNED_RESPONSE, indent=2)
+        self.requests = []
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "MockOpenAIServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _usage(self, request_bytes: int) -> Dict[str, int]:
+        # Rough but stable: ~4 bytes per prompt token, ~4 chars per completion token
+        prompt_tokens = request_bytes // 4
+        completion_tokens = len(self.content) // 4
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                server.requests.append({"bytes": length, "stream": bool(body.get("stream"))})
+                time.sleep(server.latency_ms / 1000)
+
+                if body.get("stream"):
+                    self._stream(body, length)
+                else:
+                    self._complete(body, length)
+
+            def _complete(self, body, length):
+                if server.tokens_per_second:
+                    time.sleep(len(server.content) / 4 / server.tokens_per_second)
+                payload = json.dumps({
+                    "id": "chatcmpl-mock",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": body.get("model", "mock"),
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": server.content},
+                        "finish_reason": "stop",
+                    }],
+                    "usage": server._usage(length),
+                }).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _stream(self, body, length):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.end_headers()
+
+                def send(chunk: Dict[str, Any]):
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                    self.wfile.flush()
+
+                base = {"id": "chatcmpl-mock", "object": "chat.completion.chunk",
+                        "created": int(time.time()), "model": body.get("model", "mock")}
+                piece = 16  # ~4 tokens per chunk
+                for start in range(0, len(server.content), piece):
+                    if server.tokens_per_second:
+                        time.sleep(piece / 4 / server.tokens_per_second)
+                    send({**base, "choices": [{
+                        "index": 0,
+                        "delta": {"content": server.content[start:start + piece]},
+                        "finish_reason": None,
+                    }]})
+                if (body.get("stream_options") or {}).get("include_usage"):
+                    send({**base, "choices": [], "usage": server._usage(length)})
+                self.wfile.write(b"data: [DONE]\n\n")
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a mock OpenAI chat completions server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency-ms", type=float, default=800)
+    parser.add_argument("--tokens-per-second", type=float, default=0)
+    parser.add_argument("--response", help="JSON file with the canned extraction result")
+    args = parser.parse_args()
+
+    response = json.loads(open(args.response).read()) if args.response else None
+    server = MockOpenAIServer(args.host, args.port, args.latency_ms, args.tokens_per_second, response)
+    print(f"Mock OpenAI listening on {server.base_url}")
+    server.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
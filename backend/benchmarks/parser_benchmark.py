@@ -0,0 +1,302 @@
+"""
+Parser benchmark
+Runs AIParser.parse_invoice over a synthetic corpus against a local mock
+OpenAI server and reports per-stage cost, so parser changes can be
+compared commit to commit
+
+Usage:
+    python benchmarks/parser_benchmark.py [--repeat 5] [--latency-ms 800] [--concurrency 1]
+        [--stream] [--json results.json] [--compare baseline.json]
+
+Per file it reports text-layer/OCR/render/encode ms, payload bytes,
+estimated image tokens, peak RSS per stage and end-to-end p50/p95
+(plus time to first field with --stream). Nothing leaves the machine.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from corpus import make_corpus
+from mock_openai import MockOpenAIServer
+
+# No credentials needed; never use a real account or cached results
+for _key in ("SECRET_KEY", "JWT_SECRET", "DATABASE_URL", "PLEX_API_URL", "PLEX_API_KEY", "OPENAI_API_KEY"):
+    os.environ.setdefault(_key, "benchmark")
+os.environ.update({
+    "PARSE_CACHE_ENABLED": "false",
+    "PAGE_CACHE_ENABLED": "false",
+    "LAYOUT_TEMPLATES_ENABLED": "false",
+    "OPENAI_REQUESTS_PER_MINUTE": "0",
+    "OPENAI_TOKENS_PER_MINUTE": "0",
+})
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, round(pct / 100 * (len(ordered) - 1)))]
+
+
+def _current_rss_kb() -> Optional[int]:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class Stage:
+    """Times a block and samples its peak RSS (Linux; falls back to ru_maxrss)"""
+
+    def __init__(self):
+        self.ms = 0.0
+        self.peak_rss_kb = 0
+        self._stop = threading.Event()
+
+    def _sample(self):
+        while not self._stop.wait(0.002):
+            self.peak_rss_kb = max(self.peak_rss_kb, _current_rss_kb() or 0)
+
+    def __enter__(self) -> "Stage":
+        self.peak_rss_kb = _current_rss_kb() or 0
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.ms = (time.perf_counter() - self._start) * 1000
+        self._stop.set()
+        self._thread.join()
+        if not self.peak_rss_kb:
+            self.peak_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def measure_stages(entry: Dict[str, str], parser) -> Dict[str, Any]:
+    """Run each pipeline stage in-process, separately timed"""
+    from core.image_encoder import PNG_PROFILE, encode_image, encode_image_bytes, estimate_image_tokens
+    from core.layout_templates import extract_text_layout
+    from core.ocr_engine import OCR_AVAILABLE, _ocr_image
+    from core.pdf_renderer import RENDER_BACKENDS, _count_pages, available_backends
+
+    stages: Dict[str, Any] = {}
+    file_path = entry["path"]
+    images = []
+    encoded = None
+
+    if file_path.endswith(".pdf"):
+        with Stage() as stage:
+            layout = extract_text_layout(file_path, parser.max_pages)
+        stages["text_layer"] = {"ms": round(stage.ms, 2), "peak_rss_mb": round(stage.peak_rss_kb / 1024, 1),
+                                "chars": len(layout.text.strip())}
+
+        backends = available_backends()
+        if backends:
+            render = RENDER_BACKENDS[backends[0]]
+            page_count = min(_count_pages(file_path), parser.max_pages)
+            with Stage() as stage:
+                images = [render(file_path, page, parser.render_dpi) for page in range(1, page_count + 1)]
+            stages["render"] = {"ms": round(stage.ms, 2), "peak_rss_mb": round(stage.peak_rss_kb / 1024, 1),
+                                "backend": backends[0], "pages": page_count}
+
+            # Compare against the PNG pages sent before encoding, not raw bitmaps
+            png_bytes = [len(encode_image(image, PNG_PROFILE).data) for image in images]
+            with Stage() as encode_stage:
+                encoded = [
+                    encode_image(image, parser.encoding, original_bytes=size)
+                    for image, size in zip(images, png_bytes)
+                ]
+    else:
+        data = Path(file_path).read_bytes()
+        with Stage() as encode_stage:
+            encoded = encode_image_bytes(data, parser.encoding, parser.max_pages)
+
+    if encoded is not None:
+        stages["encode"] = {"ms": round(encode_stage.ms, 2), "peak_rss_mb": round(encode_stage.peak_rss_kb / 1024, 1)}
+        stages["payload"] = {
+            "pages": len(encoded),
+            "original_bytes": sum(image.original_bytes for image in encoded),
+            "payload_bytes": sum(len(image.data) for image in encoded),
+            "estimated_image_tokens": sum(estimate_image_tokens(image.width, image.height) for image in encoded),
+        }
+
+    if OCR_AVAILABLE and images:
+        with Stage() as stage:
+            for page_number, image in enumerate(images, start=1):
+                _ocr_image(image, page_number, parser.ocr.lang)
+        stages["ocr"] = {"ms": round(stage.ms, 2), "peak_rss_mb": round(stage.peak_rss_kb / 1024, 1)}
+
+    return stages
+
+
+async def measure_end_to_end(
+    entry: Dict[str, str],
+    parser,
+    repeat: int,
+    concurrency: int,
+    stream: bool
+) -> Dict[str, Any]:
+    """parse_invoice wall time against the mock server"""
+    timings: List[float] = []
+    first_field: List[float] = []
+    result: Dict[str, Any] = {}
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        nonlocal result
+        async with semaphore:
+            start = time.perf_counter()
+            seen_first = False
+
+            async def on_field(field, value):
+                nonlocal seen_first
+                if not seen_first:
+                    seen_first = True
+                    first_field.append((time.perf_counter() - start) * 1000)
+
+            result = await parser.parse_invoice(
+                entry["path"], use_cache=False, on_field=on_field if stream else None
+            )
+            timings.append((time.perf_counter() - start) * 1000)
+
+    with Stage() as stage:
+        await asyncio.gather(*[one() for _ in range(repeat)])
+
+    report = {
+        "runs": len(timings),
+        "p50_ms": round(statistics.median(timings), 2),
+        "p95_ms": round(_percentile(timings, 95), 2),
+        "mean_ms": round(statistics.mean(timings), 2),
+        "throughput_per_s": round(len(timings) / (stage.ms / 1000), 2),
+        "peak_rss_mb": round(stage.peak_rss_kb / 1024, 1),
+        "extraction_method": result.get("extraction_method") or result.get("text_source") or "model",
+        "token_usage": result.get("token_usage"),
+        "error": result.get("error"),
+    }
+    if first_field:
+        report["first_field_p50_ms"] = round(statistics.median(first_field), 2)
+    return report
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=Path(__file__).resolve().parent
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run_benchmark(args) -> Dict[str, Any]:
+    server = MockOpenAIServer(latency_ms=args.latency_ms, tokens_per_second=args.tokens_per_second).start()
+    os.environ["OPENAI_BASE_URL"] = server.base_url
+
+    from core.ai_parser import AIParser
+    from core.pdf_renderer import pdf_renderer
+
+    parser = AIParser()
+    results = []
+    try:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            corpus = make_corpus(Path(temp_dir))
+            # Warm the worker pool so the first file doesn't pay for process start-up
+            await parser.parse_invoice(corpus[0]["path"], use_cache=False)
+
+            for entry in corpus:
+                if args.only and entry["name"] not in args.only:
+                    continue
+                print(f"  {entry['name']} ...", flush=True)
+                results.append({
+                    "name": entry["name"],
+                    "kind": entry["kind"],
+                    "file_bytes": Path(entry["path"]).stat().st_size,
+                    "stages": measure_stages(entry, parser),
+                    "end_to_end": await measure_end_to_end(
+                        entry, parser, args.repeat, args.concurrency, args.stream
+                    ),
+                })
+    finally:
+        pdf_renderer.shutdown()
+        server.stop()
+
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "latency_ms": args.latency_ms,
+            "tokens_per_second": args.tokens_per_second,
+            "repeat": args.repeat,
+            "concurrency": args.concurrency,
+            "stream": args.stream,
+            "model_requests": len(server.requests),
+            "model_request_bytes": sum(request["bytes"] for request in server.requests),
+            "peak_child_rss_mb": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1),
+        },
+        "files": results,
+    }
+
+
+def print_report(report: Dict[str, Any], baseline: Optional[Dict[str, Any]] = None):
+    previous = {entry["name"]: entry for entry in (baseline or {}).get("files", [])}
+
+    print(f"\n{'file':<20}{'method':<16}{'render ms':>10}{'encode ms':>10}{'payload KB':>11}"
+          f"{'img tok':>8}{'p50 ms':>9}{'p95 ms':>9}{'1st field':>10}{'vs base':>9}")
+    for entry in report["files"]:
+        stages = entry["stages"]
+        e2e = entry["end_to_end"]
+        delta = ""
+        if entry["name"] in previous:
+            base = previous[entry["name"]]["end_to_end"]["p50_ms"]
+            delta = f"{(e2e['p50_ms'] - base) / base * 100:+.0f}%" if base else ""
+        print(
+            f"{entry['name']:<20}{e2e['extraction_method']:<16}"
+            f"{stages.get('render', {}).get('ms', '-'):>10}"
+            f"{stages.get('encode', {}).get('ms', '-'):>10}"
+            f"{stages.get('payload', {}).get('payload_bytes', 0) / 1024:>11.1f}"
+            f"{stages.get('payload', {}).get('estimated_image_tokens', '-'):>8}"
+            f"{e2e['p50_ms']:>9}{e2e['p95_ms']:>9}{e2e.get('first_field_p50_ms', '-'):>10}{delta:>9}"
+        )
+    meta = report["meta"]
+    print(f"\nModel requests: {meta['model_requests']} ({meta['model_request_bytes'] / 1024:.0f} KB sent), "
+          f"peak worker RSS {meta['peak_child_rss_mb']} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the invoice parser offline")
+    parser.add_argument("--repeat", type=int, default=5, help="parse_invoice runs per file")
+    parser.add_argument("--concurrency", type=int, default=1, help="Concurrent runs per file")
+    parser.add_argument("--latency-ms", type=float, default=800, help="Mock model time to first token")
+    parser.add_argument("--tokens-per-second", type=float, default=0, help="Mock generation speed (0 = instant)")
+    parser.add_argument("--stream", action="store_true", help="Parse with on_field streaming")
+    parser.add_argument("--only", nargs="*", help="Corpus file names to run")
+    parser.add_argument("--json", help="Write results to this JSON file")
+    parser.add_argument("--compare", help="Baseline JSON from an earlier run")
+    args = parser.parse_args()
+
+    print("Running parser benchmark")
+    report = asyncio.run(run_benchmark(args))
+    baseline = json.loads(Path(args.compare).read_text()) if args.compare else None
+    print_report(report, baseline)
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2))
+        print(f"\nWrote {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+PDF render benchmark
+Compares per-page render latency and peak RSS of each installed backend
+
+Usage:
+    python benchmarks/render_benchmark.py [file.pdf ...] [--dpi 200] [--pages 5] [--repeat 3] [--json out.json]
+
+Each backend runs in a fresh process so peak RSS numbers don't bleed
+into each other. Without input files a synthetic multi-page invoice is
+generated.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Rendering needs no credentials; let the benchmark run without a .env
+for _key in ("SECRET_KEY", "JWT_SECRET", "DATABASE_URL", "PLEX_API_URL", "PLEX_API_KEY", "OPENAI_API_KEY"):
+    os.environ.setdefault(_key, "benchmark")
+
+
+def make_synthetic_pdf(path: Path, pages: int = 3):
+    """Write a text-heavy multi-page PDF resembling an invoice"""
+    from PIL import Image, ImageDraw
+
+    images = []
+    for page_number in range(1, pages + 1):
+        image = Image.new("RGB", (1700, 2200), "white")
+        draw = ImageDraw.Draw(image)
+        draw.text((100, 100), f"INVOICE INV-2024-{page_number:03d}   Page {page_number}/{pages}", fill="black")
+        draw.text((100, 160), "PO Number: PO-2024-100", fill="black")
+        for row in range(60):
+            y = 260 + row * 30
+            draw.text((100, y), f"{row + 1:>3}  Widget {row:04d}  qty 10  @ 12.50  = 125.00", fill="black")
+            draw.line((100, y + 24, 1600, y + 24), fill="gray")
+        images.append(image)
+    images[0].save(path, save_all=True, append_images=images[1:], resolution=200)
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, round(pct / 100 * (len(ordered) - 1)))]
+
+
+def _peak_rss_kb() -> Dict[str, int]:
+    """Peak RSS of this process and its reaped children (KB on Linux)"""
+    return {
+        "self_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "children_kb": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    }
+
+
+def _run_backend(backend: str, files: List[str], dpi: int, max_pages: int, repeat: int, queue):
+    """Render every page ``repeat`` times in-process and report timings"""
+    from core.pdf_renderer import RENDER_BACKENDS, _count_pages
+
+    render_page = RENDER_BACKENDS[backend]
+    baseline = _peak_rss_kb()
+    timings_ms = []
+    pixels = 0
+
+    for file_path in files:
+        page_count = min(_count_pages(file_path), max_pages)
+        for _ in range(repeat):
+            for page_number in range(1, page_count + 1):
+                start = time.perf_counter()
+                image = render_page(file_path, page_number, dpi)
+                timings_ms.append((time.perf_counter() - start) * 1000)
+                pixels += image.width * image.height
+
+    queue.put({
+        "backend": backend,
+        "pages_rendered": len(timings_ms),
+        "page_ms_p50": round(statistics.median(timings_ms), 2),
+        "page_ms_p95": round(_percentile(timings_ms, 95), 2),
+        "page_ms_mean": round(statistics.mean(timings_ms), 2),
+        "avg_megapixels": round(pixels / max(len(timings_ms), 1) / 1e6, 2),
+        "baseline_rss_kb": baseline["self_kb"],
+        "peak_rss_kb": _peak_rss_kb()["self_kb"],
+        "peak_child_rss_kb": _peak_rss_kb()["children_kb"],
+    })
+
+
+def run_benchmark(files: List[str], dpi: int, max_pages: int, repeat: int) -> List[Dict[str, Any]]:
+    from core.pdf_renderer import available_backends
+
+    context = multiprocessing.get_context("spawn")
+    results = []
+    for backend in available_backends():
+        queue = context.Queue()
+        process = context.Process(
+            target=_run_backend,
+            args=(backend, files, dpi, max_pages, repeat, queue)
+        )
+        process.start()
+        results.append(queue.get())
+        process.join()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark PDF render backends")
+    parser.add_argument("files", nargs="*", help="PDF files (default: synthetic invoice)")
+    parser.add_argument("--dpi", type=int, default=200)
+    parser.add_argument("--pages", type=int, default=5, help="Max pages per file")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        files = args.files
+        if not files:
+            synthetic = Path(temp_dir) / "synthetic_invoice.pdf"
+            make_synthetic_pdf(synthetic)
+            files = [str(synthetic)]
+
+        results = run_benchmark(files, args.dpi, args.pages, args.repeat)
+
+    if not results:
+        print("No PDF rendering backend installed (pypdfium2 or pdf2image)")
+        return
+
+    print(f"\n{'backend':<10}{'pages':>7}{'p50 ms':>10}{'p95 ms':>10}{'peak RSS MB':>13}{'child RSS MB':>14}")
+    for r in results:
+        print(
+            f"{r['backend']:<10}{r['pages_rendered']:>7}{r['page_ms_p50']:>10}{r['page_ms_p95']:>10}"
+            f"{r['peak_rss_kb'] / 1024:>13.1f}{r['peak_child_rss_kb'] / 1024:>14.1f}"
+        )
+
+    if args.json:
+        Path(args.json).write_text(json.dumps({"dpi": args.dpi, "results": results}, indent=2))
+        print(f"\nWrote {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -49,12 +49,37 @@ class Settings(BaseSettings):
     plex_po_endpoint: str = "/purchasing/v1/purchase-orders"
     plex_invoice_endpoint: str = "/accounting/v1/ap-invoices"
     plex_vendor_endpoint: str = "/vendors"
+    plex_po_open_status: str = "Open"  # status filter for the bulk load
+    plex_po_modified_since_param: str = "modifiedDateBegin"  # delta query parameter
+
+    # Local PO mirror (bulk load of open POs, then delta polls)
+    po_mirror_enabled: bool = True
+    po_mirror_poll_interval: int = 300  # seconds between delta polls
+    po_mirror_page_size: int = 500
+    po_mirror_concurrency: int = 4  # parallel page fetches
+    po_mirror_batch_size: int = 500  # rows per upsert transaction
+    po_mirror_close_min_ratio: float = 0.5  # skip closing POs if a full load returns fewer than this share of local open POs
+    po_index_in_memory: bool = False  # keep open POs in the matcher's index instead of querying
 
     # OpenAI
     openai_api_key: str
     openai_model: str = "gpt-4o"  # Updated from deprecated gpt-4-vision-preview
     openai_max_tokens: int = 2000
     openai_temperature: float = 0.1
+    openai_requests_per_minute: int = 500  # 0 disables the limit
+    openai_tokens_per_minute: int = 30000  # 0 disables the limit
+    openai_lean_schema: bool = True  # raw_text from local extraction, not model output
+    # USD per million tokens, for per-parse cost estimates
+    openai_prompt_price_per_million: float = 2.50
+    openai_cached_prompt_price_per_million: float = 1.25
+    openai_completion_price_per_million: float = 10.00
+    # Model cascade: the fast model answers first; doubtful answers are
+    # re-run on openai_model ("" disables the cascade)
+    openai_fast_model: str = "gpt-4o-mini"
+    openai_fast_prompt_price_per_million: float = 0.15
+    openai_fast_cached_prompt_price_per_million: float = 0.075
+    openai_fast_completion_price_per_million: float = 0.60
+    model_cascade_required_fields: List[str] = ["invoice_number", "vendor_name", "invoice_date", "total_amount"]
 
     # CORS
     cors_origins: List[str] = ["http://localhost:3000", "http://localhost:5173"]
@@ -73,6 +98,57 @@ class Settings(BaseSettings):
     ai_retry_attempts: int = 2
     ai_timeout_seconds: int = 60
 
+    # PDF Rendering
+    pdf_render_dpi: int = 200
+    pdf_max_pages: int = 5  # pages sent to the model
+    pdf_scan_pages: int = 40  # pages whose text layer is read to pick them
+    page_selection_enabled: bool = True
+    pdf_render_workers: int = 4
+    pdf_render_backend: str = "auto"  # auto, pdfium, poppler
+
+    # Vision payload encoding
+    vision_image_format: str = "jpeg"  # jpeg, webp, png
+    vision_image_quality: int = 75
+    vision_grayscale: bool = True
+    vision_autocrop: bool = True
+    vision_deskew: bool = True
+    vision_token_budget: int = 1105  # image tokens per page
+
+    # Text-layer fast path (skip the AI call for digital PDFs)
+    text_fast_path_enabled: bool = True
+    text_fast_path_min_confidence: float = 90.0
+    text_fast_path_required_fields: List[str] = [
+        "invoice_number", "vendor_name", "invoice_date", "total_amount", "po_numbers"
+    ]
+
+    # Local OCR (Tesseract) for scanned invoices
+    ocr_enabled: bool = True
+    ocr_language: str = "eng"
+    ocr_dpi: int = 300
+    ocr_min_confidence: float = 80.0  # mean word confidence to trust OCR text over vision
+
+    # Layout Templates (learned per-vendor region rules)
+    layout_templates_enabled: bool = True
+    layout_template_path: str = "./storage/layout_templates"  # one JSON file per template
+    layout_template_min_agreement: int = 2  # AI parses that must agree before a rule is used
+    layout_template_min_match: float = 0.8  # share of a template's labels the page must contain
+
+    # Parse Cache (content-addressed AI parse results)
+    parse_cache_enabled: bool = True
+    parse_cache_dir: str = "./storage/parse_cache"
+    parse_cache_max_entries: int = 5000
+
+    # Rendered page cache (encoded pages kept for re-parses and retries)
+    page_cache_enabled: bool = True
+    page_cache_dir: str = "./storage/page_cache"
+    page_cache_max_mb: int = 500
+
+    # Learning System (patterns persisted in the learning_* tables)
+    learning_persist_enabled: bool = True
+    learning_correction_history: int = 1000  # corrections kept (ring buffer)
+    learning_cache_ttl: float = 5.0  # seconds between re-reads of the shared counters
+    learning_replay_chunk_size: int = 5000  # sync_operations rows per fetch when replaying
+
     # Logging
     log_level: str = "INFO"
     log_file: str = "logs/plexsync.log"
@@ -3,25 +3,52 @@ AI Invoice Parser using GPT-4 Vision
 Extracts structured data from PDF/image invoices
 """
 from openai import AsyncOpenAI
-from typing import Dict, Any, List
+from typing import Dict, Any, Awaitable, Callable, List, Optional, Union
 from pathlib import Path
 import base64
 from config import settings
 from loguru import logger
-try:
-    from pdf2image import convert_from_path
-    PDF2IMAGE_AVAILABLE = True
-except ImportError:
-    PDF2IMAGE_AVAILABLE = False
+from core.pdf_renderer import pdf_renderer, PDFSource, RENDERING_AVAILABLE, PYPDF_AVAILABLE
 
-try:
-    from pypdf import PdfReader
-    PYPDF_AVAILABLE = True
-except ImportError:
-    PYPDF_AVAILABLE = False
+import asyncio
+import time
+from core.parse_cache import ParseCache, hash_bytes, hash_file
+from core.text_extractor import fast_path_result
+from core.layout_templates import LayoutTemplateStore, TextBlock, TextLayout, extract_text_layout
+from core.ocr_engine import OCREngine, OCRResult, ocr_engine
+from core.page_selector import select_pages
+from core.image_encoder import EncodedImage, EncodingProfile, encode_image_bytes, estimate_image_tokens
+from core.ai_scheduler import AIScheduler, ai_scheduler
+from core.json_stream import IncrementalJSONDecoder
+from core.parse_metrics import ParseTrace, current_trace, parse_metrics, stage, tracing
+
+# Called with (field, value) as each top-level field of the result is known
+FieldCallback = Callable[[str, Any], Awaitable[None]]
+
+# Invoice file: a path, or its contents already in memory
+InvoiceSource = Union[str, bytes, memoryview]
+
+# Leading bytes of the supported file types, for in-memory sources
+_MAGIC = [
+    (b"%PDF", "pdf"),
+    (b"\x89PNG", "png"),
+    (b"\xff\xd8", "jpg"),
+    (b"II*\x00", "tiff"),
+    (b"MM\x00*", "tiff"),
+]
+
+# Bump whenever the extraction prompt or response handling changes,
+# so cached parse results from the old prompt are not reused
+PROMPT_VERSION = "4"
+
+
+class StreamedCompletion:
+    """Content and usage collected from a streamed chat completion"""
+
+    def __init__(self, content: str, usage: Any = None):
+        self.content = content
+        self.usage = usage
 
-from PIL import Image
-import io
 
 class AIParser:
     """
@@ -37,18 +64,78 @@ class AIParser:
     - Line items
     """
 
-    def __init__(self):
-        self.client = AsyncOpenAI(api_key=settings.openai_api_key)
+    def __init__(self, scheduler: Optional[AIScheduler] = None, ocr: Optional[OCREngine] = None):
+        # Retries and timeouts are owned by the shared scheduler
+        self.client = AsyncOpenAI(api_key=settings.openai_api_key, max_retries=0)
+        self.scheduler = scheduler or ai_scheduler
         self.model = settings.openai_model
+        self.fast_model = settings.openai_fast_model
+        self.cascade_required_fields = settings.model_cascade_required_fields
+        self.low_confidence = settings.low_confidence_threshold
         self.max_tokens = settings.openai_max_tokens
         self.temperature = settings.openai_temperature
+        self.lean_schema = settings.openai_lean_schema
+        self.prompt_version = f"{PROMPT_VERSION}-lean" if self.lean_schema else PROMPT_VERSION
+        self.max_pages = settings.pdf_max_pages
+        self.page_selection = settings.page_selection_enabled
+        self.scan_pages = settings.pdf_scan_pages
+        self.render_dpi = settings.pdf_render_dpi
+        self.encoding = EncodingProfile(
+            format=settings.vision_image_format,
+            quality=settings.vision_image_quality,
+            grayscale=settings.vision_grayscale,
+            autocrop=settings.vision_autocrop,
+            deskew=settings.vision_deskew,
+            token_budget=settings.vision_token_budget
+        )
+        self.ocr = ocr or ocr_engine
+        self.ocr_min_confidence = settings.ocr_min_confidence
+        self.text_fast_path_enabled = settings.text_fast_path_enabled
+        self.text_fast_path_fields = settings.text_fast_path_required_fields
+        self.text_fast_path_min_confidence = settings.text_fast_path_min_confidence
+        self.templates = LayoutTemplateStore(
+            path=settings.layout_template_path,
+            min_agreement=settings.layout_template_min_agreement,
+            min_match=settings.layout_template_min_match,
+            enabled=settings.layout_templates_enabled
+        )
+        self.template_learn_confidence = settings.high_confidence_threshold
+        self.cache = ParseCache(
+            cache_dir=settings.parse_cache_dir,
+            max_entries=settings.parse_cache_max_entries,
+            enabled=settings.parse_cache_enabled
+        )
 
     async def parse_invoice(
         self,
-        file_path: str
+        source: InvoiceSource,
+        use_cache: bool = True,
+        on_field: Optional[FieldCallback] = None,
+        file_type: Optional[str] = None
     ) -> Dict[str, Any]:
         """
-        Parse invoice from file
+        Parse invoice from a file path or in-memory contents
+
+        Uploads and email attachments can be passed as bytes (or a
+        memoryview) so the parse needn't wait for, or re-read, the copy
+        written to storage. ``file_type`` ("pdf", "png", ...) defaults to
+        the path's extension or is sniffed from the contents.
+
+        Digital PDFs whose text layer yields every required field are
+        parsed locally without a model call. Scans are OCR'd locally
+        first; legible OCR text gets the same treatment, or a text-only
+        model call instead of a vision call. Model calls go to the fast
+        model first and are escalated to the full model only when its
+        answer looks doubtful. Results are cached by file content,
+        models and prompt version, so re-sent invoices return without
+        another model call.
+
+        If ``on_field`` is given the model response is streamed and each
+        field is published as soon as it has been generated; fields of
+        cached or fast-path results are published all at once.
+
+        Stage timings, tokens, payload size and the engine tier that
+        produced the result are returned under ``parse_metrics``.
 
         Returns:
             {
@@ -63,69 +150,177 @@ class AIParser:
                 "raw_text": str
             }
         """
+        if on_field is not None:
+            on_field = _FieldPublisher(on_field)
+
+        file_type = (file_type or _file_type(source)).lower().replace(".", "")
+
+        trace = ParseTrace(file_type)
+        with tracing(trace):
+            result = await self._parse_invoice_cached(source, file_type, use_cache, on_field)
+        if trace.tier == "unknown":
+            # Nothing ran past the cache, or the parse failed before choosing a tier
+            trace.tier = "error" if "error" in result else "cache"
+        result["parse_metrics"] = trace.to_dict()
+        parse_metrics.record(trace)
+
+        if on_field is not None:
+            await on_field.publish_remaining(result)
+        return result
+
+    async def _parse_invoice_cached(
+        self,
+        source: InvoiceSource,
+        file_type: str,
+        use_cache: bool,
+        on_field: Optional[FieldCallback] = None
+    ) -> Dict[str, Any]:
+        if not (use_cache and self.cache.enabled):
+            return await self._parse_invoice_uncached(source, file_type, on_field)
+
+        try:
+            with stage("read"):
+                hash_source = hash_file if isinstance(source, str) else hash_bytes
+                file_digest = await asyncio.to_thread(hash_source, source)
+        except OSError as e:
+            logger.error(f"AI parsing failed: {e}")
+            return {
+                "error": str(e),
+                "confidence": 0.0
+            }
+
+        models = f"{self.fast_model}+{self.model}" if self.fast_model else self.model
+        key = self.cache.make_key(file_digest, models, self.prompt_version)
+        return await self.cache.get_or_parse(
+            key,
+            lambda: self._parse_invoice_uncached(source, file_type, on_field, file_digest),
+            should_store=self._is_cacheable
+        )
+
+    @staticmethod
+    def _is_cacheable(result: Dict[str, Any]) -> bool:
+        """Only keep usable results; failures should be retried next time"""
+        return "error" not in result and (result.get("confidence") or 0) > 0
+
+    async def _parse_invoice_uncached(
+        self,
+        source: InvoiceSource,
+        file_type: str,
+        on_field: Optional[FieldCallback] = None,
+        file_digest: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Parse invoice without consulting the cache (``file_digest`` is reused for the page cache)"""
+        # Text read locally; in lean mode it becomes raw_text instead of
+        # asking the model to transcribe the whole invoice
+        local_text = ""
+        # Positioned text blocks, used to learn this vendor's layout
+        blocks: List[TextBlock] = []
+        # Text of each page, used to pick the pages worth sending
+        page_texts: List[str] = []
         try:
-            # Determine file type
-            file_type = Path(file_path).suffix.lower().replace(".", "")
-            
-            # Handle PDF files - convert to image
+            # Read the text layer once: it drives the fast paths and the text fallback
+            text_content = ""
+            text_error = None
+            file_bytes = None
+            with stage("read"):
+                if file_type == "pdf":
+                    if PYPDF_AVAILABLE:
+                        try:
+                            layout = await asyncio.to_thread(self._extract_pdf_layout, source)
+                            text_content = local_text = layout.text
+                            blocks = layout.blocks
+                            page_texts = layout.pages
+                        except Exception as e:
+                            logger.debug(f"PDF text layer unavailable: {e}")
+                            text_error = e
+                elif not isinstance(source, str):
+                    file_bytes = source
+                else:
+                    with open(source, "rb") as f:
+                        file_bytes = f.read()
+
+            # Scans and photos: OCR locally; legible text is parsed like a text layer
+            ocr_text = False
+            if not text_content.strip() and self.ocr.available:
+                with stage("ocr"):
+                    ocr = await self._run_ocr(source, file_type, file_bytes)
+                if ocr:
+                    local_text = ocr.layout.text
+                    if ocr.confidence >= self.ocr_min_confidence:
+                        text_content = ocr.layout.text
+                        blocks = ocr.layout.blocks
+                        page_texts = ocr.layout.pages
+                        text_error = None
+                        ocr_text = True
+
+            # Long PDFs: only pages with invoice content go any further
+            selected_pages = None
+            if file_type == "pdf" and self.page_selection:
+                selected_pages = select_pages(page_texts, self.max_pages)
+                if selected_pages:
+                    text_content = "".join(page_texts[number - 1] + "\n" for number in selected_pages)
+                    blocks = [block for block in blocks if block.page in selected_pages]
+                    logger.debug(f"Selected page(s) {selected_pages} of {len(page_texts)}")
+
+            result = await self._parse_locally(text_content, blocks)
+            if result:
+                if ocr_text:
+                    result["text_source"] = "ocr"
+                return _with_pages(result, selected_pages)
+
+            # Legible OCR text needs only a (much cheaper) text-only call
+            if ocr_text:
+                _set_tier("ocr_text")
+                result = await self._parse_text(text_content, local_text, blocks, on_field)
+                result["text_source"] = "ocr"
+                logger.success(f"Parsed invoice from OCR text: {result.get('invoice_number')}")
+                return _with_pages(result, selected_pages)
+
+            # Handle PDF files - convert pages to images
             if file_type == "pdf":
                 pdf_converted = False
-                # Try pdf2image first (requires Poppler)
-                if PDF2IMAGE_AVAILABLE:
+                # Try rendering first (pypdfium2, or Poppler via pdf2image)
+                if RENDERING_AVAILABLE:
                     try:
-                        # Convert PDF first page to image
-                        images = convert_from_path(file_path, first_page=1, last_page=1, dpi=200)
-                        if not images:
+                        # Render pages in the worker pool (keeps the event loop free)
+                        pages = await pdf_renderer.render_pages(
+                            source,
+                            max_pages=self.max_pages,
+                            dpi=self.render_dpi,
+                            profile=self.encoding,
+                            pages=selected_pages,
+                            file_digest=file_digest
+                        )
+                        if not pages:
                             raise Exception("Failed to convert PDF to image")
-                        
-                        # Convert PIL Image to base64
-                        img_buffer = io.BytesIO()
-                        images[0].save(img_buffer, format='PNG')
-                        img_buffer.seek(0)
-                        file_data = base64.b64encode(img_buffer.read()).decode()
-                        file_type = "png"  # Use PNG format for converted PDFs
+
+                        images = pages
                         pdf_converted = True
-                        logger.debug(f"Converted PDF to PNG image for parsing")
+                        logger.debug(f"Converted {len(images)} PDF page(s) to images for parsing")
                     except Exception as e:
-                        logger.warning(f"pdf2image failed (Poppler may not be installed): {e}")
+                        logger.warning(f"PDF rendering failed: {e}")
                         pdf_converted = False
                 
                 # Fallback: Extract text from PDF and use text-only mode
                 if not pdf_converted:
                     if PYPDF_AVAILABLE:
                         try:
-                            logger.info("Using text extraction fallback for PDF (Poppler not available)")
-                            reader = PdfReader(file_path)
-                            text_content = ""
-                            for page in reader.pages[:3]:  # First 3 pages
-                                text_content += page.extract_text() + "\n"
-                            
+                            logger.info("Using text extraction fallback for PDF (no renderer available)")
+                            if text_error:
+                                raise text_error
+
                             if not text_content.strip():
                                 return {
-                                    "error": "PDF appears to be image-based. Install Poppler for pdf2image to process image PDFs.",
+                                    "error": "PDF appears to be image-based. Install pypdfium2 or Poppler (and Tesseract for local OCR) to process image PDFs.",
                                     "confidence": 0.0
                                 }
                             
                             # Use text-only mode with extracted text
-                            response = await self.client.chat.completions.create(
-                                model=self.model,
-                                messages=[
-                                    {
-                                        "role": "system",
-                                        "content": "You are an expert at extracting structured data from invoices."
-                                    },
-                                    {
-                                        "role": "user",
-                                        "content": self._create_extraction_prompt() + f"\n\nExtract data from this invoice text:\n\n{text_content}"
-                                    }
-                                ],
-                                max_tokens=self.max_tokens,
-                                temperature=self.temperature
-                            )
+                            _set_tier("text_model")
+                            result = await self._parse_text(text_content, local_text, blocks, on_field)
                             
-                            result = self._parse_response(response)
                             logger.success(f"Parsed invoice from PDF text: {result.get('invoice_number')}")
-                            return result
+                            return _with_pages(result, selected_pages)
                             
                         except Exception as e:
                             logger.error(f"PDF text extraction failed: {e}")
@@ -135,47 +330,46 @@ class AIParser:
                             }
                     else:
                         return {
-                            "error": "PDF processing requires either Poppler (for pdf2image) or pypdf (for text extraction). Neither is available.",
+                            "error": "PDF processing requires a renderer (pypdfium2 or Poppler) or pypdf (for text extraction). None is available.",
                             "confidence": 0.0
                         }
             else:
-                # Read image file as base64
-                with open(file_path, "rb") as f:
-                    file_data = base64.b64encode(f.read()).decode()
+                # Re-encode uploaded PNG/JPG/TIFF (TIFF may hold several pages)
+                images = await asyncio.to_thread(
+                    encode_image_bytes, file_bytes, self.encoding, self.max_pages
+                )
 
-            # Create prompt
-            prompt = self._create_extraction_prompt()
+            _set_tier("vision_model")
+            self._log_payload(images)
 
-            # Call GPT-4 Vision
-            response = await self.client.chat.completions.create(
-                model=self.model,
-                messages=[
+            # Call GPT-4 Vision (static instructions first so the prefix can be cached)
+            result = await self._complete_and_parse(
+                [
                     {
                         "role": "system",
-                        "content": "You are an expert at extracting structured data from invoices."
+                        "content": self._create_system_prompt()
                     },
                     {
                         "role": "user",
                         "content": [
-                            {"type": "text", "text": prompt},
                             {
                                 "type": "image_url",
                                 "image_url": {
-                                    "url": f"data:image/{file_type};base64,{file_data}"
+                                    "url": f"data:{image.mime_type};base64,{base64.b64encode(image.data).decode()}"
                                 }
                             }
+                            for image in images
                         ]
                     }
                 ],
-                max_tokens=self.max_tokens,
-                temperature=self.temperature
+                image_tokens=sum(estimate_image_tokens(image.width, image.height) for image in images),
+                on_field=on_field
             )
-
-            # Parse response
-            result = self._parse_response(response)
+            self._fill_raw_text(result, local_text)
+            await self._learn_layout(blocks, result)
 
             logger.success(f"Parsed invoice: {result.get('invoice_number')}")
-            return result
+            return _with_pages(result, selected_pages)
 
         except Exception as e:
             logger.error(f"AI parsing failed: {e}")
@@ -184,10 +378,312 @@ class AIParser:
                 "confidence": 0.0
             }
 
+    async def _parse_locally(self, text_content: str, blocks: List[TextBlock]) -> Optional[Dict[str, Any]]:
+        """Text-layer rules, then learned vendor layouts; None if neither is sure"""
+        # Fast path: machine-generated invoices need no model call
+        if text_content and self.text_fast_path_enabled:
+            result = fast_path_result(
+                text_content,
+                required_fields=self.text_fast_path_fields,
+                min_confidence=self.text_fast_path_min_confidence
+            )
+            if result:
+                _set_tier("text_layer")
+                logger.success(f"Parsed invoice from text layer: {result.get('invoice_number')}")
+                return result
+
+        # Known vendor layout: apply its learned region rules (re-reading
+        # templates other workers saved touches disk, so off the event loop)
+        if blocks:
+            result = await asyncio.to_thread(
+                self.templates.extract, blocks, required_fields=self.text_fast_path_fields
+            )
+            if result:
+                result["raw_text"] = text_content
+                _set_tier("layout_template")
+                logger.success(f"Parsed invoice from layout template: {result.get('invoice_number')}")
+                return result
+        return None
+
+    async def _parse_text(
+        self,
+        text_content: str,
+        local_text: str,
+        blocks: List[TextBlock],
+        on_field: Optional[FieldCallback] = None
+    ) -> Dict[str, Any]:
+        """Text-only model call on extracted (or OCR) text"""
+        trace = current_trace()
+        if trace is not None:
+            trace.payload_bytes += len(text_content.encode())
+        result = await self._complete_and_parse([
+            {
+                "role": "system",
+                "content": self._create_system_prompt()
+            },
+            {
+                "role": "user",
+                "content": f"Extract data from this invoice text:\n\n{text_content}"
+            }
+        ], on_field=on_field)
+        self._fill_raw_text(result, local_text)
+        await self._learn_layout(blocks, result)
+        return result
+
+    async def _run_ocr(
+        self,
+        source: InvoiceSource,
+        file_type: str,
+        file_bytes: Optional[bytes]
+    ) -> Optional[OCRResult]:
+        """OCR a PDF or uploaded image; None if OCR fails"""
+        try:
+            if file_type == "pdf":
+                return await self.ocr.ocr_pdf(source, max_pages=self.max_pages)
+            return await self.ocr.ocr_image(file_bytes, max_pages=self.max_pages)
+        except Exception as e:
+            logger.warning(f"OCR failed: {e}")
+            return None
+
+    async def _complete_and_parse(
+        self,
+        messages: List[Dict[str, Any]],
+        image_tokens: int = 0,
+        on_field: Optional[FieldCallback] = None
+    ) -> Dict[str, Any]:
+        """
+        Model cascade: ask the fast model, escalate doubtful answers
+
+        Streamed fields from an overruled fast answer are corrected by
+        the full model's (changed values are published again).
+        """
+        if not self.fast_model or self.fast_model == self.model:
+            return await self._complete_with(self.model, messages, image_tokens, on_field)
+
+        try:
+            result = await self._complete_with(self.fast_model, messages, image_tokens, on_field)
+            reason = self._escalation_reason(result)
+        except Exception as e:
+            logger.warning(f"Fast model {self.fast_model} failed: {e}")
+            reason = "fast_model_error"
+
+        if reason is None:
+            return result
+
+        logger.info(f"Escalating invoice from {self.fast_model} to {self.model}: {reason}")
+        trace = current_trace()
+        if trace is not None:
+            trace.escalation_reason = reason
+        return await self._complete_with(self.model, messages, image_tokens, on_field)
+
+    def _escalation_reason(self, result: Dict[str, Any]) -> Optional[str]:
+        """Why a fast-model answer can't be trusted; None if it can"""
+        if "error" in result:
+            return "unparseable"
+        if (_amount(result.get("confidence")) or 0) < self.low_confidence:
+            return "low_confidence"
+        if any(result.get(field) in (None, "", []) for field in self.cascade_required_fields):
+            return "missing_fields"
+
+        total = _amount(result.get("total_amount"))
+        subtotal = _amount(result.get("subtotal"))
+        tax = _amount(result.get("tax_amount")) or 0.0
+        if total is not None and subtotal is not None and abs(subtotal + tax - total) > 0.01:
+            return "totals_mismatch"
+
+        line_totals = [_amount(item.get("line_total")) for item in result.get("line_items") or [] if isinstance(item, dict)]
+        expected = subtotal if subtotal is not None else (total - tax if total is not None else None)
+        if line_totals and None not in line_totals and expected is not None:
+            # Allow a cent of rounding per line
+            if abs(sum(line_totals) - expected) > 0.01 * len(line_totals):
+                return "line_items_mismatch"
+        return None
+
+    async def _complete_with(
+        self,
+        model: str,
+        messages: List[Dict[str, Any]],
+        image_tokens: int = 0,
+        on_field: Optional[FieldCallback] = None
+    ) -> Dict[str, Any]:
+        """Run the completion on ``model`` (streamed if fields are wanted early) and parse it"""
+        started = time.perf_counter()
+        response = await self._complete(messages, image_tokens, on_field=on_field, model=model)
+        api_ms = (time.perf_counter() - started) * 1000
+        with stage("decode"):
+            if on_field is None:
+                result = self._parse_response(response)
+            else:
+                result = self._parse_content(response.content)
+
+        token_usage = self._token_usage(response.usage)
+        trace = current_trace()
+        if trace is not None:
+            trace.add_stage("api", api_ms)
+            trace.add_call(model, api_ms, token_usage)
+        if token_usage:
+            result["token_usage"] = token_usage
+            logger.info(
+                f"Token usage ({model}): {token_usage['prompt_tokens']} prompt "
+                f"({token_usage['cached_tokens']} cached), "
+                f"{token_usage['completion_tokens']} completion"
+            )
+        return result
+
+    @staticmethod
+    def _token_usage(usage: Any) -> Optional[Dict[str, int]]:
+        """Prompt/completion/cached token counts from an API usage object"""
+        prompt_tokens = getattr(usage, "prompt_tokens", None)
+        completion_tokens = getattr(usage, "completion_tokens", None)
+        if not isinstance(prompt_tokens, int) or not isinstance(completion_tokens, int):
+            return None
+
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached_tokens = getattr(details, "cached_tokens", None)
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "cached_tokens": cached_tokens if isinstance(cached_tokens, int) else 0,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+
+    async def _learn_layout(self, blocks: List[TextBlock], result: Dict[str, Any]):
+        """Teach the template store from a confident AI parse"""
+        if not blocks or "error" in result:
+            return
+        if (result.get("confidence") or 0) < self.template_learn_confidence:
+            return
+        try:
+            await asyncio.to_thread(self.templates.learn, blocks, result)
+        except Exception as e:
+            logger.warning(f"Layout template learning failed: {e}")
+
+    def _fill_raw_text(self, result: Dict[str, Any], local_text: str):
+        """Lean mode: raw_text comes from local extraction, not the model"""
+        if self.lean_schema and "error" not in result:
+            result.setdefault("raw_text", local_text)
+
+    async def _complete(
+        self,
+        messages: List[Dict[str, Any]],
+        image_tokens: int = 0,
+        on_field: Optional[FieldCallback] = None,
+        model: Optional[str] = None
+    ):
+        """Run a chat completion through the shared scheduler"""
+        model = model or self.model
+        text_chars = 0
+        for message in messages:
+            content = message["content"]
+            if isinstance(content, str):
+                text_chars += len(content)
+            else:
+                text_chars += sum(len(part.get("text", "")) for part in content)
+        # ~4 characters per token, plus the completion budget
+        estimated_tokens = text_chars // 4 + image_tokens + self.max_tokens
+
+        if on_field is not None:
+            return await self.scheduler.run(
+                lambda: self._stream_completion(messages, on_field, model),
+                estimated_tokens=estimated_tokens
+            )
+
+        return await self.scheduler.run(
+            lambda: self.client.chat.completions.create(
+                model=model,
+                messages=messages,
+                max_tokens=self.max_tokens,
+                temperature=self.temperature
+            ),
+            estimated_tokens=estimated_tokens
+        )
+
+    async def _stream_completion(
+        self,
+        messages: List[Dict[str, Any]],
+        on_field: FieldCallback,
+        model: Optional[str] = None
+    ) -> StreamedCompletion:
+        """Stream a completion, publishing each JSON field as it completes"""
+        stream = await self.client.chat.completions.create(
+            model=model or self.model,
+            messages=messages,
+            max_tokens=self.max_tokens,
+            temperature=self.temperature,
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+
+        decoder = IncrementalJSONDecoder()
+        usage = None
+        async for chunk in stream:
+            if chunk.usage is not None:
+                usage = chunk.usage
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            for field, value in decoder.feed(delta or ""):
+                await on_field(field, value)
+
+        return StreamedCompletion(decoder.text, usage)
+
+    @staticmethod
+    def _log_payload(images: List[EncodedImage]):
+        """Log image bytes before/after encoding and add them to the current trace"""
+        before = sum(image.original_bytes for image in images)
+        after = sum(len(image.data) for image in images)
+        trace = current_trace()
+        if trace is not None:
+            trace.pages += len(images)
+            trace.payload_bytes += after
+            if any(image.render_ms for image in images):
+                trace.add_stage("render", sum(image.render_ms for image in images))
+            trace.add_stage("encode", sum(image.encode_ms for image in images))
+        if any(image.raw_bitmap for image in images):
+            # Rendered pages had no file size to compare against
+            logger.info(
+                f"Vision payload: {len(images)} page(s), {after:,} bytes "
+                f"(encoded from {before:,} bytes of raw bitmap)"
+            )
+            return
+        saved = (1 - after / before) * 100 if before else 0.0
+        logger.info(
+            f"Vision payload: {len(images)} page(s), {before:,} -> {after:,} bytes "
+            f"({saved:.0f}% smaller)"
+        )
+
+    def _extract_pdf_layout(self, source: PDFSource) -> TextLayout:
+        """
+        Extract the text layer (with block positions) of the first pages of a PDF
+
+        With page selection on, up to ``scan_pages`` pages are read so the
+        relevant ones can be picked from long documents.
+        """
+        pages = max(self.scan_pages, self.max_pages) if self.page_selection else self.max_pages
+        return extract_text_layout(source, pages)
+
+    def _create_system_prompt(self) -> str:
+        """
+        Static instructions and schema
+
+        Sent first and byte-identical on every call, so the provider can
+        serve it from its prompt cache.
+        """
+        return "You are an expert at extracting structured data from invoices.\n" + self._create_extraction_prompt()
+
     def _create_extraction_prompt(self) -> str:
         """Create extraction prompt for GPT-4"""
+        if self.lean_schema:
+            raw_text_field = ""
+            raw_text_rule = "- Do not transcribe the invoice text; return only the fields above\n"
+        else:
+            raw_text_field = '    "raw_text": "all visible text on invoice",\n'
+            raw_text_rule = ""
+
         return """
-Extract the following information from this invoice image:
+Extract the following information from this invoice.
+Multi-page invoices are sent as one image per page, in page order;
+totals and PO numbers are often on the last page.
 
 1. Invoice Number
 2. Vendor/Supplier Name
@@ -217,8 +713,7 @@ Return the data as a JSON object with this exact structure:
             "line_total": 0.00
         }
     ],
-    "raw_text": "all visible text on invoice",
-    "confidence": 0-100 (your confidence in the extraction)
+""" + raw_text_field + """    "confidence": 0-100 (your confidence in the extraction)
 }
 
 Important:
@@ -226,12 +721,14 @@ Important:
 - For po_numbers, search entire invoice including footer notes
 - For line_items, extract ALL items shown
 - Confidence should reflect clarity of the image and data
-"""
+""" + raw_text_rule
 
     def _parse_response(self, response) -> Dict[str, Any]:
         """Parse GPT-4 response into structured data"""
-        content = response.choices[0].message.content
+        return self._parse_content(response.choices[0].message.content)
 
+    def _parse_content(self, content: str) -> Dict[str, Any]:
+        """Parse model output text into structured data"""
         # Try to extract JSON from response
         import json
         import re
@@ -250,6 +747,72 @@ Important:
         }
 
 
+def _file_type(source: InvoiceSource) -> str:
+    """Extension of a path, or the type sniffed from in-memory contents"""
+    if isinstance(source, str):
+        return Path(source).suffix
+    head = bytes(source[:1024])
+    for magic, file_type in _MAGIC:
+        if head.startswith(magic) or (file_type == "pdf" and magic in head):
+            return file_type
+    return ""
+
+
+def _with_pages(result: Dict[str, Any], selected_pages: Optional[List[int]]) -> Dict[str, Any]:
+    """Record which PDF pages the result was extracted from"""
+    if selected_pages and "error" not in result:
+        result["selected_pages"] = selected_pages
+    return result
+
+
+def _amount(value: Any) -> Optional[float]:
+    """Model output number (or numeric string) as a float"""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return float(value.replace(",", "").replace("$", "").strip())
+        except ValueError:
+            return None
+    return None
+
+
+def _set_tier(tier: str):
+    """Record which engine tier produced the current parse"""
+    trace = current_trace()
+    if trace is not None:
+        trace.tier = tier
+
+
+class _FieldPublisher:
+    """
+    Forwards fields to a caller's callback, once each unless the value
+    changes (an escalated model call correcting the fast model)
+
+    Callback errors are logged, never allowed to fail the parse.
+    """
+
+    def __init__(self, callback: FieldCallback):
+        self.callback = callback
+        self.published: Dict[str, Any] = {}
+
+    async def __call__(self, field: str, value: Any):
+        if field in self.published and self.published[field] == value:
+            return
+        self.published[field] = value
+        try:
+            await self.callback(field, value)
+        except Exception as e:
+            logger.warning(f"Field callback failed for {field}: {e}")
+
+    async def publish_remaining(self, result: Dict[str, Any]):
+        """Publish whatever the stream didn't (cache hits, fast path, fallbacks)"""
+        for field, value in result.items():
+            await self(field, value)
+
+
 # Singleton instance
 ai_parser = AIParser()
 
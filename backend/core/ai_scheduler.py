@@ -0,0 +1,278 @@
+"""
+AI Scheduler - Shared admission control for OpenAI calls
+Bounds concurrency, enforces requests/tokens per minute, applies per-call
+timeouts and retries with jittered backoff that honors Retry-After
+"""
+import asyncio
+import random
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+from config import settings
+from loguru import logger
+
+try:
+    from openai import APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
+    RETRYABLE_ERRORS = (
+        RateLimitError,
+        APITimeoutError,
+        APIConnectionError,
+        InternalServerError,
+        asyncio.TimeoutError,
+    )
+except ImportError:
+    RateLimitError = None
+    RETRYABLE_ERRORS = (asyncio.TimeoutError,)
+
+T = TypeVar("T")
+
+
+class TokenBucket:
+    """
+    Async token bucket refilled continuously at ``per_minute`` / 60 per second
+
+    A rate <= 0 disables the bucket.
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock: Optional[asyncio.Lock] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.capacity > 0
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount: float = 1.0):
+        """Wait until ``amount`` tokens are available, then take them"""
+        if not self.enabled:
+            return
+        # A single request larger than the bucket would otherwise wait forever
+        amount = min(amount, self.capacity)
+
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        # The lock keeps waiters first-come, first-served
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+    def adjust(self, amount: float):
+        """Debit (positive) or refund (negative) tokens after the fact"""
+        if not self.enabled:
+            return
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens - amount)
+
+
+def _retry_after_seconds(error: Exception) -> Optional[float]:
+    """Read Retry-After (or retry-after-ms) from an API error response"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms:
+        try:
+            return float(retry_after_ms) / 1000
+        except ValueError:
+            pass
+
+    retry_after = headers.get("retry-after")
+    if not retry_after:
+        return None
+    try:
+        return float(retry_after)
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class AIScheduler:
+    """
+    Admission control shared by every AI call in the process
+
+    - ``max_concurrency`` calls in flight at once
+    - requests-per-minute and tokens-per-minute token buckets
+    - ``timeout_seconds`` per attempt
+    - up to ``retry_attempts`` retries on 429/5xx/timeouts, using the
+      server's Retry-After when given, else exponential backoff with
+      full jitter; a 429 pauses all callers until the retry time
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 5,
+        requests_per_minute: int = 500,
+        tokens_per_minute: int = 30000,
+        timeout_seconds: float = 60,
+        retry_attempts: int = 2,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0
+    ):
+        self.max_concurrency = max_concurrency
+        self.timeout_seconds = timeout_seconds
+        self.retry_attempts = retry_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute)
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._paused_until = 0.0
+
+        # Metrics
+        self.queue_depth = 0
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.total_wait_ms = 0.0
+        self.max_wait_ms = 0.0
+        self.admitted = 0
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    async def _wait_for_pause(self):
+        delay = self._paused_until - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        retry_after = _retry_after_seconds(error)
+        if retry_after is not None:
+            # Small jitter so paused callers don't all resume on the same tick
+            return min(self.max_delay, retry_after) + random.uniform(0, 0.25)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    async def run(
+        self,
+        call: Callable[[], Awaitable[T]],
+        estimated_tokens: int = 0
+    ) -> T:
+        """
+        Run ``call`` under the scheduler's limits
+
+        Args:
+            call: Zero-argument coroutine factory (called once per attempt)
+            estimated_tokens: Prompt + completion tokens charged up front
+        """
+        attempt = 0
+        while True:
+            result = await self._attempt(call, estimated_tokens, attempt)
+            if not isinstance(result, _Retry):
+                return result
+            attempt += 1
+
+    async def _attempt(self, call, estimated_tokens: int, attempt: int):
+        self.queue_depth += 1
+        queued_at = time.monotonic()
+        try:
+            await self._get_semaphore().acquire()
+        except BaseException:
+            self.queue_depth -= 1
+            raise
+
+        try:
+            try:
+                await self._wait_for_pause()
+                await self.request_bucket.acquire(1)
+                await self.token_bucket.acquire(estimated_tokens)
+            finally:
+                self.queue_depth -= 1
+
+            wait_ms = (time.monotonic() - queued_at) * 1000
+            self.admitted += 1
+            self.total_wait_ms += wait_ms
+            self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+            if wait_ms > 1000:
+                logger.info(f"AI call waited {wait_ms:.0f} ms for capacity (queue depth {self.queue_depth})")
+
+            self.in_flight += 1
+            try:
+                result = await asyncio.wait_for(call(), timeout=self.timeout_seconds)
+            finally:
+                self.in_flight -= 1
+        except RETRYABLE_ERRORS as e:
+            delay = self._backoff(attempt, e)
+            if RateLimitError is not None and isinstance(e, RateLimitError):
+                self.rate_limited += 1
+                self._paused_until = max(self._paused_until, time.monotonic() + delay)
+
+            if attempt >= self.retry_attempts:
+                self.failed += 1
+                logger.error(f"AI call failed after {attempt + 1} attempt(s): {e!r}")
+                raise
+
+            self.retries += 1
+            logger.warning(
+                f"AI call attempt {attempt + 1} failed ({type(e).__name__}); retrying in {delay:.1f}s"
+            )
+        except Exception:
+            self.failed += 1
+            raise
+        else:
+            self.completed += 1
+            self._reconcile_tokens(result, estimated_tokens)
+            return result
+        finally:
+            self._get_semaphore().release()
+
+        # Back off outside the semaphore so other callers can proceed
+        await asyncio.sleep(delay)
+        return _Retry()
+
+    def _reconcile_tokens(self, result: Any, estimated_tokens: int):
+        """Charge the token bucket for actual usage instead of the estimate"""
+        usage = getattr(result, "usage", None)
+        total_tokens = getattr(usage, "total_tokens", None)
+        if isinstance(total_tokens, int):
+            self.token_bucket.adjust(total_tokens - estimated_tokens)
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth, wait time and outcome counters"""
+        return {
+            "queue_depth": self.queue_depth,
+            "in_flight": self.in_flight,
+            "max_concurrency": self.max_concurrency,
+            "completed": self.completed,
+            "failed": self.failed,
+            "retries": self.retries,
+            "rate_limited": self.rate_limited,
+            "avg_wait_ms": round(self.total_wait_ms / self.admitted, 1) if self.admitted else 0.0,
+            "max_wait_ms": round(self.max_wait_ms, 1),
+            "paused_for_seconds": round(max(0.0, self._paused_until - time.monotonic()), 1),
+        }
+
+
+class _Retry:
+    """Sentinel: the attempt failed and should be retried"""
+
+
+# Singleton instance shared by all AI callers
+ai_scheduler = AIScheduler(
+    max_concurrency=settings.max_concurrent_jobs,
+    requests_per_minute=settings.openai_requests_per_minute,
+    tokens_per_minute=settings.openai_tokens_per_minute,
+    timeout_seconds=settings.ai_timeout_seconds,
+    retry_attempts=settings.ai_retry_attempts
+)
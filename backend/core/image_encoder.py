@@ -0,0 +1,229 @@
+"""
+Image Encoder - Shrinks page images before they are sent to the vision model
+Crops blank margins, deskews, converts to grayscale and re-encodes as
+JPEG/WebP sized to a per-page image-token budget
+"""
+import io
+import math
+import time
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+from PIL import Image, ImageOps, ImageSequence
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+# Vision API tiling (high detail): fit in 2048x2048, shortest side <= 768,
+# then 170 tokens per 512px tile plus 85 base tokens
+_MAX_SIDE = 2048
+_MAX_SHORT_SIDE = 768
+_TILE = 512
+_BASE_TOKENS = 85
+_TILE_TOKENS = 170
+
+# Never shrink text below this shortest side, whatever the budget
+_MIN_SHORT_SIDE = 512
+
+
+@dataclass(frozen=True)
+class EncodingProfile:
+    """How page images are prepared for the model"""
+    format: str = "jpeg"  # jpeg, webp, png
+    quality: int = 75
+    grayscale: bool = True
+    autocrop: bool = True
+    deskew: bool = True
+    token_budget: int = 1105  # per page
+
+    @property
+    def mime_type(self) -> str:
+        return f"image/{self.format}"
+
+    @property
+    def key(self) -> str:
+        """Stable identifier, e.g. for caching encoded output"""
+        return (
+            f"{self.format}-q{self.quality}-g{int(self.grayscale)}"
+            f"-c{int(self.autocrop)}-d{int(self.deskew)}-t{self.token_budget}"
+        )
+
+
+# Lossless pass-through, matching what was sent before encoding existed
+PNG_PROFILE = EncodingProfile(
+    format="png", grayscale=False, autocrop=False, deskew=False, token_budget=0
+)
+
+
+@dataclass
+class EncodedImage:
+    """Encoded page ready for a data URL"""
+    data: bytes
+    mime_type: str
+    width: int
+    height: int
+    original_bytes: int  # input size: file bytes, or w*h*bands if raw_bitmap
+    render_ms: float = 0.0
+    encode_ms: float = 0.0
+    raw_bitmap: bool = False  # original_bytes is an uncompressed render, not a file
+
+
+def estimate_image_tokens(width: int, height: int) -> int:
+    """Estimate vision tokens for an image (high detail)"""
+    if width <= 0 or height <= 0:
+        return 0
+    width, height = _api_scaled_size(width, height)
+    tiles = math.ceil(width / _TILE) * math.ceil(height / _TILE)
+    return _BASE_TOKENS + _TILE_TOKENS * tiles
+
+
+def _api_scaled_size(width: int, height: int) -> Tuple[int, int]:
+    """Size the API downsamples an image to before tiling"""
+    scale = min(1.0, _MAX_SIDE / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, _MAX_SHORT_SIDE / min(width, height))
+    return max(1, int(width * scale)), max(1, int(height * scale))
+
+
+def _target_size(width: int, height: int, token_budget: int) -> Tuple[int, int]:
+    """Largest size worth sending that fits the token budget"""
+    width, height = _api_scaled_size(width, height)
+    if token_budget <= 0:
+        return width, height
+
+    while estimate_image_tokens(width, height) > token_budget:
+        if min(width, height) * 0.9 < _MIN_SHORT_SIDE:
+            break
+        width, height = int(width * 0.9), int(height * 0.9)
+    return width, height
+
+
+def _content_box(gray: Image.Image, threshold: int = 32, padding: int = 16) -> Optional[Tuple[int, int, int, int]]:
+    """Bounding box of non-blank content, padded (expects mode L)"""
+    mask = ImageOps.invert(gray).point(lambda p: 255 if p > threshold else 0)
+    bbox = mask.getbbox()
+    if not bbox:
+        return None
+    left, top, right, bottom = bbox
+    return (
+        max(0, left - padding),
+        max(0, top - padding),
+        min(gray.width, right + padding),
+        min(gray.height, bottom + padding),
+    )
+
+
+def _estimate_skew(image: Image.Image, max_angle: float = 5.0) -> float:
+    """
+    Estimate the rotation (degrees, PIL convention) that straightens text
+
+    Projection-profile search: dark pixels are sheared by each candidate
+    angle and the row histogram with the sharpest peaks wins.
+    """
+    if not NUMPY_AVAILABLE:
+        return 0.0
+
+    small = image.copy()
+    small.thumbnail((1000, 1000))
+    # Thin anti-aliased strokes turn gray when downsampled; keep anything not near-white
+    ys, xs = np.nonzero(np.asarray(small) < 200)
+    if len(ys) < 100:
+        return 0.0
+    ys = ys.astype(np.float32)
+    xs = xs.astype(np.float32)
+
+    def score(angle: float) -> float:
+        projected = ys - xs * math.tan(math.radians(angle))
+        rows = np.bincount(np.rint(projected - projected.min()).astype(np.int64))
+        return float(np.square(np.diff(rows.astype(np.float32))).sum())
+
+    # The correct angle gives a very narrow peak, so sweep in quarter
+    # degrees, then refine around the best candidate
+    steps = int(max_angle * 4)
+    best = max((step * 0.25 for step in range(-steps, steps + 1)), key=score)
+    return max((best + step * 0.05 for step in range(-4, 5)), key=score)
+
+
+def encode_image(
+    image: Image.Image,
+    profile: EncodingProfile,
+    original_bytes: Optional[int] = None
+) -> EncodedImage:
+    """
+    Prepare a single page image according to ``profile``
+
+    Without ``original_bytes`` (rendered pages have no file), the raw
+    bitmap size is recorded instead and flagged with ``raw_bitmap``.
+    """
+    started = time.perf_counter()
+    raw_bitmap = original_bytes is None
+    if raw_bitmap:
+        original_bytes = image.width * image.height * len(image.getbands())
+
+    if profile.grayscale:
+        image = image.convert("L")
+    elif image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+
+    # Deskew before cropping so the crop also trims the rotated corners
+    if profile.deskew:
+        gray = image if image.mode == "L" else image.convert("L")
+        angle = _estimate_skew(gray)
+        if abs(angle) >= 0.3:
+            image = image.rotate(angle, resample=Image.BICUBIC, expand=True, fillcolor="white")
+
+    if profile.autocrop:
+        box = _content_box(image if image.mode == "L" else image.convert("L"))
+        if box and box != (0, 0, image.width, image.height):
+            image = image.crop(box)
+
+    if profile.token_budget or profile.format != "png":
+        target = _target_size(image.width, image.height, profile.token_budget)
+        if target != image.size:
+            image = image.resize(target, Image.LANCZOS)
+
+    buffer = io.BytesIO()
+    if profile.format == "jpeg":
+        image.save(buffer, format="JPEG", quality=profile.quality, optimize=True)
+    elif profile.format == "webp":
+        image.save(buffer, format="WEBP", quality=profile.quality, method=4)
+    else:
+        image.save(buffer, format="PNG", optimize=profile.token_budget > 0)
+    data, mime_type = buffer.getvalue(), profile.mime_type
+
+    # Crisp black-on-white text often compresses better as a 16-level
+    # grayscale PNG than as JPEG/WebP; send whichever is smaller
+    if profile.format != "png" and image.mode == "L":
+        buffer = io.BytesIO()
+        image.point(lambda p: (p >> 4) * 17).quantize(16).save(buffer, format="PNG", optimize=True)
+        if buffer.tell() < len(data):
+            data, mime_type = buffer.getvalue(), "image/png"
+
+    return EncodedImage(
+        data=data,
+        mime_type=mime_type,
+        width=image.width,
+        height=image.height,
+        original_bytes=original_bytes,
+        encode_ms=(time.perf_counter() - started) * 1000,
+        raw_bitmap=raw_bitmap,
+    )
+
+
+def encode_image_bytes(
+    data: bytes,
+    profile: EncodingProfile,
+    max_pages: int = 1
+) -> List[EncodedImage]:
+    """
+    Encode an uploaded PNG/JPG/TIFF
+
+    Multi-frame TIFFs yield up to ``max_pages`` pages.
+    """
+    with Image.open(io.BytesIO(data)) as source:
+        frames = [frame.copy() for _, frame in zip(range(max_pages), ImageSequence.Iterator(source))]
+
+    share = len(data) // max(len(frames), 1)
+    return [encode_image(frame, profile, original_bytes=share) for frame in frames]
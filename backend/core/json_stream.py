@@ -0,0 +1,82 @@
+"""
+Incremental JSON Decoder - Decodes a streamed JSON object member by member
+Lets callers act on early fields (invoice number, PO numbers) while the
+model is still generating the long tail (line items, raw text)
+"""
+import json
+from typing import Any, List, Tuple
+from loguru import logger
+
+
+class IncrementalJSONDecoder:
+    """
+    Emits the top-level members of a JSON object as soon as each is complete
+
+    Text before the opening brace (prose, a ```json fence) and after the
+    closing brace is ignored. Nested values are emitted whole.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._member_start = -1
+        self.done = False
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        """Add streamed text; return (key, value) for each member completed by it"""
+        if self.done or not chunk:
+            return []
+
+        self.text += chunk
+        members = []
+        text = self.text
+
+        for index in range(self._pos, len(text)):
+            char = text[index]
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+
+            if self._depth == 0:
+                # Waiting for the object to start
+                if char == "{":
+                    self._depth = 1
+                    self._member_start = index + 1
+                continue
+
+            if char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    members.extend(self._decode_member(self._member_start, index))
+                    self.done = True
+                    self._pos = index + 1
+                    return members
+            elif char == "," and self._depth == 1:
+                members.extend(self._decode_member(self._member_start, index))
+                self._member_start = index + 1
+
+        self._pos = len(text)
+        return members
+
+    def _decode_member(self, start: int, end: int) -> List[Tuple[str, Any]]:
+        member = self.text[start:end].strip()
+        if not member:
+            return []
+        try:
+            return list(json.loads("{" + member + "}").items())
+        except ValueError:
+            logger.debug(f"Skipping undecodable streamed member: {member[:80]}")
+            return []
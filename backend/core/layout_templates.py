@@ -0,0 +1,504 @@
+"""
+Layout Templates - Per-vendor region rules learned from past AI parses
+Recurring vendors send the same layout every time; once a layout has been
+seen and the AI's answers agree with the learned rules, those invoices are
+extracted locally in milliseconds
+"""
+import io
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple, Union
+from loguru import logger
+from core.text_extractor import _AMOUNT, _DATE, _to_amount, _to_iso_date
+
+try:
+    from pypdf import PdfReader
+    PYPDF_AVAILABLE = True
+except ImportError:
+    PYPDF_AVAILABLE = False
+
+TEMPLATE_CONFIDENCE = 95.0
+
+# Field -> value kind
+TEMPLATE_FIELDS = {
+    "invoice_number": "text",
+    "vendor_name": "block",
+    "invoice_date": "date",
+    "due_date": "date",
+    "total_amount": "amount",
+    "tax_amount": "amount",
+    "subtotal": "amount",
+    "po_numbers": "list",
+}
+
+_AMOUNT_RE = re.compile(_AMOUNT)
+_DATE_RE = re.compile(_DATE)
+
+# Fingerprint / matching geometry (page-relative units)
+_COLUMNS = 20
+_SAME_ROW = 0.006
+_ROW_TOLERANCE = 0.012
+_COLUMN_TOLERANCE = 0.15
+_MAX_ABOVE = 0.05
+_MIN_ANCHORS = 5
+
+
+@dataclass
+class TextBlock:
+    """A run of text and where it starts on the page"""
+    text: str
+    page: int  # 1-based
+    x: float   # 0 (left) - 1 (right)
+    y: float   # 0 (top) - 1 (bottom)
+
+
+@dataclass
+class TextLayout:
+    """PDF text layer: plain text plus positioned blocks"""
+    text: str
+    blocks: List[TextBlock]
+    pages: List[str] = field(default_factory=list)  # text of each page, in order
+
+
+def extract_text_layout(source: Union[str, bytes], max_pages: int = 5) -> TextLayout:
+    """Read the text layer of the first pages (PDF path or bytes) with block positions"""
+    reader = PdfReader(source if isinstance(source, str) else io.BytesIO(source))
+    pages: List[str] = []
+    blocks: List[TextBlock] = []
+
+    for page_number, page in enumerate(reader.pages[:max_pages], start=1):
+        box = page.mediabox
+        left, bottom = float(box.left), float(box.bottom)
+        width, height = float(box.width) or 1.0, float(box.height) or 1.0
+
+        def visitor(text, cm, tm, font_dict, font_size, page_number=page_number):
+            text = text.strip()
+            if not text:
+                return
+            # Text space -> user space
+            x = tm[4] * cm[0] + tm[5] * cm[2] + cm[4]
+            y = tm[4] * cm[1] + tm[5] * cm[3] + cm[5]
+            blocks.append(TextBlock(
+                text=text,
+                page=page_number,
+                x=round((x - left) / width, 4),
+                y=round(1 - (y - bottom) / height, 4),
+            ))
+
+        pages.append(page.extract_text(visitor_text=visitor) or "")
+
+    return TextLayout(text="".join(text + "\n" for text in pages), blocks=blocks, pages=pages)
+
+
+def _label(text: str) -> str:
+    """Static part of a block: lowercase words without digits"""
+    words = [word for word in text.lower().split() if not re.search(r"\d", word)]
+    return " ".join(words).strip(" :.#-")
+
+
+def _vendor_key(vendor_name: str) -> str:
+    return re.sub(r"[^a-z0-9]+", " ", vendor_name.lower()).strip()
+
+
+def layout_fingerprint(blocks: List[TextBlock]) -> Set[str]:
+    """
+    Layout tokens: each label with its page and column
+
+    Rows are left out so headers still match when the number of line
+    items pushes the totals down the page.
+    """
+    return {
+        f"{block.page}:{int(block.x * _COLUMNS)}:{label}"
+        for block in blocks
+        for label in [_label(block.text)]
+        if label and len(label) <= 40
+    }
+
+
+def _values_in(block: TextBlock, kind: str) -> List[Any]:
+    """Typed values found in a block"""
+    if kind == "amount":
+        return [_to_amount(match) for match in _AMOUNT_RE.findall(block.text)]
+    if kind == "date":
+        return [iso for iso in (_to_iso_date(match) for match in _DATE_RE.findall(block.text)) if iso]
+    return []
+
+
+def _same_value(kind: str, extracted: Any, expected: Any) -> bool:
+    if extracted is None or expected is None:
+        return False
+    if kind == "amount":
+        try:
+            return abs(float(extracted) - float(expected)) <= 0.01
+        except (TypeError, ValueError):
+            return False
+    if kind == "list":
+        return {str(v).upper() for v in extracted} == {str(v).upper() for v in expected}
+    if kind == "block":
+        return _vendor_key(str(extracted)) == _vendor_key(str(expected))
+    return str(extracted).strip().lower() == str(expected).strip().lower()
+
+
+class LayoutTemplateStore:
+    """
+    Learned layouts, persisted as one JSON file per template in ``path``
+
+    - Each template belongs to one vendor and keeps the layout tokens seen
+      in every sample (stable labels only) plus a region rule per field
+    - A rule locates its value relative to a label ("anchor") block, so it
+      survives totals moving down the page
+    - Every AI parse of a known layout re-checks the rules; a rule is
+      trusted after ``min_agreement`` agreeing samples and replaced when
+      the AI disagrees
+    - Invoices are only extracted locally when the layout matches and
+      every required field's rule is trusted
+
+    Workers sharing ``path`` only rewrite the template they learned from
+    and pick up each other's files when the directory changes. The lock
+    guards the in-memory templates only; disk writes happen outside it.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        min_agreement: int = 2,
+        min_match: float = 0.8,
+        enabled: bool = True
+    ):
+        self.path = Path(path)
+        self.min_agreement = min_agreement
+        self.min_match = min_match
+        self.enabled = enabled
+
+        self._templates: Dict[str, Dict[str, Any]] = {}
+        self._mtimes: Dict[str, int] = {}  # template id -> file mtime when read
+        self._scanned: Optional[int] = None  # directory mtime when last scanned
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.learned = 0
+
+    def _refresh(self):
+        """Re-read template files written since the last scan (by any worker)"""
+        try:
+            scanned = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return
+        except OSError as e:
+            logger.warning(f"Layout template store {self.path} is unreadable: {e}")
+            return
+        if scanned == self._scanned:
+            return
+
+        with self._lock:
+            known = dict(self._mtimes)
+        changed: Dict[str, Tuple[Dict[str, Any], int]] = {}
+        present: Set[str] = set()
+        try:
+            for entry in os.scandir(self.path):
+                if not entry.name.endswith(".json"):
+                    continue
+                template_id = entry.name[:-len(".json")]
+                present.add(template_id)
+                mtime = entry.stat().st_mtime_ns
+                if known.get(template_id) == mtime:
+                    continue
+                try:
+                    with open(entry.path, "r", encoding="utf-8") as f:
+                        changed[template_id] = (json.load(f), mtime)
+                except (OSError, ValueError) as e:
+                    logger.warning(f"Ignoring unreadable layout template {entry.path}: {e}")
+        except OSError as e:
+            logger.warning(f"Layout template store {self.path} is unreadable: {e}")
+            return
+
+        with self._lock:
+            for template_id, (template, mtime) in changed.items():
+                self._templates[template_id] = template
+                self._mtimes[template_id] = mtime
+            for template_id in set(self._mtimes) - present:
+                self._templates.pop(template_id, None)
+                self._mtimes.pop(template_id, None)
+            self._scanned = scanned
+
+    def _save(self, template_id: str):
+        """Write one template's current state (temp file, then rename)"""
+        with self._save_lock:
+            with self._lock:
+                data = json.dumps(self._templates[template_id])
+            self.path.mkdir(parents=True, exist_ok=True)
+            target = self.path / f"{template_id}.json"
+            tmp_path = self.path / f".{template_id}.{uuid.uuid4().hex}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(data)
+            os.replace(tmp_path, target)
+            mtime = target.stat().st_mtime_ns
+            with self._lock:
+                self._mtimes[template_id] = mtime
+
+    @staticmethod
+    def _containment(anchors: List[str], tokens: Set[str]) -> float:
+        return sum(1 for anchor in anchors if anchor in tokens) / len(anchors) if anchors else 0.0
+
+    def _best_template(
+        self,
+        tokens: Set[str],
+        vendor: Optional[str] = None
+    ) -> Tuple[Optional[Dict[str, Any]], float]:
+        best, best_score = None, 0.0
+        for template in self._templates.values():
+            if vendor is not None and template["vendor"] != vendor:
+                continue
+            if vendor is None and len(template["anchors"]) < _MIN_ANCHORS:
+                continue
+            score = self._containment(template["anchors"], tokens)
+            if score > best_score:
+                best, best_score = template, score
+        return best, best_score
+
+    # ---- Extraction ----
+
+    def extract(
+        self,
+        blocks: List[TextBlock],
+        required_fields: List[str]
+    ) -> Optional[Dict[str, Any]]:
+        """Return a parse result if a trusted template matches, else None"""
+        if not self.enabled or not blocks:
+            return None
+
+        started = time.perf_counter()
+        self._refresh()
+        with self._lock:
+            template, score = self._best_template(layout_fingerprint(blocks))
+            if template is None or score < self.min_match:
+                self.misses += 1
+                return None
+
+            rules = template["rules"]
+            if any(rules.get(field, {}).get("agreements", 0) < self.min_agreement for field in required_fields):
+                logger.debug(f"Layout {template['id']} matched but is not trusted yet")
+                self.misses += 1
+                return None
+
+            result: Dict[str, Any] = {field: None for field in TEMPLATE_FIELDS}
+            result["po_numbers"] = []
+            field_confidence: Dict[str, float] = {}
+            for field, rule in rules.items():
+                if rule["agreements"] < self.min_agreement:
+                    continue
+                value = self._apply_rule(rule, blocks)
+                if value not in (None, []):
+                    result[field] = value
+                    field_confidence[field] = TEMPLATE_CONFIDENCE
+
+            if any(field not in field_confidence for field in required_fields):
+                self.misses += 1
+                return None
+            self.hits += 1
+
+        logger.info(
+            f"Layout template {template['id']} ({template['vendor_name']}) matched "
+            f"{score:.0%} in {(time.perf_counter() - started) * 1000:.1f} ms"
+        )
+        return {
+            **result,
+            "line_items": [],
+            "confidence": TEMPLATE_CONFIDENCE,
+            "field_confidence": field_confidence,
+            "extraction_method": "layout_template",
+            "layout_template": template["id"],
+        }
+
+    def _apply_rule(self, rule: Dict[str, Any], blocks: List[TextBlock]) -> Any:
+        block = self._locate(rule, blocks)
+        if block is None:
+            return None
+
+        kind = rule["kind"]
+        if kind in ("amount", "date"):
+            values = _values_in(block, kind)
+            return values[rule["match_index"]] if len(values) > rule["match_index"] else None
+
+        tokens = block.text.split()
+        if kind == "block":
+            return block.text.strip()
+        if kind == "text":
+            value = " ".join(tokens[rule["token_start"]:rule["token_start"] + rule["token_count"]])
+            return value.strip(",;") or None
+        # list: every digit-bearing token from the learned start
+        return [token.strip(",;") for token in tokens[rule["token_start"]:] if re.search(r"\d", token)]
+
+    @staticmethod
+    def _locate(rule: Dict[str, Any], blocks: List[TextBlock]) -> Optional[TextBlock]:
+        """Find the value block: via its anchor label, else by position"""
+        page_blocks = [block for block in blocks if block.page == rule["page"]]
+        anchors = [block for block in page_blocks if rule["anchor"] and _label(block.text) == rule["anchor"]]
+
+        if anchors:
+            anchor = min(anchors, key=lambda block: abs(block.y - rule["anchor_y"]))
+            if rule["same_block"]:
+                return anchor
+            target_x, target_y = anchor.x + rule["dx"], anchor.y + rule["dy"]
+        elif rule["anchor"]:
+            return None
+        else:
+            target_x, target_y = rule["x"], rule["y"]
+
+        candidates = [
+            block for block in page_blocks
+            if abs(block.y - target_y) <= _ROW_TOLERANCE and abs(block.x - target_x) <= _COLUMN_TOLERANCE
+        ]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda block: abs(block.y - target_y) * 4 + abs(block.x - target_x))
+
+    # ---- Learning ----
+
+    def learn(self, blocks: List[TextBlock], result: Dict[str, Any]):
+        """Update (or create) the template for this layout from an AI parse"""
+        if not self.enabled or not blocks or not result.get("vendor_name"):
+            return
+
+        vendor = _vendor_key(str(result["vendor_name"]))
+        tokens = layout_fingerprint(blocks)
+        self._refresh()
+        with self._lock:
+            template, score = self._best_template(tokens, vendor=vendor)
+            if template is None or score < 0.5:
+                template = {
+                    "id": uuid.uuid4().hex[:12],
+                    "vendor": vendor,
+                    "vendor_name": result["vendor_name"],
+                    "anchors": sorted(tokens),
+                    "rules": {},
+                    "samples": 0,
+                }
+                self._templates[template["id"]] = template
+            else:
+                # Keep only labels present in every sample (drops line item text)
+                template["anchors"] = sorted(set(template["anchors"]) & tokens)
+
+            for field, kind in TEMPLATE_FIELDS.items():
+                expected = result.get(field)
+                if expected in (None, "", []):
+                    continue
+                rule = template["rules"].get(field)
+                if rule and _same_value(kind, self._apply_rule(rule, blocks), expected):
+                    rule["agreements"] += 1
+                    continue
+
+                new_rule = self._derive_rule(kind, expected, blocks)
+                if new_rule is None:
+                    template["rules"].pop(field, None)
+                    continue
+                new_rule["conflicts"] = rule["conflicts"] + 1 if rule else 0
+                template["rules"][field] = new_rule
+
+            template["samples"] += 1
+            template["updated_at"] = time.time()
+            self.learned += 1
+
+        try:
+            self._save(template["id"])
+        except OSError as e:
+            logger.warning(f"Failed to save layout template {template['id']}: {e}")
+
+    def _derive_rule(self, kind: str, expected: Any, blocks: List[TextBlock]) -> Optional[Dict[str, Any]]:
+        """Build a rule from the block that holds ``expected``"""
+        found = self._find_value(kind, expected, blocks)
+        if found is None:
+            return None
+        block, rule = found
+        rule.update({
+            "kind": kind,
+            "page": block.page,
+            "x": block.x,
+            "y": block.y,
+            "agreements": 1,
+        })
+
+        # The block labels itself ("Invoice #: 123"), or the nearest label to
+        # the left on the same row / just above anchors it
+        own_label = _label(block.text)
+        if own_label or kind == "block":
+            rule.update({"anchor": own_label, "anchor_y": block.y, "same_block": True, "dx": 0.0, "dy": 0.0})
+        else:
+            anchor = self._nearest_label(block, blocks)
+            rule.update({
+                "anchor": _label(anchor.text) if anchor else "",
+                "anchor_y": anchor.y if anchor else block.y,
+                "same_block": False,
+                "dx": round(block.x - anchor.x, 4) if anchor else 0.0,
+                "dy": round(block.y - anchor.y, 4) if anchor else 0.0,
+            })
+        return rule
+
+    @staticmethod
+    def _find_value(kind: str, expected: Any, blocks: List[TextBlock]) -> Optional[Tuple[TextBlock, Dict[str, Any]]]:
+        if kind in ("amount", "date"):
+            for block in blocks:
+                for index, value in enumerate(_values_in(block, kind)):
+                    if _same_value(kind, value, expected):
+                        return block, {"match_index": index}
+            return None
+
+        if kind == "block":
+            for block in blocks:
+                if _same_value(kind, block.text, expected):
+                    return block, {}
+            return None
+
+        wanted = [str(value) for value in expected] if kind == "list" else [str(expected)]
+        for block in blocks:
+            tokens = [token.strip(",;") for token in block.text.split()]
+            first = wanted[0].split()
+            for start in range(len(tokens) - len(first) + 1):
+                if [t.upper() for t in tokens[start:start + len(first)]] == [t.upper() for t in first]:
+                    return block, {"token_start": start, "token_count": len(first)}
+        return None
+
+    @staticmethod
+    def _nearest_label(block: TextBlock, blocks: List[TextBlock]) -> Optional[TextBlock]:
+        """Closest labeled block on the same row to the left, or just above"""
+        candidates = []
+        for other in blocks:
+            if other is block or other.page != block.page or not _label(other.text):
+                continue
+            same_row = abs(other.y - block.y) <= _SAME_ROW and other.x < block.x
+            above = 0 < block.y - other.y <= _MAX_ABOVE and abs(other.x - block.x) <= _COLUMN_TOLERANCE
+            if same_row or above:
+                candidates.append(other)
+        if not candidates:
+            return None
+        return min(candidates, key=lambda other: abs(other.y - block.y) * 4 + abs(other.x - block.x))
+
+    def stats(self) -> Dict[str, Any]:
+        """Template counts and hit/miss counters"""
+        if self.enabled:
+            self._refresh()
+        with self._lock:
+            templates = list(self._templates.values()) if self.enabled else []
+            trusted = sum(
+                1 for template in templates
+                if template["rules"] and all(rule["agreements"] >= self.min_agreement for rule in template["rules"].values())
+            )
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "templates": len(templates),
+            "vendors": len({template["vendor"] for template in templates}),
+            "trusted_templates": trusted,
+            "hits": self.hits,
+            "misses": self.misses,
+            "learned": self.learned,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
@@ -1,10 +1,71 @@
 """
 Learning System - Learns from user corrections to improve matching
+Patterns live in memory for lookups and are persisted incrementally
+(counter upserts, a fixed-size correction ring) so a restart reloads
+them instead of starting from nothing
 """
-from typing import Dict, Any, List
-from models import SyncOperation
+import asyncio
+import threading
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Callable, Dict, Any, Iterator, List, Optional
+from sqlalchemy import update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlmodel import Session, select
+from config import settings
+from models import SyncOperation, POTypePattern, VendorPattern, VendorAlias, CorrectionRecord, LearningCounter
+from core.po_index import ContainmentIndex
+from core.vendor_names import canonicalize_vendor, vendor_names
 from loguru import logger
 
+# LearningCounter bumped by every replay, so workers know to re-read the ring
+REPLAY_GENERATION = "replay_generation"
+
+# Memoized vendor adjustments kept between refreshes
+_MAX_VENDOR_LOOKUPS = 10000
+
+
+def _upsert(
+    session: Session,
+    model,
+    key: Dict[str, Any],
+    increments: Optional[Dict[str, int]] = None,
+    values: Optional[Dict[str, Any]] = None,
+    returning: Optional[str] = None
+):
+    """
+    INSERT a row, or set ``values`` and add ``increments`` to the existing
+    one atomically; returns the ``returning`` column's new value
+    """
+    increments, values = increments or {}, values or {}
+    dialect = postgresql if session.get_bind().dialect.name == "postgresql" else sqlite
+    table = model.__table__
+    now = datetime.now(timezone.utc)
+    statement = dialect.insert(table).values(**key, **increments, **values, created_at=now, updated_at=now)
+    statement = statement.on_conflict_do_update(
+        index_elements=list(key),
+        set_={
+            **{column: table.c[column] + amount for column, amount in increments.items()},
+            **values,
+            "updated_at": now
+        }
+    )
+    if returning is None:
+        session.execute(statement)
+        return None
+    return session.execute(statement.returning(table.c[returning])).scalar_one()
+
+
+def _po_type_adjustment(pattern: Dict[str, int]) -> float:
+    if pattern["total_count"] > 0:
+        success_rate = pattern["success_count"] / pattern["total_count"]
+        if success_rate > 0.9:
+            return 5.0
+        if success_rate < 0.5:
+            return -5.0
+    return 0.0
+
 
 class LearningSystem:
     """
@@ -13,28 +74,225 @@ class LearningSystem:
     - Successful matches
     - Failed matches
     - PO type patterns
-    - Vendor patterns
+    - Vendor patterns (keyed by canonical vendor name)
+
+    Only the last ``history_size`` corrections are kept. With ``persist``
+    every update is also written to the learning_* tables, and ``load``
+    rebuilds the patterns from them. The tables are shared by all workers:
+    increments are atomic upserts, and each worker re-reads the counters
+    every ``cache_ttl`` seconds (``start``), so all of them see the same
+    rates. Confidence adjustments are precomputed per PO type and memoized
+    per vendor name, so lookups are dictionary hits. Updates made inside
+    ``batch`` (e.g. one sync operation) are written in one transaction.
     """
 
-    def __init__(self):
+    def __init__(
+        self,
+        engine=None,
+        history_size: int = 1000,
+        persist: bool = False,
+        cache_ttl: float = 5.0
+    ):
+        self._engine = engine
+        self.persist = persist
+        self.cache_ttl = cache_ttl
+        self.running = False
+        self.task: Optional[asyncio.Task] = None
+        self.last_refresh: Optional[datetime] = None
         self.patterns: Dict[str, Any] = {
             "vendor_patterns": {},
             "po_type_patterns": {},
-            "correction_history": []
+            "correction_history": deque(maxlen=max(1, int(history_size))),
+            "vendor_aliases": vendor_names.aliases
         }
+        # Trigram index over vendor_patterns keys, for misspelled lookups
+        self._vendor_index = ContainmentIndex()
+        self._po_type_adjustments: Dict[str, float] = {}
+        self._vendor_adjustments: Dict[Optional[str], float] = {}
+        self._replay_generation: Optional[int] = None
+        self._lock = threading.Lock()
+        self._pending = threading.local()
+
+    @property
+    def engine(self):
+        if self._engine is None:
+            from db.session import engine
+            self._engine = engine
+        return self._engine
+
+    def refresh(self, reload_history: bool = False):
+        """
+        Replace the in-memory counters and aliases with the shared tables'
+        (one row per pattern). The correction ring is re-read too after a
+        replay rewrote it (or with ``reload_history``).
+        """
+        history = self.patterns["correction_history"]
+        with Session(self.engine) as session:
+            po_types = session.exec(select(POTypePattern)).all()
+            vendors = session.exec(select(VendorPattern)).all()
+            aliases = session.exec(select(VendorAlias)).all()
+            generation = session.exec(
+                select(LearningCounter.value).where(LearningCounter.name == REPLAY_GENERATION)
+            ).first() or 0
+            corrections = None
+            if reload_history or generation != self._replay_generation:
+                corrections = session.exec(
+                    select(CorrectionRecord).order_by(CorrectionRecord.sequence.desc()).limit(history.maxlen)
+                ).all()
+
+        po_type_patterns = {
+            row.po_type: {"success_count": row.success_count, "total_count": row.total_count}
+            for row in po_types
+        }
+        vendor_patterns = {
+            row.vendor: {"correction_count": row.correction_count, "common_corrections": row.common_corrections or {}}
+            for row in vendors
+        }
+        alias_table = {row.alias: row.vendor for row in aliases}
+        vendor_index = ContainmentIndex()
+        for vendor in vendor_patterns:
+            vendor_index.add(vendor, 0)
+
+        with self._lock:
+            self.patterns["po_type_patterns"] = po_type_patterns
+            self.patterns["vendor_patterns"] = vendor_patterns
+            self._vendor_index = vendor_index
+            if alias_table != vendor_names.aliases:
+                vendor_names.aliases.clear()
+                vendor_names.aliases.update(alias_table)
+            self._po_type_adjustments = {
+                po_type: _po_type_adjustment(pattern) for po_type, pattern in po_type_patterns.items()
+            }
+            self._vendor_adjustments = {}
+            if corrections is not None:
+                history.clear()
+                history.extend({
+                    "sync_op_id": row.sync_op_id,
+                    "corrections": row.corrections,
+                    "po_type": row.po_type,
+                    "vendor_pattern": row.vendor_pattern
+                } for row in reversed(corrections))
+            self._replay_generation = generation
+        self.last_refresh = datetime.now(timezone.utc)
+
+    def load(self):
+        """Warm start: shared counters plus the newest corrections"""
+        self.refresh(reload_history=True)
+        logger.info(
+            f"Loaded learning patterns: {len(self.patterns['po_type_patterns'])} PO type(s), "
+            f"{len(self.patterns['vendor_patterns'])} vendor(s), {len(vendor_names.aliases)} alias(es), "
+            f"{len(self.patterns['correction_history'])} correction(s)"
+        )
+
+    async def _refresh_loop(self):
+        """Re-read the shared counters every cache_ttl seconds"""
+        while self.running:
+            await asyncio.sleep(self.cache_ttl)
+            try:
+                await asyncio.to_thread(self.refresh)
+            except Exception as e:
+                logger.error(f"Error refreshing learning patterns: {e}")
+
+    def start(self):
+        """Start refreshing the local read cache (persisted patterns only)"""
+        if self.running or not self.persist:
+            return
+        self.running = True
+        self.task = asyncio.create_task(self._refresh_loop())
+
+    def stop(self):
+        """Stop refreshing the local read cache"""
+        if not self.running:
+            return
+        self.running = False
+        if self.task:
+            self.task.cancel()
+
+    @contextmanager
+    def batch(self) -> Iterator[None]:
+        """Persist every update made inside the block in one transaction"""
+        if getattr(self._pending, "writes", None) is not None:
+            # Nested: the outermost batch writes
+            yield
+            return
+        self._pending.writes = []
+        try:
+            yield
+        finally:
+            writes, self._pending.writes = self._pending.writes, None
+        self._write(writes)
+
+    def _save(self, write: Callable[[Session], Any]):
+        """Run ``write(session)`` now, or with the rest of the open batch"""
+        if not self.persist:
+            return
+        writes = getattr(self._pending, "writes", None)
+        if writes is not None:
+            writes.append(write)
+        else:
+            self._write([write])
+
+    def _write(self, writes: List[Callable[[Session], Any]]):
+        """Run the writes in one transaction; learning never fails a sync"""
+        if not writes:
+            return
+        try:
+            with Session(self.engine) as session:
+                for write in writes:
+                    write(session)
+                session.commit()
+        except Exception as e:
+            logger.error(f"Failed to persist learning patterns: {e}")
+
+    def _find_vendor(self, vendor_name: Optional[str]) -> Optional[str]:
+        """Key of the learned vendor pattern for ``vendor_name``, if any"""
+        vendor = vendor_names.canonical(vendor_name)
+        if not vendor:
+            return None
+        if vendor in self.patterns["vendor_patterns"]:
+            return vendor
+        similar = self._vendor_index.similar(vendor)
+        return max(similar, key=similar.get) if similar else None
+
+    def learn_vendor_alias(self, alias: str, vendor_name: str):
+        """Remember that ``alias`` (e.g. an invoice's vendor name) is ``vendor_name``"""
+        if vendor_names.add_alias(alias, vendor_name):
+            logger.info(f"Learned vendor alias: {alias} -> {vendor_name}")
+            self._vendor_adjustments = {}
+            source = canonicalize_vendor(alias)
+            self._save(lambda session: self._save_alias(session, source, vendor_names.aliases[source]))
+
+    @staticmethod
+    def _save_alias(session: Session, source: str, target: str):
+        # As in VendorNames.add_alias, aliases of the alias now point at the target
+        session.execute(update(VendorAlias).where(VendorAlias.vendor == source).values(vendor=target))
+        _upsert(session, VendorAlias, {"alias": source}, values={"vendor": target})
 
     def learn_from_sync_operation(self, sync_op: SyncOperation):
         """
-        Learn from a sync operation
+        Learn from a sync operation (persisted in one transaction)
 
         Args:
-            sync_op: Completed sync operation
+            sync_op: Completed sync operation, already committed so its id
+                is recorded with any corrections
         """
         if not sync_op.success:
             logger.info("Learning from failed sync operation")
-            self._learn_from_failure(sync_op)
         else:
             logger.info("Learning from successful sync operation")
+        with self.batch():
+            self.apply_sync_operation(sync_op)
+
+    def apply_sync_operation(self, sync_op: SyncOperation):
+        """
+        Update patterns from one sync operation, without logging (replays)
+
+        Args:
+            sync_op: Sync operation, or a row with the same fields
+        """
+        if not sync_op.success:
+            self._learn_from_failure(sync_op)
+        else:
             self._learn_from_success(sync_op)
 
         # Learn from user corrections
@@ -51,6 +309,12 @@ class LearningSystem:
                 }
             self.patterns["po_type_patterns"][sync_op.po_type]["success_count"] += 1
             self.patterns["po_type_patterns"][sync_op.po_type]["total_count"] += 1
+            self._po_type_adjustments[sync_op.po_type] = _po_type_adjustment(
+                self.patterns["po_type_patterns"][sync_op.po_type]
+            )
+            self._save(lambda session: _upsert(
+                session, POTypePattern, {"po_type": sync_op.po_type}, {"success_count": 1, "total_count": 1}
+            ))
 
     def _learn_from_failure(self, sync_op: SyncOperation):
         """Learn from failed sync operations"""
@@ -61,27 +325,52 @@ class LearningSystem:
                     "total_count": 0
                 }
             self.patterns["po_type_patterns"][sync_op.po_type]["total_count"] += 1
+            self._po_type_adjustments[sync_op.po_type] = _po_type_adjustment(
+                self.patterns["po_type_patterns"][sync_op.po_type]
+            )
+            self._save(lambda session: _upsert(
+                session, POTypePattern, {"po_type": sync_op.po_type}, {"success_count": 0, "total_count": 1}
+            ))
 
     def _learn_from_corrections(self, sync_op: SyncOperation):
         """Learn from user corrections"""
         corrections = sync_op.user_corrections
 
-        # Store correction for pattern analysis
-        self.patterns["correction_history"].append({
+        # Store correction for pattern analysis (oldest dropped past history_size)
+        record = {
             "sync_op_id": sync_op.id,
             "corrections": corrections,
             "po_type": sync_op.po_type,
             "vendor_pattern": sync_op.vendor_pattern
-        })
+        }
+        history = self.patterns["correction_history"]
+        with self._lock:
+            history.append(record)
+
+        def save_correction(session: Session):
+            # The sequence is shared so workers don't overwrite each other's slots
+            sequence = _upsert(
+                session, LearningCounter, {"name": "correction_sequence"}, {"value": 1}, returning="value"
+            ) - 1
+            _upsert(
+                session, CorrectionRecord, {"slot": sequence % history.maxlen}, values={"sequence": sequence, **record}
+            )
+        self._save(save_correction)
 
         # Update vendor patterns
-        if sync_op.vendor_pattern:
-            if sync_op.vendor_pattern not in self.patterns["vendor_patterns"]:
-                self.patterns["vendor_patterns"][sync_op.vendor_pattern] = {
+        vendor = vendor_names.canonical(sync_op.vendor_pattern)
+        if vendor:
+            if vendor not in self.patterns["vendor_patterns"]:
+                self.patterns["vendor_patterns"][vendor] = {
                     "correction_count": 0,
                     "common_corrections": {}
                 }
-            self.patterns["vendor_patterns"][sync_op.vendor_pattern]["correction_count"] += 1
+                self._vendor_index.add(vendor, 0)
+            self.patterns["vendor_patterns"][vendor]["correction_count"] += 1
+            self._vendor_adjustments = {}
+            self._save(lambda session: _upsert(
+                session, VendorPattern, {"vendor": vendor}, {"correction_count": 1}
+            ))
 
     def get_confidence_adjustment(
         self,
@@ -94,24 +383,22 @@ class LearningSystem:
         Returns:
             Adjustment factor (-10 to +10)
         """
-        adjustment = 0.0
+        vendor_adjustment = self._vendor_adjustments.get(vendor_pattern)
+        if vendor_adjustment is None:
+            vendor_adjustment = self._vendor_adjustment(vendor_pattern)
+        return self._po_type_adjustments.get(po_type, 0.0) + vendor_adjustment
 
-        # Check PO type success rate
-        if po_type in self.patterns["po_type_patterns"]:
-            pattern = self.patterns["po_type_patterns"][po_type]
-            if pattern["total_count"] > 0:
-                success_rate = pattern["success_count"] / pattern["total_count"]
-                if success_rate > 0.9:
-                    adjustment += 5.0
-                elif success_rate < 0.5:
-                    adjustment -= 5.0
-
-        # Check vendor pattern corrections
-        if vendor_pattern in self.patterns["vendor_patterns"]:
-            pattern = self.patterns["vendor_patterns"][vendor_pattern]
+    def _vendor_adjustment(self, vendor_pattern: Optional[str]) -> float:
+        """Resolve and memoize the vendor part of get_confidence_adjustment"""
+        adjustment = 0.0
+        vendor = self._find_vendor(vendor_pattern)
+        if vendor is not None:
+            pattern = self.patterns["vendor_patterns"][vendor]
             if pattern["correction_count"] > 3:
-                adjustment -= 3.0
-
+                adjustment = -3.0
+        if len(self._vendor_adjustments) >= _MAX_VENDOR_LOOKUPS:
+            self._vendor_adjustments = {}
+        self._vendor_adjustments[vendor_pattern] = adjustment
         return adjustment
 
     def get_recommendations(self, invoice_data: Dict[str, Any]) -> Dict[str, Any]:
@@ -132,8 +419,9 @@ class LearningSystem:
 
         # Analyze vendor pattern
         vendor_name = invoice_data.get("vendor_name", "")
-        if vendor_name in self.patterns["vendor_patterns"]:
-            pattern = self.patterns["vendor_patterns"][vendor_name]
+        vendor = self._find_vendor(vendor_name)
+        if vendor is not None:
+            pattern = self.patterns["vendor_patterns"][vendor]
             if pattern["correction_count"] > 5:
                 recommendations["warnings"].append(
                     f"Vendor {vendor_name} has high correction rate"
@@ -143,5 +431,9 @@ class LearningSystem:
 
 
 # Singleton instance
-learning_system = LearningSystem()
+learning_system = LearningSystem(
+    history_size=settings.learning_correction_history,
+    persist=settings.learning_persist_enabled,
+    cache_ttl=settings.learning_cache_ttl
+)
 
@@ -0,0 +1,202 @@
+"""
+Learning Replay - Rebuilds learned patterns from sync_operations history
+Rows are streamed in server-side chunks and folded into a fresh
+LearningSystem in one pass (memory grows with the number of patterns, not
+rows); large tables can be split into id ranges replayed in parallel
+processes and merged
+"""
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from sqlalchemy import create_engine, delete, func
+from sqlmodel import Session, select
+from config import settings
+from models import SyncOperation, POTypePattern, VendorPattern, CorrectionRecord, LearningCounter
+from core.learning import REPLAY_GENERATION, LearningSystem, _upsert
+from loguru import logger
+
+# Upper bound on replay processes
+MAX_PARTITIONS = os.cpu_count() or 1
+
+# Only the fields the learning logic reads
+REPLAY_COLUMNS = (
+    SyncOperation.id,
+    SyncOperation.success,
+    SyncOperation.po_type,
+    SyncOperation.vendor_pattern,
+    SyncOperation.user_corrections,
+)
+
+
+def stream_sync_operations(
+    session: Session,
+    low: Optional[int] = None,
+    high: Optional[int] = None,
+    chunk_size: int = 5000
+) -> Iterator[Any]:
+    """Sync operation rows with low <= id < high, in id order, ``chunk_size`` at a time"""
+    query = select(*REPLAY_COLUMNS).order_by(SyncOperation.id)
+    if low is not None:
+        query = query.where(SyncOperation.id >= low)
+    if high is not None:
+        query = query.where(SyncOperation.id < high)
+    # yield_per streams from a server-side cursor instead of buffering the result
+    yield from session.execute(query.execution_options(yield_per=chunk_size))
+
+
+def replay_range(
+    engine,
+    low: Optional[int] = None,
+    high: Optional[int] = None,
+    history_size: int = 1000,
+    chunk_size: int = 5000
+) -> Tuple[LearningSystem, int, int]:
+    """(patterns, rows replayed, corrections seen) for one id range"""
+    learning = LearningSystem(history_size=history_size)
+    rows = corrections = 0
+    with Session(engine) as session:
+        for row in stream_sync_operations(session, low, high, chunk_size):
+            learning.apply_sync_operation(row)
+            rows += 1
+            if row.user_corrections:
+                corrections += 1
+    return learning, rows, corrections
+
+
+def _replay_partition(
+    database_url: str,
+    low: int,
+    high: int,
+    history_size: int,
+    chunk_size: int
+) -> Dict[str, Any]:
+    """Process-pool worker: replay one id range on its own connection"""
+    engine = create_engine(database_url)
+    try:
+        learning, rows, corrections = replay_range(engine, low, high, history_size, chunk_size)
+    finally:
+        engine.dispose()
+    return {
+        "po_type_patterns": learning.patterns["po_type_patterns"],
+        "vendor_patterns": learning.patterns["vendor_patterns"],
+        "correction_history": list(learning.patterns["correction_history"]),
+        "rows": rows,
+        "corrections": corrections,
+    }
+
+
+def _merge(learning: LearningSystem, partial: Dict[str, Any]):
+    """Add a later id range's counters and corrections to ``learning``"""
+    for po_type, counts in partial["po_type_patterns"].items():
+        pattern = learning.patterns["po_type_patterns"].setdefault(po_type, {"success_count": 0, "total_count": 0})
+        pattern["success_count"] += counts["success_count"]
+        pattern["total_count"] += counts["total_count"]
+    for vendor, counts in partial["vendor_patterns"].items():
+        if vendor not in learning.patterns["vendor_patterns"]:
+            learning.patterns["vendor_patterns"][vendor] = {"correction_count": 0, "common_corrections": {}}
+        learning.patterns["vendor_patterns"][vendor]["correction_count"] += counts["correction_count"]
+    learning.patterns["correction_history"].extend(partial["correction_history"])
+
+
+def _partition_bounds(engine, partitions: int) -> List[Tuple[int, int]]:
+    """Contiguous id ranges [low, high) of about equal width"""
+    with Session(engine) as session:
+        low, high = session.exec(select(func.min(SyncOperation.id), func.max(SyncOperation.id))).one()
+    if low is None:
+        return []
+    width = (high - low) // partitions + 1
+    return [(start, min(start + width, high + 1)) for start in range(low, high + 1, width)]
+
+
+def store(engine, learning: LearningSystem, corrections_seen: int):
+    """Replace the persisted counters and correction ring with ``learning``'s (aliases are kept)"""
+    history = learning.patterns["correction_history"]
+    first_sequence = corrections_seen - len(history)
+    with Session(engine) as session:
+        for model in (POTypePattern, VendorPattern, CorrectionRecord):
+            session.execute(delete(model))
+        session.add_all(
+            POTypePattern(po_type=po_type, **counts)
+            for po_type, counts in learning.patterns["po_type_patterns"].items()
+        )
+        session.add_all(
+            VendorPattern(vendor=vendor, **counts)
+            for vendor, counts in learning.patterns["vendor_patterns"].items()
+        )
+        session.add_all(
+            CorrectionRecord(slot=(first_sequence + offset) % history.maxlen, sequence=first_sequence + offset, **record)
+            for offset, record in enumerate(history)
+        )
+        counter = session.exec(select(LearningCounter).where(LearningCounter.name == "correction_sequence")).first()
+        if counter is None:
+            counter = LearningCounter(name="correction_sequence")
+        counter.value = corrections_seen
+        session.add(counter)
+        # Other workers reload the rewritten ring on their next refresh
+        _upsert(session, LearningCounter, {"name": REPLAY_GENERATION}, {"value": 1})
+        session.commit()
+
+
+def rebuild_learning(
+    engine=None,
+    partitions: int = 1,
+    chunk_size: Optional[int] = None,
+    history_size: Optional[int] = None,
+    dry_run: bool = False
+) -> Dict[str, Any]:
+    """
+    Recompute all learned patterns from sync_operations
+
+    With ``partitions`` > 1 the id range is split and replayed in that many
+    processes, at most one per CPU (the database must be reachable by URL,
+    so not in-memory SQLite). Unless ``dry_run``, the result replaces the
+    persisted patterns; running workers pick up the new counters and
+    correction ring on their next refresh.
+
+    Returns:
+        Replay statistics
+    """
+    if engine is None:
+        from db.session import engine
+    chunk_size = chunk_size or settings.learning_replay_chunk_size
+    history_size = history_size or settings.learning_correction_history
+    partitions = max(1, min(partitions, MAX_PARTITIONS))
+    started = time.perf_counter()
+
+    if partitions <= 1:
+        learning, rows, corrections = replay_range(engine, history_size=history_size, chunk_size=chunk_size)
+    else:
+        learning = LearningSystem(history_size=history_size)
+        rows = corrections = 0
+        bounds = _partition_bounds(engine, partitions)
+        database_url = engine.url.render_as_string(hide_password=False)
+        with ProcessPoolExecutor(max_workers=max(1, len(bounds))) as executor:
+            futures = [
+                executor.submit(_replay_partition, database_url, low, high, history_size, chunk_size)
+                for low, high in bounds
+            ]
+            # Merged in id order so the correction ring keeps the newest
+            for future in futures:
+                partial = future.result()
+                _merge(learning, partial)
+                rows += partial["rows"]
+                corrections += partial["corrections"]
+
+    if not dry_run:
+        store(engine, learning, corrections)
+
+    stats = {
+        "rows": rows,
+        "po_types": len(learning.patterns["po_type_patterns"]),
+        "vendors": len(learning.patterns["vendor_patterns"]),
+        "corrections": corrections,
+        "partitions": partitions,
+        "stored": not dry_run,
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+    logger.info(
+        f"Replayed {rows} sync operation(s) into {stats['po_types']} PO type and "
+        f"{stats['vendors']} vendor pattern(s) in {stats['seconds']}s"
+    )
+    return stats
@@ -0,0 +1,277 @@
+"""
+Line Matcher - Three-way match of invoice lines against PO lines
+Each invoice line is paired with at most one PO line by solving an
+assignment over a similarity matrix (description tokens, unit price,
+quantity); variances are reported against the PO price and the ordered
+and received quantities
+"""
+import re
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from loguru import logger
+
+try:
+    from scipy.optimize import linear_sum_assignment
+    SCIPY_AVAILABLE = True
+except ImportError:
+    SCIPY_AVAILABLE = False
+
+# Similarity weights (sum to 1)
+DESCRIPTION_WEIGHT = 0.6
+PRICE_WEIGHT = 0.25
+QUANTITY_WEIGHT = 0.15
+
+# Pairs below this similarity are left unmatched
+MIN_LINE_SIMILARITY = 0.3
+
+# Unit prices may differ by this fraction of the PO price
+LINE_PRICE_TOLERANCE = 0.02
+
+# Without scipy, the exact NumPy solver is used up to this many lines a side;
+# larger matrices are paired greedily
+FALLBACK_MAX_LINES = 100
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[.\-/][a-z0-9]+)*")
+
+
+def _value(line: Dict[str, Any], *keys: str) -> Any:
+    for key in keys:
+        if line.get(key) not in (None, ""):
+            return line[key]
+    return None
+
+
+def _number(value: Any) -> Optional[float]:
+    if isinstance(value, dict):
+        value = _value(value, "quantity", "qty", "received_quantity", "receivedQuantity")
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _description(line: Dict[str, Any]) -> str:
+    parts = [_value(line, "description", "itemDescription", "partDescription"),
+             _value(line, "part_number", "partNumber", "itemNumber", "sku")]
+    return " ".join(str(part) for part in parts if part)
+
+
+def _quantity(line: Dict[str, Any]) -> Optional[float]:
+    return _number(_value(line, "quantity", "qty", "orderQuantity", "quantityOrdered"))
+
+
+def _unit_price(line: Dict[str, Any]) -> Optional[float]:
+    return _number(_value(line, "unit_price", "unitPrice", "price"))
+
+
+def _line_key(line: Dict[str, Any], index: int) -> str:
+    key = _value(line, "line_number", "lineNumber", "lineNo", "id")
+    return str(key) if key is not None else str(index + 1)
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+
+def _token_matrices(left: List[str], right: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """Binary line x vocabulary matrices for two lists of descriptions"""
+    vocabulary: Dict[str, int] = {}
+    left_tokens = [{vocabulary.setdefault(token, len(vocabulary)) for token in tokenize(text)} for text in left]
+    right_tokens = [{vocabulary.setdefault(token, len(vocabulary)) for token in tokenize(text)} for text in right]
+    matrices = []
+    for token_sets in (left_tokens, right_tokens):
+        matrix = np.zeros((len(token_sets), max(1, len(vocabulary))), dtype=np.float32)
+        rows = np.repeat(np.arange(len(token_sets)), [len(tokens) for tokens in token_sets])
+        cols = np.fromiter((token for tokens in token_sets for token in tokens), dtype=np.intp, count=len(rows))
+        matrix[rows, cols] = 1.0
+        matrices.append(matrix)
+    return matrices[0], matrices[1]
+
+
+def _ratio_similarity(left: np.ndarray, right: np.ndarray) -> np.ndarray:
+    """min/max of every pair of positive values; 0.5 where either is unknown"""
+    left = left[:, None]
+    right = right[None, :]
+    known = (left > 0) & (right > 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = np.minimum(left, right) / np.maximum(left, right)
+    return np.where(known, ratio, 0.5)
+
+
+def similarity_matrix(invoice_lines: List[Dict[str, Any]], po_lines: List[Dict[str, Any]]) -> np.ndarray:
+    """Invoice line x PO line similarity (0-1)"""
+    invoice_tokens, po_tokens = _token_matrices(
+        [_description(line) for line in invoice_lines], [_description(line) for line in po_lines]
+    )
+    shared = invoice_tokens @ po_tokens.T
+    union = invoice_tokens.sum(axis=1)[:, None] + po_tokens.sum(axis=1)[None, :] - shared
+    with np.errstate(divide="ignore", invalid="ignore"):
+        description = np.where(union > 0, shared / union, 0.0)
+
+    def column(lines, getter):
+        return np.array([getter(line) or 0.0 for line in lines], dtype=np.float64)
+
+    price = _ratio_similarity(column(invoice_lines, _unit_price), column(po_lines, _unit_price))
+    quantity = _ratio_similarity(column(invoice_lines, _quantity), column(po_lines, _quantity))
+    return DESCRIPTION_WEIGHT * description + PRICE_WEIGHT * price + QUANTITY_WEIGHT * quantity
+
+
+def _hungarian(cost: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Minimum-cost assignment for rows <= columns (shortest augmenting paths)"""
+    rows, cols = cost.shape
+    u = np.zeros(rows + 1)
+    v = np.zeros(cols + 1)
+    owner = np.zeros(cols + 1, dtype=np.intp)  # column -> 1-based row (0: free)
+    way = np.zeros(cols + 1, dtype=np.intp)
+    for row in range(1, rows + 1):
+        owner[0] = row
+        column = 0
+        min_slack = np.full(cols + 1, np.inf)
+        used = np.zeros(cols + 1, dtype=bool)
+        while True:
+            used[column] = True
+            current_row = owner[column]
+            free = ~used[1:]
+            slack = cost[current_row - 1] - u[current_row] - v[1:]
+            better = free & (slack < min_slack[1:])
+            min_slack[1:][better] = slack[better]
+            way[1:][better] = column
+            candidates = np.where(free, min_slack[1:], np.inf)
+            next_column = int(np.argmin(candidates)) + 1
+            delta = candidates[next_column - 1]
+            visited = np.flatnonzero(used)
+            u[owner[visited]] += delta
+            v[visited] -= delta
+            min_slack[1:][free] -= delta
+            column = next_column
+            if owner[column] == 0:
+                break
+        while column:
+            previous = way[column]
+            owner[column] = owner[previous]
+            column = previous
+
+    assigned = np.flatnonzero(owner[1:])
+    order = np.argsort(owner[1:][assigned])
+    return owner[1:][assigned][order] - 1, assigned[order]
+
+
+def _greedy(cost: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Cheapest pairs first (not always optimal, but O(n^2 log n))"""
+    rows, cols = [], []
+    used_rows = np.zeros(cost.shape[0], dtype=bool)
+    used_cols = np.zeros(cost.shape[1], dtype=bool)
+    limit = min(cost.shape)
+    for flat in np.argsort(cost, axis=None, kind="stable"):
+        row, col = divmod(int(flat), cost.shape[1])
+        if used_rows[row] or used_cols[col]:
+            continue
+        used_rows[row] = used_cols[col] = True
+        rows.append(row)
+        cols.append(col)
+        if len(rows) == limit:
+            break
+    order = np.argsort(rows)
+    return np.asarray(rows, dtype=np.intp)[order], np.asarray(cols, dtype=np.intp)[order]
+
+
+def solve_assignment(cost: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """(rows, columns) of the minimum-cost assignment of a rectangular matrix"""
+    if cost.size == 0:
+        return np.array([], dtype=np.intp), np.array([], dtype=np.intp)
+    if SCIPY_AVAILABLE:
+        return linear_sum_assignment(cost)
+    if min(cost.shape) > FALLBACK_MAX_LINES:
+        logger.warning(f"scipy not installed - pairing {cost.shape[0]}x{cost.shape[1]} lines greedily")
+        return _greedy(cost)
+    if cost.shape[0] <= cost.shape[1]:
+        return _hungarian(cost)
+    cols, rows = _hungarian(cost.T)
+    order = np.argsort(rows)
+    return rows[order], cols[order]
+
+
+def match_line_items(
+    invoice_lines: List[Dict[str, Any]],
+    po_lines: List[Dict[str, Any]],
+    received_items: Optional[Dict[str, Any]] = None,
+    price_tolerance: float = LINE_PRICE_TOLERANCE
+) -> Dict[str, Any]:
+    """
+    Pair invoice lines with PO lines and report variances
+
+    ``received_items`` maps PO line numbers (or 1-based positions) to
+    received quantities. An invoice line is within tolerance when its unit
+    price is within ``price_tolerance`` of the PO's and its quantity
+    doesn't exceed what was received, so partial shipments pass. A PO line
+    with no receipt recorded counts as nothing received: the line is
+    flagged ``needs_receipt`` and the invoice is not auto-approvable.
+
+    Returns:
+        {"lines": [...], "unmatched_po_lines": [...], "auto_approvable": bool}
+    """
+    invoice_lines = [line for line in invoice_lines or [] if isinstance(line, dict)]
+    po_lines = [line for line in po_lines or [] if isinstance(line, dict)]
+    received_items = received_items or {}
+
+    pairs: Dict[int, Tuple[int, float]] = {}
+    if invoice_lines and po_lines:
+        similarity = similarity_matrix(invoice_lines, po_lines)
+        for row, col in zip(*solve_assignment(1.0 - similarity)):
+            if similarity[row, col] >= MIN_LINE_SIMILARITY:
+                pairs[int(row)] = (int(col), float(similarity[row, col]))
+
+    lines = []
+    for index, line in enumerate(invoice_lines):
+        quantity = _quantity(line)
+        unit_price = _unit_price(line)
+        result = {
+            "invoice_line": index,
+            "description": _description(line),
+            "po_line": None,
+            "similarity": 0.0,
+            "invoice_quantity": quantity,
+            "invoice_unit_price": unit_price,
+            "within_tolerance": False,
+        }
+        if index in pairs:
+            col, score = pairs[index]
+            po_line = po_lines[col]
+            key = _line_key(po_line, col)
+            ordered = _quantity(po_line)
+            received = _number(received_items.get(key))
+            po_price = _unit_price(po_line)
+            limit = received if received is not None else 0.0
+
+            price_variance = unit_price - po_price if unit_price is not None and po_price is not None else None
+            quantity_variance = quantity - limit if quantity is not None and limit is not None else None
+            price_ok = price_variance is not None and abs(price_variance) <= abs(po_price) * price_tolerance + 1e-9
+            quantity_ok = quantity_variance is not None and quantity_variance <= 1e-9
+            result.update({
+                "po_line": col,
+                "po_line_number": key,
+                "similarity": round(score, 4),
+                "ordered_quantity": ordered,
+                "received_quantity": received,
+                "needs_receipt": received is None,
+                "po_unit_price": po_price,
+                "price_variance": round(price_variance, 4) if price_variance is not None else None,
+                "price_variance_pct": (
+                    round(price_variance / po_price * 100, 2) if price_variance is not None and po_price else None
+                ),
+                "quantity_variance": quantity_variance,
+                "amount_variance": (
+                    round(price_variance * quantity, 2) if price_variance is not None and quantity is not None else None
+                ),
+                "within_tolerance": price_ok and quantity_ok,
+            })
+        lines.append(result)
+
+    matched_po_lines = {col for col, _ in pairs.values()}
+    return {
+        "lines": lines,
+        "unmatched_po_lines": [
+            _line_key(line, col) for col, line in enumerate(po_lines) if col not in matched_po_lines
+        ],
+        "auto_approvable": bool(lines) and all(line["within_tolerance"] for line in lines),
+    }
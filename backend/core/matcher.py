@@ -1,10 +1,20 @@
 """
 PO Matcher - Matches vendor invoices to purchase orders
 """
-from typing import Dict, Any, List, Optional
+from collections import defaultdict
+from typing import Dict, Any, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+from sqlmodel import Session
 from models import VendorInvoice, PurchaseOrder
+from core.line_matcher import match_line_items
+from core.po_index import AMOUNT_TOLERANCE, ContainmentIndex, POIndex, normalize_po_number
+from core.po_search import find_candidates
+from core.vendor_names import VENDOR_SIMILARITY, vendor_names, vendor_similarity
 from loguru import logger
 
+# Score matrix cells per batch chunk (bounds memory for large backlogs)
+_BATCH_CELLS = 1 << 21
+
 
 class POMatcher:
     """
@@ -13,55 +23,98 @@ class POMatcher:
     - Vendor name matching
     - Amount matching
     - Date matching
+
+    Where candidates come from, per call:
+    - ``available_pos``: scanned in order (building a POIndex for one
+      lookup costs more than the scan it would save)
+    - ``session``: one indexed query (core.po_search), then that scan
+    - neither: ``index``, which is opt-in. Only with PO_INDEX_IN_MEMORY
+      does the PO mirror load it and keep it current; it is the only
+      path with sub-millisecond lookups against all open POs.
     """
 
+    def __init__(self):
+        self.index = POIndex()
+        self.index_loaded = False
+
+    def load_purchase_orders(self, pos: Iterable[PurchaseOrder]):
+        """Replace the index with ``pos``"""
+        self.index = POIndex(pos)
+        self.index_loaded = True
+        logger.info(f"Indexed {len(self.index)} purchase orders")
+
     def match_invoice_to_po(
         self,
         invoice: VendorInvoice,
-        available_pos: List[PurchaseOrder]
+        available_pos: Optional[List[PurchaseOrder]] = None,
+        session: Optional[Session] = None
     ) -> Optional[PurchaseOrder]:
         """
         Match invoice to best matching PO
 
         Args:
             invoice: Vendor invoice to match
-            available_pos: List of available purchase orders
+            available_pos: Purchase orders to match against (scanned)
+            session: Database session to search for candidate POs
+                (default: the in-memory index, if PO_INDEX_IN_MEMORY)
 
         Returns:
             Best matching PO or None
+
+        Raises:
+            RuntimeError: Neither POs nor a session were passed and the
+                in-memory index was never loaded (PO_INDEX_IN_MEMORY off)
         """
         if not invoice.po_numbers:
             logger.warning(f"Invoice {invoice.invoice_number} has no PO numbers")
             return None
 
-        # Try exact PO number match first
+        if available_pos is None and session is not None:
+            available_pos = find_candidates(session, invoice.po_numbers, invoice.vendor_name, invoice.total_amount)
+        if available_pos is not None:
+            po, method = self._scan(invoice, available_pos)
+        elif self.index_loaded:
+            po, method = self.index.match(invoice.po_numbers, invoice.vendor_name, invoice.total_amount)
+        else:
+            raise RuntimeError(
+                "PO index is not loaded: pass a session or available_pos, or enable PO_INDEX_IN_MEMORY"
+            )
+        if po is None:
+            logger.warning(f"No PO match found for invoice {invoice.invoice_number}")
+        elif method == "exact":
+            logger.info(f"Exact PO match: {po.po_number}")
+        elif method == "fuzzy":
+            logger.info(f"Fuzzy PO match: {po.po_number}")
+        else:
+            logger.info(f"Matched by vendor and amount: {po.po_number}")
+        return po
+
+    def _scan(
+        self,
+        invoice: VendorInvoice,
+        pos: List[PurchaseOrder]
+    ) -> Tuple[Optional[PurchaseOrder], Optional[str]]:
+        """POIndex.match over a plain list, in the same rule order"""
         for po_number in invoice.po_numbers:
-            for po in available_pos:
+            for po in pos:
                 if po.po_number == po_number:
-                    logger.info(f"Exact PO match: {po_number}")
-                    return po
-
-        # Try fuzzy matching on PO number
+                    return po, "exact"
         for po_number in invoice.po_numbers:
-            for po in available_pos:
+            for po in pos:
                 if self._fuzzy_match_po_number(po_number, po.po_number):
-                    logger.info(f"Fuzzy PO match: {po_number} -> {po.po_number}")
-                    return po
-
-        # Try vendor name + amount matching
-        for po in available_pos:
+                    return po, "fuzzy"
+        for po in pos:
             if self._match_by_vendor_and_amount(invoice, po):
-                logger.info(f"Matched by vendor and amount: {po.po_number}")
-                return po
-
-        logger.warning(f"No PO match found for invoice {invoice.invoice_number}")
-        return None
+                return po, "vendor_amount"
+        return None, None
 
     def _fuzzy_match_po_number(self, invoice_po: str, po_number: str) -> bool:
         """Fuzzy match PO numbers (handles variations)"""
         # Normalize: remove spaces, dashes, convert to uppercase
-        normalized_invoice = invoice_po.replace(" ", "").replace("-", "").upper()
-        normalized_po = po_number.replace(" ", "").replace("-", "").upper()
+        normalized_invoice = normalize_po_number(invoice_po)
+        normalized_po = normalize_po_number(po_number)
+        if not normalized_invoice or not normalized_po:
+            return False
 
         # Exact match after normalization
         if normalized_invoice == normalized_po:
@@ -79,23 +132,14 @@ class POMatcher:
         po: PurchaseOrder
     ) -> bool:
         """Match by vendor name and amount similarity"""
-        # Vendor name match
-        vendor_match = (
-            invoice.vendor_name.lower() == po.vendor_name.lower() or
-            invoice.vendor_name.lower() in po.vendor_name.lower() or
-            po.vendor_name.lower() in invoice.vendor_name.lower()
-        )
-
-        if not vendor_match:
+        # Amount match (within 5% tolerance), checked first as it is cheaper
+        if not invoice.total_amount or not po.total_amount:
+            return False
+        if abs(invoice.total_amount - po.total_amount) > po.total_amount * AMOUNT_TOLERANCE:
             return False
 
-        # Amount match (within 5% tolerance)
-        if invoice.total_amount and po.total_amount:
-            tolerance = po.total_amount * 0.05
-            amount_match = abs(invoice.total_amount - po.total_amount) <= tolerance
-            return amount_match
-
-        return False
+        # Vendor name match (canonical names, aliases applied)
+        return vendor_names.same_vendor(invoice.vendor_name, po.vendor_name)
 
     def calculate_match_confidence(
         self,
@@ -121,15 +165,17 @@ class POMatcher:
                     break
 
         # Vendor name match (30 points)
-        if invoice.vendor_name and po.vendor_name:
-            if invoice.vendor_name.lower() == po.vendor_name.lower():
+        invoice_vendor = vendor_names.canonical(invoice.vendor_name)
+        po_vendor = vendor_names.canonical(po.vendor_name)
+        if invoice_vendor and po_vendor:
+            if invoice_vendor == po_vendor:
                 score += 30.0
-            elif invoice.vendor_name.lower() in po.vendor_name.lower():
+            elif invoice_vendor in po_vendor or vendor_similarity(invoice_vendor, po_vendor) >= VENDOR_SIMILARITY:
                 score += 20.0
 
         # Amount match (20 points)
         if invoice.total_amount and po.total_amount:
-            tolerance = po.total_amount * 0.05
+            tolerance = po.total_amount * AMOUNT_TOLERANCE
             diff = abs(invoice.total_amount - po.total_amount)
             if diff == 0:
                 score += 20.0
@@ -138,6 +184,113 @@ class POMatcher:
 
         return min(score, 100.0)
 
+    def match_line_items(
+        self,
+        invoice: VendorInvoice,
+        po: PurchaseOrder
+    ) -> Dict[str, Any]:
+        """
+        Three-way match of invoice lines against PO lines and receipts
+
+        Returns:
+            Per-line pairing and variances (see line_matcher.match_line_items)
+        """
+        return match_line_items(invoice.line_items, po.line_items, po.received_items)
+
+    def match_batch(
+        self,
+        invoices: Sequence[VendorInvoice],
+        pos: Sequence[PurchaseOrder],
+        top_k: int = 3,
+        min_score: float = 0.0
+    ) -> List[List[Tuple[PurchaseOrder, float]]]:
+        """
+        Rank candidate POs for many invoices at once
+
+        Scores are those of ``calculate_match_confidence``, computed as
+        invoice x PO arrays: PO numbers and canonical vendor names go
+        through the containment indexes, amounts are compared with NumPy.
+
+        Returns:
+            Per invoice, up to ``top_k`` (PO, score) pairs scoring above
+            ``min_score``, best first (ties: earlier PO first)
+        """
+        results: List[List[Tuple[PurchaseOrder, float]]] = [[] for _ in invoices]
+        if not invoices or not pos or top_k <= 0:
+            return results
+
+        po_count = len(pos)
+        po_amounts = np.array([po.total_amount or 0.0 for po in pos], dtype=np.float64)
+        po_tolerance = po_amounts * AMOUNT_TOLERANCE
+
+        by_number: Dict[str, List[int]] = defaultdict(list)
+        numbers = ContainmentIndex()
+        for i, po in enumerate(pos):
+            by_number[po.po_number].append(i)
+            normalized = normalize_po_number(po.po_number)
+            if normalized:
+                numbers.add(normalized, i)
+
+        vendor_ids: Dict[str, int] = {}
+        po_vendor_ids = np.array(
+            [vendor_ids.setdefault(vendor_names.canonical(po.vendor_name), len(vendor_ids)) for po in pos]
+        )
+        vendors = ContainmentIndex()
+        for name, vendor_id in vendor_ids.items():
+            if name:
+                vendors.add(name, vendor_id)
+
+        chunk_size = max(1, _BATCH_CELLS // po_count)
+        for start in range(0, len(invoices), chunk_size):
+            chunk = invoices[start:start + chunk_size]
+            number_scores = np.zeros((len(chunk), po_count), dtype=np.float32)
+            vendor_scores = np.zeros((len(chunk), len(vendor_ids)), dtype=np.float32)
+
+            for row, invoice in enumerate(chunk):
+                # The first invoice PO number matching a PO decides its points
+                scores = number_scores[row]
+                for po_num in invoice.po_numbers or []:
+                    exact = np.array(by_number.get(po_num, ()), dtype=np.intp)
+                    scores[exact[scores[exact] == 0]] = 50.0
+                    normalized = normalize_po_number(po_num)
+                    if normalized:
+                        fuzzy = np.array(
+                            [i for key in numbers.related(normalized) for i in numbers.keys[key]],
+                            dtype=np.intp
+                        )
+                        scores[fuzzy[scores[fuzzy] == 0]] = 40.0
+
+                vendor = vendor_names.canonical(invoice.vendor_name)
+                if vendor:
+                    similar = vendors.similar(vendor)
+                    for key in vendors.related(vendor) | similar.keys():
+                        if key == vendor:
+                            vendor_scores[row, next(iter(vendors.keys[key]))] = 30.0
+                        elif vendor in key or key in similar:
+                            vendor_scores[row, next(iter(vendors.keys[key]))] = 20.0
+
+            amounts = np.array([invoice.total_amount or 0.0 for invoice in chunk], dtype=np.float64)
+            diff = np.abs(amounts[:, None] - po_amounts[None, :])
+            comparable = (amounts != 0)[:, None] & (po_amounts != 0)[None, :]
+            amount_scores = np.where(
+                comparable & (diff == 0), np.float32(20.0),
+                np.where(comparable & (diff <= po_tolerance[None, :]), np.float32(15.0), np.float32(0.0))
+            )
+            totals = np.minimum(number_scores + vendor_scores[:, po_vendor_ids] + amount_scores, np.float32(100.0))
+
+            # Cells above min_score, ordered by row, score (desc), PO order
+            rows, cols = np.nonzero(totals > min_score)
+            values = totals[rows, cols]
+            order = np.lexsort((cols, -values, rows))
+            rows, cols, values = rows[order], cols[order], values[order]
+            bounds = np.searchsorted(rows, np.arange(len(chunk) + 1))
+            for row in range(len(chunk)):
+                first = bounds[row]
+                last = min(bounds[row + 1], first + top_k)
+                results[start + row] = [(pos[cols[i]], float(values[i])) for i in range(first, last)]
+
+        return results
+
 
 # Singleton instance
 po_matcher = POMatcher()
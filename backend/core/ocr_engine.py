@@ -0,0 +1,142 @@
+"""
+OCR Engine - Local Tesseract OCR for scanned invoices
+Runs in the shared render worker pool so image-only PDFs and photos get a
+text layer without a vision model call
+"""
+import io
+import shutil
+from dataclasses import dataclass
+from typing import Dict, List, Tuple
+from PIL import Image, ImageSequence
+from config import settings
+from loguru import logger
+from core.layout_templates import TextBlock, TextLayout
+from core.pdf_renderer import RENDER_BACKENDS, PDFRenderer, PDFSource, describe_source, pdf_renderer
+
+try:
+    import pytesseract
+    OCR_AVAILABLE = shutil.which(pytesseract.pytesseract.tesseract_cmd) is not None
+except ImportError:
+    OCR_AVAILABLE = False
+
+
+@dataclass
+class OCRPage:
+    """Text recognized on one page"""
+    text: str
+    blocks: List[TextBlock]
+    confidence: float  # mean word confidence, 0-100
+
+
+@dataclass
+class OCRResult:
+    """Text layout recognized across pages"""
+    layout: TextLayout
+    confidence: float  # mean word confidence, 0-100
+
+
+def _ocr_image(image: Image.Image, page_number: int, lang: str) -> OCRPage:
+    """OCR one page image into lines with positions (runs in worker process)"""
+    image = image.convert("L")
+    data = pytesseract.image_to_data(image, lang=lang, output_type=pytesseract.Output.DICT)
+
+    lines: Dict[Tuple[int, int, int], List[int]] = {}
+    confidences = []
+    for index, word in enumerate(data["text"]):
+        confidence = float(data["conf"][index])
+        if not word.strip() or confidence < 0:
+            continue
+        confidences.append(confidence)
+        key = (data["block_num"][index], data["par_num"][index], data["line_num"][index])
+        lines.setdefault(key, []).append(index)
+
+    blocks = []
+    for indexes in lines.values():
+        blocks.append(TextBlock(
+            text=" ".join(data["text"][i].strip() for i in indexes),
+            page=page_number,
+            x=round(min(data["left"][i] for i in indexes) / image.width, 4),
+            y=round(min(data["top"][i] for i in indexes) / image.height, 4),
+        ))
+    blocks.sort(key=lambda block: (block.y, block.x))
+
+    return OCRPage(
+        text="\n".join(block.text for block in blocks),
+        blocks=blocks,
+        confidence=sum(confidences) / len(confidences) if confidences else 0.0,
+    )
+
+
+def _render_and_ocr(backend: str, source: PDFSource, page_number: int, dpi: int, lang: str) -> OCRPage:
+    """Render and OCR one PDF page (runs in worker process)"""
+    image = RENDER_BACKENDS[backend](source, page_number, dpi)
+    return _ocr_image(image, page_number, lang)
+
+
+def _ocr_image_bytes(data: bytes, max_pages: int, lang: str) -> List[OCRPage]:
+    """OCR an uploaded PNG/JPG/TIFF (runs in worker process)"""
+    with Image.open(io.BytesIO(data)) as source:
+        return [
+            _ocr_image(frame.copy(), page_number, lang)
+            for page_number, frame in zip(range(1, max_pages + 1), ImageSequence.Iterator(source))
+        ]
+
+
+def _combine(pages: List[OCRPage]) -> OCRResult:
+    recognized = [page for page in pages if page.text]
+    return OCRResult(
+        layout=TextLayout(
+            text="\n".join(page.text for page in pages) + "\n",
+            blocks=[block for page in pages for block in page.blocks],
+            pages=[page.text for page in pages],
+        ),
+        confidence=sum(page.confidence for page in recognized) / len(recognized) if recognized else 0.0,
+    )
+
+
+class OCREngine:
+    """
+    CPU-only OCR tier
+
+    Pages are rendered and recognized inside the render worker pool, so
+    OCR shares its CPU budget with rendering and never blocks the event loop.
+    """
+
+    def __init__(
+        self,
+        renderer: PDFRenderer,
+        lang: str = "eng",
+        dpi: int = 300,
+        enabled: bool = True
+    ):
+        self.renderer = renderer
+        self.lang = lang
+        self.dpi = dpi
+        self.enabled = enabled
+
+    @property
+    def available(self) -> bool:
+        return self.enabled and OCR_AVAILABLE
+
+    async def ocr_pdf(self, source: PDFSource, max_pages: int = 5) -> OCRResult:
+        """OCR the first ``max_pages`` pages of a PDF (path or bytes)"""
+        pages = await self.renderer.map_pages(source, max_pages, _render_and_ocr, self.dpi, self.lang)
+        result = _combine(pages)
+        logger.debug(
+            f"OCR read {len(pages)} page(s) at {result.confidence:.0f}% confidence: {describe_source(source)}"
+        )
+        return result
+
+    async def ocr_image(self, data: bytes, max_pages: int = 5) -> OCRResult:
+        """OCR an uploaded image (multi-frame TIFFs yield several pages)"""
+        pages = await self.renderer.run_in_pool(_ocr_image_bytes, data, max_pages, self.lang)
+        return _combine(pages)
+
+
+# Singleton instance
+ocr_engine = OCREngine(
+    renderer=pdf_renderer,
+    lang=settings.ocr_language,
+    dpi=settings.ocr_dpi,
+    enabled=settings.ocr_enabled
+)
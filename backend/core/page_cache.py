@@ -0,0 +1,218 @@
+"""
+Page Cache - Rendered and encoded page images kept alongside stored invoices
+Re-parses, retries and reprocessing scripts reuse the pages instead of
+rasterizing the same PDF again
+"""
+import json
+import os
+import shutil
+import threading
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from loguru import logger
+from core.image_encoder import EncodedImage, EncodingProfile
+
+
+class PageImageCache:
+    """
+    Disk cache of encoded pages
+
+    - One directory per file SHA-256 + DPI + encoding profile, holding a
+      manifest (page count, image sizes) and one file per page
+    - Least recently used directories (by mtime) are evicted once everything
+      under ``cache_dir`` exceeds ``max_bytes``
+    - Safe to call from worker threads
+
+    ``cache_dir`` may be shared by several processes: lookups read the
+    entry's manifest itself, so pages cached by any of them are hits.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = 500 * 1024 * 1024, enabled: bool = True):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+
+        # entry name -> bytes on disk, ordered oldest -> newest access
+        # (this process's view, refreshed from disk on every eviction pass)
+        self._index: Optional["OrderedDict[str, int]"] = None
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def entry_name(file_digest: str, dpi: int, profile: EncodingProfile) -> str:
+        return f"{file_digest}-{dpi}-{profile.key}"
+
+    @staticmethod
+    def _entry_size(entry: str) -> int:
+        size = 0
+        for f in os.scandir(entry):
+            try:
+                size += f.stat().st_size
+            except FileNotFoundError:
+                continue
+        return size
+
+    def _scan(self) -> List[Tuple[str, int]]:
+        """(name, bytes) of every entry in cache_dir, least recently used first"""
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            try:
+                if not entry.is_dir():
+                    continue
+                entries.append((entry.stat().st_mtime_ns, entry.name, self._entry_size(entry.path)))
+            except FileNotFoundError:
+                continue  # evicted by another process meanwhile
+        # mtimes are coarse: ties keep this process's access order
+        rank = {name: position for position, name in enumerate(self._index or ())}
+        entries.sort(key=lambda item: (item[0], rank.get(item[1], -1)))
+        return [(name, size) for _, name, size in entries]
+
+    def _load_index(self) -> "OrderedDict[str, int]":
+        """Rebuild LRU order and sizes from disk (lazily, on first use)"""
+        if self._index is None:
+            self._index = OrderedDict(self._scan())
+        return self._index
+
+    def _read_manifest(self, entry: Path) -> Optional[Dict[str, Any]]:
+        """Entry manifest, or None if the entry is missing or unreadable"""
+        try:
+            with open(entry / "manifest.json", "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _touch(self, name: str, entry: Path):
+        """Mark as most recently used (mtime shares the order with other processes)"""
+        with self._lock:
+            index = self._load_index()
+            if name not in index:
+                try:
+                    index[name] = self._entry_size(entry)
+                except OSError:
+                    index[name] = 0
+            index.move_to_end(name)
+        try:
+            os.utime(entry, None)
+        except OSError:
+            pass
+
+    def _forget(self, name: str):
+        with self._lock:
+            self._load_index().pop(name, None)
+
+    def page_count(self, file_digest: str, dpi: int, profile: EncodingProfile) -> Optional[int]:
+        """Page count recorded with the cached pages, if any"""
+        name = self.entry_name(file_digest, dpi, profile)
+        manifest = self._read_manifest(self.cache_dir / name)
+        if manifest is None:
+            self._forget(name)
+            return None
+        return manifest.get("page_count")
+
+    def get_pages(
+        self,
+        file_digest: str,
+        dpi: int,
+        profile: EncodingProfile,
+        pages: List[int]
+    ) -> Dict[int, EncodedImage]:
+        """Cached images among the 1-based ``pages``"""
+        name = self.entry_name(file_digest, dpi, profile)
+        entry = self.cache_dir / name
+        manifest = self._read_manifest(entry)
+        if manifest is None:
+            self._forget(name)
+            with self._lock:
+                self.misses += len(pages)
+            return {}
+
+        found: Dict[int, EncodedImage] = {}
+        for number in pages:
+            meta = manifest["pages"].get(str(number))
+            if meta is None:
+                continue
+            try:
+                data = (entry / f"{number}.bin").read_bytes()
+            except OSError as e:
+                logger.warning(f"Dropping unreadable cached page {name}/{number}: {e}")
+                continue
+            found[number] = EncodedImage(data=data, **meta)
+
+        self._touch(name, entry)
+        with self._lock:
+            self.hits += len(found)
+            self.misses += len(pages) - len(found)
+        return found
+
+    def put_pages(
+        self,
+        file_digest: str,
+        dpi: int,
+        profile: EncodingProfile,
+        images: Dict[int, EncodedImage],
+        page_count: Optional[int] = None
+    ):
+        """Store page images (merged with any already cached) and evict old entries"""
+        name = self.entry_name(file_digest, dpi, profile)
+        entry = self.cache_dir / name
+        with self._lock:
+            self._load_index()
+            entry.mkdir(parents=True, exist_ok=True)
+            manifest = self._read_manifest(entry) or {"page_count": None, "pages": {}}
+            if page_count is not None:
+                manifest["page_count"] = page_count
+            for number, image in images.items():
+                (entry / f"{number}.bin").write_bytes(image.data)
+                manifest["pages"][str(number)] = {
+                    "mime_type": image.mime_type,
+                    "width": image.width,
+                    "height": image.height,
+                    "original_bytes": image.original_bytes,
+                    "raw_bitmap": image.raw_bitmap,
+                }
+            tmp_path = entry / f"manifest.{uuid.uuid4().hex}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(manifest, f)
+            os.replace(tmp_path, entry / "manifest.json")
+
+            self._index[name] = self._entry_size(entry)
+            self._index.move_to_end(name)
+            self._evict(keep=name)
+
+    def _evict(self, keep: str):
+        """Delete the oldest entries in cache_dir (any process's) past max_bytes"""
+        entries = self._scan()
+        total = sum(size for _, size in entries)
+        kept = []
+        for position, (old_name, size) in enumerate(entries):
+            if total <= self.max_bytes:
+                kept.extend(entries[position:])
+                break
+            if old_name == keep:
+                kept.append((old_name, size))
+                continue
+            shutil.rmtree(self.cache_dir / old_name, ignore_errors=True)
+            total -= size
+            self.evictions += 1
+        self._index = OrderedDict(kept)
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters (per page) and current size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._index) if self._index is not None else None,
+                "bytes": sum(self._index.values()) if self._index is not None else None,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
@@ -0,0 +1,100 @@
+"""
+Page Selector - Picks the pages of a long PDF worth sending to the model
+Vendors staple packing lists, certificates of conformance and terms to
+the invoice; a cheap text classifier (keywords plus table density) keeps
+the pages with the invoice header, line items, PO references and totals
+"""
+import re
+from dataclasses import dataclass
+from typing import List, Optional
+from core.text_extractor import _AMOUNT, INVOICE_NUMBER_RE, PO_NUMBER_RE, SUBTOTAL_RE, TAX_RE, TOTAL_RES
+
+_AMOUNT_RE = re.compile(_AMOUNT)
+_NUMBER_RE = re.compile(r"\b\d+(?:[.,]\d+)*\b")
+
+HEADER_RE = re.compile(
+    r"\b(?:invoice|bill\s+to|sold\s+to|remit\s+to|invoice\s+date|payment\s+terms)\b",
+    re.IGNORECASE
+)
+# Attachments that are never the invoice itself
+OTHER_DOCUMENT_RE = re.compile(
+    r"\b(?:packing\s+(?:list|slip)|certificate\s+of\s+(?:conformance|conformity|compliance|analysis)"
+    r"|bill\s+of\s+lading|delivery\s+(?:note|receipt)|terms\s+and\s+conditions|material\s+test\s+report"
+    r"|safety\s+data\s+sheet|shipping\s+manifest)\b",
+    re.IGNORECASE
+)
+
+# A line with this many numbers (qty, price, total...) reads as a table row
+_ROW_NUMBERS = 3
+
+
+@dataclass
+class PageScore:
+    """Invoice signals found on one page"""
+    page: int  # 1-based
+    header: bool
+    totals: bool
+    po_reference: bool
+    table_rows: int
+    amounts: int
+    other_document: bool
+    empty: bool  # no text (an image-only page): can't tell, so kept
+
+    @property
+    def relevant(self) -> bool:
+        if self.empty:
+            return True
+        # Packing lists and certificates carry quantities but no money
+        if self.other_document and not self.totals and self.amounts < 2:
+            return False
+        return self.header or self.totals or self.po_reference or self.table_rows >= 3 or self.amounts >= 3
+
+
+def score_page(page: int, text: str) -> PageScore:
+    """Classify one page from its text"""
+    lines = [line for line in text.splitlines() if line.strip()]
+    return PageScore(
+        page=page,
+        header=bool(INVOICE_NUMBER_RE.search(text)) or len(HEADER_RE.findall(text)) >= 2,
+        totals=any(pattern.search(text) for pattern in TOTAL_RES) or bool(SUBTOTAL_RE.search(text) or TAX_RE.search(text)),
+        po_reference=bool(PO_NUMBER_RE.search(text)),
+        table_rows=sum(1 for line in lines if len(_NUMBER_RE.findall(line)) >= _ROW_NUMBERS),
+        amounts=len(_AMOUNT_RE.findall(text)),
+        other_document=bool(OTHER_DOCUMENT_RE.search(text)),
+        empty=not lines,
+    )
+
+
+def select_pages(page_texts: List[str], max_pages: int) -> Optional[List[int]]:
+    """
+    1-based page numbers to send to the model, in page order
+
+    Returns None when there's no text to classify (scans), so the caller
+    falls back to the first ``max_pages`` pages. If more than
+    ``max_pages`` pages look relevant, the first header page, the last
+    totals page and PO pages win, then the densest line-item pages.
+    """
+    if not any(text.strip() for text in page_texts):
+        return None
+
+    scores = [score_page(page, text) for page, text in enumerate(page_texts, start=1)]
+    relevant = [score for score in scores if score.relevant]
+    if not relevant:
+        return list(range(1, min(len(page_texts), max_pages) + 1))
+    if len(relevant) <= max_pages:
+        return [score.page for score in relevant]
+
+    chosen: List[int] = []
+
+    def take(score: Optional[PageScore]):
+        if score is not None and score.page not in chosen and len(chosen) < max_pages:
+            chosen.append(score.page)
+
+    take(next((score for score in relevant if score.header), None))
+    take(next((score for score in reversed(relevant) if score.totals), None))
+    for score in relevant:
+        if score.po_reference:
+            take(score)
+    for score in sorted(relevant, key=lambda score: (-score.table_rows, -score.amounts, score.page)):
+        take(score)
+    return sorted(chosen)
@@ -0,0 +1,213 @@
+"""
+Parse Cache - Content-addressed cache for AI parse results
+Vendors resend the same file constantly, so identical bytes should never
+hit the model twice
+"""
+import asyncio
+import copy
+import hashlib
+import json
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from loguru import logger
+
+
+def hash_bytes(data: bytes) -> str:
+    """SHA-256 hex digest of an in-memory buffer"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_file(file_path: str, chunk_size: int = 1024 * 1024) -> str:
+    """SHA-256 hex digest of a file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ParseCache:
+    """
+    Persistent LRU cache of parse results
+
+    - Entries are JSON files named by key under ``cache_dir``
+    - Key = file SHA-256 + model + prompt version
+    - Least recently used entries (by file mtime) are evicted past
+      ``max_entries``, counting every file in ``cache_dir``
+    - Concurrent requests for the same key share a single parse
+
+    ``cache_dir`` may be shared by several processes (uvicorn workers,
+    email polling, reparse_invoices.py): lookups read the file itself, so
+    entries written by any of them are hits. ``get`` and ``set`` block on
+    disk; ``get_or_parse`` runs them in a thread.
+    """
+
+    def __init__(self, cache_dir: str, max_entries: int = 5000, enabled: bool = True):
+        self.cache_dir = Path(cache_dir)
+        self.max_entries = max_entries
+        self.enabled = enabled
+
+        # key -> None, ordered oldest -> newest access (this process's view)
+        self._index: Optional["OrderedDict[str, None]"] = None
+        self._lock = threading.Lock()
+        self._in_flight: Dict[str, asyncio.Future] = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(file_digest: str, model: str, prompt_version: str) -> str:
+        """Build cache key from content digest, model and prompt version"""
+        return hashlib.sha256(
+            f"{file_digest}:{model}:{prompt_version}".encode()
+        ).hexdigest()
+
+    def _entry_path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.json"
+
+    def _scan(self) -> List[Tuple[int, str]]:
+        """(mtime, key) of every entry in cache_dir, least recently used first"""
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if not entry.name.endswith(".json"):
+                continue
+            try:
+                entries.append((entry.stat().st_mtime_ns, entry.name[:-len(".json")]))
+            except FileNotFoundError:
+                continue  # evicted by another process meanwhile
+        # mtimes are coarse: ties keep this process's access order
+        rank = {key: position for position, key in enumerate(self._index or ())}
+        entries.sort(key=lambda item: (item[0], rank.get(item[1], -1)))
+        return entries
+
+    def _load_index(self) -> "OrderedDict[str, None]":
+        """Rebuild LRU order from file mtimes (lazily, on first use)"""
+        if self._index is None:
+            entries = self._scan()
+            with self._lock:
+                if self._index is None:
+                    self._index = OrderedDict((key, None) for _, key in entries)
+        return self._index
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return cached result or None (blocking)"""
+        index = self._load_index()
+        path = self._entry_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            with self._lock:
+                index.pop(key, None)
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Dropping unreadable parse cache entry {key}: {e}")
+            with self._lock:
+                index.pop(key, None)
+            path.unlink(missing_ok=True)
+            return None
+
+        # Mark as most recently used (mtime shares the order with other processes)
+        with self._lock:
+            index[key] = None
+            index.move_to_end(key)
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        return data
+
+    def set(self, key: str, value: Dict[str, Any]):
+        """Store result and evict least recently used entries (blocking)"""
+        index = self._load_index()
+        path = self._entry_path(key)
+        tmp_path = self.cache_dir / f".{key}.{uuid.uuid4().hex}.tmp"
+
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(value, f, default=str)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            index[key] = None
+            index.move_to_end(key)
+        self._evict()
+
+    def _evict(self):
+        """Delete the oldest entries in cache_dir past max_entries"""
+        entries = self._scan()
+        excess = max(0, len(entries) - self.max_entries)
+        for _, old_key in entries[:excess]:
+            self._entry_path(old_key).unlink(missing_ok=True)
+            self.evictions += 1
+        with self._lock:
+            self._index = OrderedDict((key, None) for _, key in entries[excess:])
+
+    async def get_or_parse(
+        self,
+        key: str,
+        parse: Callable[[], Awaitable[Dict[str, Any]]],
+        should_store: Callable[[Dict[str, Any]], bool] = lambda result: True
+    ) -> Dict[str, Any]:
+        """
+        Return cached result for key, or run ``parse`` once and cache it
+
+        Callers arriving while a parse for the same key is running wait
+        for that parse instead of starting their own.
+        """
+        pending = self._in_flight.get(key)
+        if pending is None:
+            cached = await asyncio.to_thread(self.get, key)
+            if cached is not None:
+                self.hits += 1
+                logger.info(f"Parse cache hit: {key[:12]}")
+                return cached
+            # A parse may have started while the entry was being read
+            pending = self._in_flight.get(key)
+        if pending is not None:
+            self.coalesced += 1
+            logger.info(f"Parse cache waiting on in-flight parse: {key[:12]}")
+            return copy.deepcopy(await asyncio.shield(pending))
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            result = await parse()
+            if should_store(result):
+                try:
+                    await asyncio.to_thread(self.set, key, result)
+                except (OSError, TypeError, ValueError) as e:
+                    logger.warning(f"Failed to write parse cache entry {key[:12]}: {e}")
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark retrieved so an unawaited future doesn't log a warning
+            future.exception()
+            raise
+        finally:
+            self._in_flight.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and current size"""
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._index) if self._index is not None else None,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "hit_rate": round((self.hits + self.coalesced) / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,298 @@
+"""
+Parse Metrics - Per-parse cost and latency instrumentation
+Each parse_invoice call records stage timings, tokens, payload size, model
+and engine tier; totals are kept in-process and exported in Prometheus
+text format
+"""
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from config import settings
+
+
+def _prices(model: str) -> Tuple[float, float, float]:
+    """USD per million (prompt, cached prompt, completion) tokens for ``model``"""
+    if settings.openai_fast_model and model == settings.openai_fast_model:
+        return (
+            settings.openai_fast_prompt_price_per_million,
+            settings.openai_fast_cached_prompt_price_per_million,
+            settings.openai_fast_completion_price_per_million,
+        )
+    return (
+        settings.openai_prompt_price_per_million,
+        settings.openai_cached_prompt_price_per_million,
+        settings.openai_completion_price_per_million,
+    )
+
+
+def call_cost(model: str, usage: Dict[str, int]) -> float:
+    """Estimated API cost of one call from its token counts"""
+    prompt_price, cached_price, completion_price = _prices(model)
+    cached = usage.get("cached_tokens", 0)
+    return (
+        (usage.get("prompt_tokens", 0) - cached) * prompt_price
+        + cached * cached_price
+        + usage.get("completion_tokens", 0) * completion_price
+    ) / 1_000_000
+
+
+class ParseTrace:
+    """Measurements for one parse_invoice call"""
+
+    def __init__(self, file_type: str):
+        self.file_type = file_type
+        self.model: Optional[str] = None  # model whose answer was kept
+        self.escalation_reason: Optional[str] = None
+        self.calls: List[Tuple[str, float]] = []  # (model, ms) per API call
+        self.tier = "unknown"  # cache, text_layer, layout_template, ocr_text, text_model, vision_model
+        self.stages: Dict[str, float] = {}
+        self.pages = 0
+        self.payload_bytes = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cached_tokens = 0
+        self.cost_usd = 0.0
+        self._started = time.perf_counter()
+        self.total_ms = 0.0
+
+    def add_stage(self, name: str, ms: float):
+        self.stages[name] = self.stages.get(name, 0.0) + ms
+
+    def add_call(self, model: str, ms: float, usage: Optional[Dict[str, int]] = None):
+        """Record one model call; the last call's model is the one kept"""
+        self.model = model
+        self.calls.append((model, ms))
+        if usage:
+            self.prompt_tokens += usage.get("prompt_tokens", 0)
+            self.completion_tokens += usage.get("completion_tokens", 0)
+            self.cached_tokens += usage.get("cached_tokens", 0)
+            self.cost_usd += call_cost(model, usage)
+
+    @property
+    def api_calls(self) -> int:
+        return len(self.calls)
+
+    def finish(self):
+        self.total_ms = (time.perf_counter() - self._started) * 1000
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "tier": self.tier,
+            "model": self.model,
+            "escalation_reason": self.escalation_reason,
+            "file_type": self.file_type,
+            "pages": self.pages,
+            "stages_ms": {name: round(ms, 2) for name, ms in self.stages.items()},
+            "total_ms": round(self.total_ms, 2),
+            "payload_bytes": self.payload_bytes,
+            "api_calls": self.api_calls,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cached_tokens": self.cached_tokens,
+            "cost_usd": round(self.cost_usd, 6),
+        }
+
+
+_current_trace: ContextVar[Optional[ParseTrace]] = ContextVar("parse_trace", default=None)
+
+
+def current_trace() -> Optional[ParseTrace]:
+    """Trace of the parse running in this task, if any"""
+    return _current_trace.get()
+
+
+@contextmanager
+def tracing(trace: ParseTrace) -> Iterator[ParseTrace]:
+    """Make ``trace`` the current trace for the enclosed code"""
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        trace.finish()
+        _current_trace.reset(token)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time a stage of the current parse (no-op outside a trace)"""
+    trace = _current_trace.get()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if trace is not None:
+            trace.add_stage(name, (time.perf_counter() - started) * 1000)
+
+
+class ParseMetrics:
+    """Process-wide totals, labeled by tier and file type"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.parses: Dict[Tuple[str, str], int] = defaultdict(int)
+        self.latency_ms: Dict[Tuple[str, str], float] = defaultdict(float)
+        self.stage_ms: Dict[str, float] = defaultdict(float)
+        self.stage_count: Dict[str, int] = defaultdict(int)
+        self.tokens: Dict[str, int] = defaultdict(int)
+        self.payload_bytes = 0
+        self.cost_usd = 0.0
+        self.model_calls: Dict[str, int] = defaultdict(int)
+        self.model_ms: Dict[str, float] = defaultdict(float)
+        self.escalations: Dict[str, int] = defaultdict(int)
+
+    def record(self, trace: ParseTrace):
+        key = (trace.tier, trace.file_type)
+        with self._lock:
+            self.parses[key] += 1
+            self.latency_ms[key] += trace.total_ms
+            for name, ms in trace.stages.items():
+                self.stage_ms[name] += ms
+                self.stage_count[name] += 1
+            self.tokens["prompt"] += trace.prompt_tokens
+            self.tokens["completion"] += trace.completion_tokens
+            self.tokens["cached"] += trace.cached_tokens
+            self.payload_bytes += trace.payload_bytes
+            self.cost_usd += trace.cost_usd
+            for model, ms in trace.calls:
+                self.model_calls[model] += 1
+                self.model_ms[model] += ms
+            if trace.escalation_reason:
+                self.escalations[trace.escalation_reason] += 1
+
+    def cascade_stats(self) -> Dict[str, Any]:
+        """Per-model call latency and how often the fast model was overruled"""
+        with self._lock:
+            fast_calls = self.model_calls.get(settings.openai_fast_model, 0) if settings.openai_fast_model else 0
+            escalations = sum(self.escalations.values())
+            return {
+                "fast_model": settings.openai_fast_model or None,
+                "models": {
+                    model: {
+                        "calls": calls,
+                        "avg_latency_ms": round(self.model_ms[model] / calls, 2),
+                    }
+                    for model, calls in self.model_calls.items()
+                },
+                "escalations": escalations,
+                "escalation_rate": round(escalations / fast_calls, 4) if fast_calls else 0.0,
+                "escalation_reasons": dict(self.escalations),
+            }
+
+    def render_prometheus(self) -> str:
+        """Prometheus text exposition format"""
+        lines = [
+            "# HELP plexsync_parse_total Invoice parses by engine tier and file type",
+            "# TYPE plexsync_parse_total counter",
+        ]
+        with self._lock:
+            for (tier, file_type), count in sorted(self.parses.items()):
+                lines.append(f'plexsync_parse_total{{tier="{tier}",file_type="{file_type}"}} {count}')
+            lines += [
+                "# HELP plexsync_parse_seconds Parse wall time by engine tier and file type",
+                "# TYPE plexsync_parse_seconds summary",
+            ]
+            for (tier, file_type), ms in sorted(self.latency_ms.items()):
+                labels = f'tier="{tier}",file_type="{file_type}"'
+                lines.append(f"plexsync_parse_seconds_sum{{{labels}}} {ms / 1000:.6f}")
+                lines.append(f"plexsync_parse_seconds_count{{{labels}}} {self.parses[(tier, file_type)]}")
+            lines += [
+                "# HELP plexsync_parse_stage_seconds Time spent per parse stage",
+                "# TYPE plexsync_parse_stage_seconds summary",
+            ]
+            for name in sorted(self.stage_ms):
+                lines.append(f'plexsync_parse_stage_seconds_sum{{stage="{name}"}} {self.stage_ms[name] / 1000:.6f}')
+                lines.append(f'plexsync_parse_stage_seconds_count{{stage="{name}"}} {self.stage_count[name]}')
+            lines += [
+                "# HELP plexsync_model_call_seconds Model API call time by model",
+                "# TYPE plexsync_model_call_seconds summary",
+            ]
+            for model in sorted(self.model_calls):
+                lines.append(f'plexsync_model_call_seconds_sum{{model="{model}"}} {self.model_ms[model] / 1000:.6f}')
+                lines.append(f'plexsync_model_call_seconds_count{{model="{model}"}} {self.model_calls[model]}')
+            lines += [
+                "# HELP plexsync_parse_escalations_total Fast-model answers re-run on the full model",
+                "# TYPE plexsync_parse_escalations_total counter",
+            ]
+            for reason in sorted(self.escalations):
+                lines.append(f'plexsync_parse_escalations_total{{reason="{reason}"}} {self.escalations[reason]}')
+            lines += [
+                "# HELP plexsync_parse_tokens_total Model tokens used by parsing",
+                "# TYPE plexsync_parse_tokens_total counter",
+            ]
+            for kind in ("prompt", "completion", "cached"):
+                lines.append(f'plexsync_parse_tokens_total{{kind="{kind}"}} {self.tokens[kind]}')
+            lines += [
+                "# HELP plexsync_parse_payload_bytes_total Bytes sent to the model",
+                "# TYPE plexsync_parse_payload_bytes_total counter",
+                f"plexsync_parse_payload_bytes_total {self.payload_bytes}",
+                "# HELP plexsync_parse_cost_usd_total Estimated model cost",
+                "# TYPE plexsync_parse_cost_usd_total counter",
+                f"plexsync_parse_cost_usd_total {self.cost_usd:.6f}",
+            ]
+        return "\n".join(lines) + "\n"
+
+
+def invoice_metadata(
+    extra_metadata: Optional[Dict[str, Any]],
+    parsed_data: Dict[str, Any]
+) -> Dict[str, Any]:
+    """An invoice's extra_metadata with a parse's metrics and selected pages"""
+    return {
+        **(extra_metadata or {}),
+        "parse_metrics": parsed_data.get("parse_metrics"),
+        "selected_pages": parsed_data.get("selected_pages"),
+    }
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, round(pct / 100 * (len(ordered) - 1)))]
+
+
+def summarize_parse_costs(
+    records: Iterable[Tuple[Optional[str], Dict[str, Any]]],
+    group_by: Tuple[str, ...] = ("vendor_name", "file_type")
+) -> List[Dict[str, Any]]:
+    """
+    Aggregate stored parse metrics
+
+    ``records`` are (vendor_name, parse_metrics) pairs; groups are sorted
+    by total cost, most expensive first.
+    """
+    groups: Dict[Tuple, List[Dict[str, Any]]] = defaultdict(list)
+    for vendor_name, metrics in records:
+        if not metrics:
+            continue
+        row = {**metrics, "vendor_name": vendor_name or "Unknown"}
+        groups[tuple(row.get(field) for field in group_by)].append(row)
+
+    summary = []
+    for key, rows in groups.items():
+        latencies = [row.get("total_ms") or 0.0 for row in rows]
+        total_cost = sum(row.get("cost_usd") or 0.0 for row in rows)
+        tiers: Dict[str, int] = defaultdict(int)
+        for row in rows:
+            tiers[row.get("tier") or "unknown"] += 1
+        summary.append({
+            **dict(zip(group_by, key)),
+            "parses": len(rows),
+            "tiers": dict(tiers),
+            "total_cost_usd": round(total_cost, 6),
+            "avg_cost_usd": round(total_cost / len(rows), 6),
+            "avg_latency_ms": round(sum(latencies) / len(latencies), 2),
+            "p50_latency_ms": round(_percentile(latencies, 50), 2),
+            "p95_latency_ms": round(_percentile(latencies, 95), 2),
+            "prompt_tokens": sum(row.get("prompt_tokens") or 0 for row in rows),
+            "completion_tokens": sum(row.get("completion_tokens") or 0 for row in rows),
+            "payload_bytes": sum(row.get("payload_bytes") or 0 for row in rows),
+            "escalations": sum(1 for row in rows if row.get("escalation_reason")),
+        })
+    summary.sort(key=lambda group: group["total_cost_usd"], reverse=True)
+    return summary
+
+
+# Singleton instance
+parse_metrics = ParseMetrics()
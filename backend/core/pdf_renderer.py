@@ -0,0 +1,334 @@
+"""
+PDF Renderer - Rasterizes PDF pages off the event loop
+Pages are rendered and encoded in parallel in a process pool so
+rendering never blocks other requests. Sources are a file path or the
+PDF bytes themselves (uploads and email attachments already in memory);
+bytes are placed in shared memory once per document rather than pickled
+to the worker of every page
+
+Backends:
+- pdfium: renders in memory inside the worker (no subprocess, no temp files)
+- poppler: pdf2image / pdftoppm, kept as a fallback
+"""
+import asyncio
+import io
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from multiprocessing import shared_memory
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, TypeVar, Union
+from PIL import Image
+from config import settings
+from loguru import logger
+from core.image_encoder import EncodedImage, EncodingProfile, PNG_PROFILE, encode_image
+from core.page_cache import PageImageCache
+from core.parse_cache import hash_bytes, hash_file
+
+try:
+    import pypdfium2 as pdfium
+    PDFIUM_AVAILABLE = True
+except ImportError:
+    PDFIUM_AVAILABLE = False
+
+try:
+    from pdf2image import convert_from_bytes, convert_from_path, pdfinfo_from_bytes, pdfinfo_from_path
+    PDF2IMAGE_AVAILABLE = True
+except ImportError:
+    PDF2IMAGE_AVAILABLE = False
+
+try:
+    from pypdf import PdfReader
+    PYPDF_AVAILABLE = True
+except ImportError:
+    PYPDF_AVAILABLE = False
+
+RENDERING_AVAILABLE = PDFIUM_AVAILABLE or PDF2IMAGE_AVAILABLE
+
+T = TypeVar("T")
+
+# A PDF on disk (path) or in memory
+PDFSource = Union[str, bytes, memoryview]
+
+
+def describe_source(source: PDFSource) -> str:
+    """Path, or buffer size, for log messages"""
+    return source if isinstance(source, str) else f"<{memoryview(source).nbytes:,} byte buffer>"
+
+
+@dataclass(frozen=True)
+class _SharedBuffer:
+    """Handle to an in-memory file copied into shared memory (cheap to pickle)"""
+    name: str
+    size: int
+
+    def read(self) -> bytes:
+        block = shared_memory.SharedMemory(name=self.name)
+        view = block.buf[:self.size]
+        try:
+            return bytes(view)
+        finally:
+            view.release()
+            block.close()
+
+
+@contextmanager
+def _shared(args: Tuple[Any, ...]) -> Iterator[Tuple[Any, ...]]:
+    """``args`` with in-memory buffers moved to shared memory until exit"""
+    blocks = []
+    shared = []
+    try:
+        for arg in args:
+            if isinstance(arg, (bytes, bytearray, memoryview)):
+                view = memoryview(arg).cast("B")
+                block = shared_memory.SharedMemory(create=True, size=max(1, view.nbytes))
+                blocks.append(block)
+                block.buf[:view.nbytes] = view
+                shared.append(_SharedBuffer(block.name, view.nbytes))
+                view.release()
+            else:
+                shared.append(arg)
+        yield tuple(shared)
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+
+def _call_shared(fn: Callable[..., T], *args: Any) -> T:
+    """Run ``fn`` with shared buffers read back as bytes (runs in worker process)"""
+    return fn(*(arg.read() if isinstance(arg, _SharedBuffer) else arg for arg in args))
+
+
+def _count_pages(source: PDFSource) -> int:
+    """Return number of pages in a PDF (runs in worker process)"""
+    if PDFIUM_AVAILABLE:
+        pdf = pdfium.PdfDocument(source)
+        try:
+            return len(pdf)
+        finally:
+            pdf.close()
+    if PYPDF_AVAILABLE:
+        return len(PdfReader(source if isinstance(source, str) else io.BytesIO(source)).pages)
+    if isinstance(source, bytes):
+        return int(pdfinfo_from_bytes(source)["Pages"])
+    return int(pdfinfo_from_path(source)["Pages"])
+
+
+def _render_page_pdfium(source: PDFSource, page_number: int, dpi: int) -> Image.Image:
+    """Render a single 1-based page with PDFium"""
+    pdf = pdfium.PdfDocument(source)
+    try:
+        page = pdf[page_number - 1]
+        return page.render(scale=dpi / 72).to_pil()
+    finally:
+        pdf.close()
+
+
+def _render_page_poppler(source: PDFSource, page_number: int, dpi: int) -> Image.Image:
+    """Render a single 1-based page with pdftoppm"""
+    convert = convert_from_bytes if isinstance(source, bytes) else convert_from_path
+    images = convert(
+        source,
+        first_page=page_number,
+        last_page=page_number,
+        dpi=dpi
+    )
+    if not images:
+        raise RuntimeError(f"Failed to render page {page_number}")
+    return images[0]
+
+
+def _render_and_encode(
+    backend: str,
+    source: PDFSource,
+    page_number: int,
+    dpi: int,
+    profile: EncodingProfile
+) -> EncodedImage:
+    """Render and encode one page (runs in worker process)"""
+    started = time.perf_counter()
+    image = RENDER_BACKENDS[backend](source, page_number, dpi)
+    render_ms = (time.perf_counter() - started) * 1000
+    encoded = encode_image(image, profile)
+    encoded.render_ms = render_ms
+    return encoded
+
+
+RENDER_BACKENDS: Dict[str, Callable[[PDFSource, int, int], Image.Image]] = {
+    "pdfium": _render_page_pdfium,
+    "poppler": _render_page_poppler,
+}
+
+
+def available_backends() -> List[str]:
+    """Installed backends in order of preference"""
+    backends = []
+    if PDFIUM_AVAILABLE:
+        backends.append("pdfium")
+    if PDF2IMAGE_AVAILABLE:
+        backends.append("poppler")
+    return backends
+
+
+class PDFRenderer:
+    """
+    Renders PDF pages to PNG in a shared process pool
+
+    The pool is created on first use and shared by all parses, so
+    concurrent invoices are bounded by ``max_workers`` in total.
+    ``backend`` is "pdfium", "poppler" or "auto" (first available);
+    if the chosen backend fails the remaining ones are tried in order.
+    Encoded pages are kept in ``page_cache`` (if given), so the same
+    file is never rasterized twice at the same DPI and profile.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 4,
+        backend: str = "auto",
+        page_cache: Optional[PageImageCache] = None
+    ):
+        self.max_workers = max_workers
+        self.backend = backend
+        self.page_cache = page_cache
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def available(self) -> bool:
+        return bool(self._backend_order())
+
+    def _backend_order(self) -> List[str]:
+        backends = available_backends()
+        if self.backend in backends:
+            backends.remove(self.backend)
+            backends.insert(0, self.backend)
+        return backends
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+
+    async def render_pages(
+        self,
+        source: PDFSource,
+        max_pages: int = 5,
+        dpi: int = 200,
+        profile: EncodingProfile = PNG_PROFILE,
+        pages: Optional[List[int]] = None,
+        file_digest: Optional[str] = None
+    ) -> List[EncodedImage]:
+        """
+        Render the first ``max_pages`` pages of a PDF (or the given 1-based ``pages``)
+
+        Encoding happens in the worker too, so only the (small) encoded
+        page crosses the process boundary. Cached pages are reused;
+        ``file_digest`` (SHA-256 of the file) saves hashing it again.
+
+        Returns:
+            Encoded page per page, in page order
+        """
+        cache = self.page_cache if self.page_cache is not None and self.page_cache.enabled else None
+        if cache is None:
+            rendered = await self.map_pages(source, max_pages, _render_and_encode, dpi, profile, pages=pages)
+            logger.debug(f"Rendered {len(rendered)} page(s) at {dpi} dpi: {describe_source(source)}")
+            return rendered
+
+        if file_digest is None:
+            file_digest = await asyncio.to_thread(hash_file if isinstance(source, str) else hash_bytes, source)
+
+        page_count = None
+        if pages is None:
+            page_count = await asyncio.to_thread(cache.page_count, file_digest, dpi, profile)
+            if page_count is None:
+                page_count = await self.run_in_pool(_count_pages, source)
+            pages = list(range(1, min(page_count, max_pages) + 1))
+
+        found = await asyncio.to_thread(cache.get_pages, file_digest, dpi, profile, pages)
+        missing = [number for number in pages if number not in found]
+        if missing:
+            rendered = await self.map_pages(source, max_pages, _render_and_encode, dpi, profile, pages=missing)
+            found.update(zip(missing, rendered))
+            try:
+                await asyncio.to_thread(
+                    cache.put_pages, file_digest, dpi, profile, dict(zip(missing, rendered)), page_count
+                )
+            except OSError as e:
+                logger.warning(f"Failed to write page cache entry: {e}")
+
+        logger.debug(
+            f"Rendered {len(missing)} page(s), {len(pages) - len(missing)} from cache, "
+            f"at {dpi} dpi: {describe_source(source)}"
+        )
+        return [found[number] for number in pages]
+
+    async def map_pages(
+        self,
+        source: PDFSource,
+        max_pages: int,
+        page_fn: Callable[..., T],
+        *args: Any,
+        pages: Optional[List[int]] = None
+    ) -> List[T]:
+        """
+        Run ``page_fn(backend, source, page_number, *args)`` for each of
+        the first ``max_pages`` pages (or the given 1-based ``pages``) in
+        the pool, trying backends in order
+
+        ``page_fn`` must be a module-level (picklable) function. In-memory
+        sources are copied to shared memory once and read from there by
+        each page's worker; no temp file is written.
+        """
+        backends = self._backend_order()
+        if not backends:
+            raise RuntimeError("No PDF rendering backend installed (pypdfium2 or pdf2image)")
+
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+
+        with _shared((source,)) as (shared_source,):
+            if pages is None:
+                page_count = await loop.run_in_executor(executor, _call_shared, _count_pages, shared_source)
+                pages = list(range(1, min(page_count, max_pages) + 1))
+
+            last_error: Optional[Exception] = None
+            for backend in backends:
+                try:
+                    results = await asyncio.gather(*[
+                        loop.run_in_executor(
+                            executor, _call_shared, page_fn, backend, shared_source, page_number, *args
+                        )
+                        for page_number in pages
+                    ])
+                    return list(results)
+                except Exception as e:
+                    logger.warning(f"PDF page processing with {backend} failed: {e}")
+                    last_error = e
+
+        raise last_error
+
+    async def run_in_pool(self, fn: Callable[..., T], *args: Any) -> T:
+        """Run a module-level function in the shared worker pool (buffers go via shared memory)"""
+        with _shared(args) as shared_args:
+            return await asyncio.get_running_loop().run_in_executor(
+                self._get_executor(), _call_shared, fn, *shared_args
+            )
+
+    def shutdown(self):
+        """Stop worker processes"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# Singleton instance
+pdf_renderer = PDFRenderer(
+    max_workers=settings.pdf_render_workers,
+    backend=settings.pdf_render_backend,
+    page_cache=PageImageCache(
+        cache_dir=settings.page_cache_dir,
+        max_bytes=settings.page_cache_max_mb * 1024 * 1024,
+        enabled=settings.page_cache_enabled
+    )
+)
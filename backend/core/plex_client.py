@@ -17,6 +17,7 @@ class PlexClient:
     - get_received_invoices() - Get invoices with status "RECEIVED"
     - update_invoice_number() - Change invoice number from "RECEIVED" to actual
     - get_purchase_order() - Get PO details
+    - list_purchase_orders() - Page through POs (for the local mirror)
     """
 
     def __init__(self):
@@ -160,6 +161,45 @@ class PlexClient:
         params = {"pONumber": po_number}  # Plex API uses camelCase: pONumber
         return await self._request("GET", endpoint, params=params)
 
+    async def list_purchase_orders(
+        self,
+        offset: int = 0,
+        limit: int = 500,
+        status: Optional[str] = None,
+        modified_since: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Get one page of purchase orders
+
+        Args:
+            offset: Records to skip
+            limit: Page size
+            status: Filter by status (e.g., "Open")
+            modified_since: ISO timestamp; only POs modified after it
+
+        Returns:
+            List of PO records from Plex
+
+        Raises:
+            ValueError: The response isn't a list or a known envelope
+        """
+        endpoint = settings.plex_po_endpoint
+        params = {"offset": offset, "limit": limit}
+        if status:
+            params["status"] = status
+        if modified_since:
+            params[settings.plex_po_modified_since_param] = modified_since
+
+        result = await self._request("GET", endpoint, params=params)
+        if isinstance(result, list):
+            return result
+        if isinstance(result, dict):
+            for key in ("purchaseOrders", "items"):
+                if isinstance(result.get(key), list):
+                    return result[key]
+        # An empty list here would look like "no open POs" to the mirror
+        raise ValueError(f"Unrecognised purchase order response from Plex: {str(result)[:200]}")
+
     async def sync_invoice(
         self,
         vendor_invoice_number: str,
@@ -0,0 +1,259 @@
+"""
+PO Index - In-memory lookup structures for purchase order matching
+Built once from the open POs and updated incrementally, so matching an
+invoice costs a few hash lookups instead of scans over every PO. Opt-in:
+the PO mirror only maintains one when PO_INDEX_IN_MEMORY is set
+"""
+import math
+import threading
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from models import PurchaseOrder
+from core.vendor_names import VENDOR_SIMILARITY, trigrams, vendor_names
+
+# Invoice and PO totals may differ by this fraction of the PO total
+AMOUNT_TOLERANCE = 0.05
+
+# PO statuses that can still be matched
+OPEN_STATUSES = ("open", "partial")
+
+_GRAM = 3  # length of vendor_names.trigrams
+
+
+@lru_cache(maxsize=65536)
+def normalize_po_number(po_number: str) -> str:
+    """Uppercase PO number without spaces or dashes"""
+    return po_number.replace(" ", "").replace("-", "").upper()
+
+
+def _substrings(text: str) -> Iterable[str]:
+    for start in range(len(text)):
+        for end in range(start + 1, len(text) + 1):
+            yield text[start:end]
+
+
+class ContainmentIndex:
+    """
+    Keys -> positions, answering "which keys contain or are contained in
+    ``query``": keys inside the query are found by looking up the query's
+    substrings, keys around it through a trigram index. The same index
+    gives trigram (Jaccard) similarity.
+    """
+
+    def __init__(self):
+        self.keys: Dict[str, Set[int]] = defaultdict(set)
+        self._grams: Dict[str, Set[str]] = defaultdict(set)
+
+    def add(self, key: str, position: int):
+        if not self.keys[key]:
+            for gram in trigrams(key):
+                self._grams[gram].add(key)
+        self.keys[key].add(position)
+
+    def remove(self, key: str, position: int):
+        positions = self.keys.get(key)
+        if positions is None:
+            return
+        positions.discard(position)
+        if not positions:
+            del self.keys[key]
+            for gram in trigrams(key):
+                self._grams[gram].discard(key)
+                if not self._grams[gram]:
+                    del self._grams[gram]
+
+    def related(self, query: str) -> Set[str]:
+        """Keys equal to, containing or contained in ``query``"""
+        found = {sub for sub in set(_substrings(query)) if sub in self.keys}
+        if len(query) >= _GRAM:
+            postings = sorted((self._grams.get(gram, set()) for gram in trigrams(query)), key=len)
+            candidates = set.intersection(*postings) if postings else set()
+        else:
+            # Too short for trigrams: rare junk extractions, scan the keys
+            candidates = self.keys.keys()
+        found.update(key for key in candidates if query in key)
+        return found
+
+    def similar(self, query: str, threshold: float = VENDOR_SIMILARITY) -> Dict[str, float]:
+        """Keys whose trigram similarity to ``query`` is at least ``threshold``"""
+        query_grams = trigrams(query)
+        if not query_grams:
+            return {}
+        # A similar key shares at least ``required`` grams, so it appears in
+        # one of the rarest len - required + 1 postings (prefix filtering)
+        required = math.ceil(threshold * len(query_grams))
+        postings = sorted((self._grams.get(gram, set()) for gram in query_grams), key=len)
+        candidates = set().union(*postings[:len(query_grams) - required + 1])
+        found = {}
+        for key in candidates:
+            key_grams = trigrams(key)
+            shared = len(query_grams & key_grams)
+            similarity = shared / (len(query_grams) + len(key_grams) - shared)
+            if similarity >= threshold:
+                found[key] = similarity
+        return found
+
+    def vendors(self, query: str) -> Set[str]:
+        """Keys that are the same vendor as ``query`` (see VendorNames.same_vendor)"""
+        return self.related(query) | self.similar(query).keys()
+
+
+class POIndex:
+    """
+    Purchase orders indexed for the three matching rules
+
+    - exact PO number: hash map
+    - normalized PO number containment (either way): substring/trigram index
+    - same vendor (canonical names contained or trigram-similar) + amount
+      within tolerance: vendor index with amounts kept sorted per vendor,
+      searched by bisection
+
+    Ties go to the PO added first, as in a scan over the PO list. Updating
+    a PO keeps its place.
+    """
+
+    def __init__(self, pos: Iterable[PurchaseOrder] = ()):
+        self._lock = threading.Lock()
+        self._next_position = 0
+        self._positions: Dict[str, int] = {}  # po_number -> position
+        self._pos: Dict[int, PurchaseOrder] = {}
+        self._vendor_keys: Dict[int, str] = {}  # position -> canonical vendor
+        self._exact: Dict[str, Set[int]] = defaultdict(set)
+        self._numbers = ContainmentIndex()
+        self._vendors = ContainmentIndex()
+        # vendor key -> parallel sorted (amount, position) lists
+        self._amounts: Dict[str, Tuple[List[float], List[int]]] = {}
+        for po in pos:
+            self.add(po)
+
+    def __len__(self) -> int:
+        return len(self._pos)
+
+    def __contains__(self, po_number: str) -> bool:
+        return po_number in self._positions
+
+    def get(self, po_number: str) -> Optional[PurchaseOrder]:
+        position = self._positions.get(po_number)
+        return self._pos.get(position) if position is not None else None
+
+    def add(self, po: PurchaseOrder):
+        """Add a PO, or replace the indexed PO with the same number"""
+        with self._lock:
+            position = self._positions.get(po.po_number)
+            if position is not None:
+                self._unindex(position)
+            else:
+                position = self._next_position
+                self._next_position += 1
+                self._positions[po.po_number] = position
+            self._pos[position] = po
+            self._exact[po.po_number].add(position)
+            normalized = normalize_po_number(po.po_number)
+            if normalized:
+                self._numbers.add(normalized, position)
+            vendor = vendor_names.canonical(po.vendor_name)
+            self._vendor_keys[position] = vendor
+            if vendor:
+                self._vendors.add(vendor, position)
+                if po.total_amount and po.total_amount > 0:
+                    amounts, positions = self._amounts.setdefault(vendor, ([], []))
+                    at = bisect_right(amounts, po.total_amount)
+                    amounts.insert(at, po.total_amount)
+                    positions.insert(at, position)
+
+    def update(self, po: PurchaseOrder):
+        self.add(po)
+
+    def remove(self, po_number: str) -> bool:
+        """Drop a PO (e.g. closed or cancelled); False if it wasn't indexed"""
+        with self._lock:
+            position = self._positions.pop(po_number, None)
+            if position is None:
+                return False
+            self._unindex(position)
+            del self._pos[position]
+            return True
+
+    def _unindex(self, position: int):
+        po = self._pos[position]
+        self._exact[po.po_number].discard(position)
+        if not self._exact[po.po_number]:
+            del self._exact[po.po_number]
+        normalized = normalize_po_number(po.po_number)
+        if normalized:
+            self._numbers.remove(normalized, position)
+        vendor = self._vendor_keys.pop(position)
+        if vendor:
+            self._vendors.remove(vendor, position)
+            if vendor in self._amounts:
+                amounts, positions = self._amounts[vendor]
+                at = positions.index(position) if position in positions else None
+                if at is not None:
+                    del amounts[at]
+                    del positions[at]
+                if not positions:
+                    del self._amounts[vendor]
+
+    def _first(self, positions: Iterable[int]) -> Optional[PurchaseOrder]:
+        position = min(positions, default=None)
+        return self._pos[position] if position is not None else None
+
+    def find_exact(self, po_number: str) -> Optional[PurchaseOrder]:
+        return self._first(self._exact.get(po_number, ()))
+
+    def find_fuzzy(self, po_number: str) -> Optional[PurchaseOrder]:
+        """PO whose normalized number equals, contains or is contained in ``po_number``'s"""
+        normalized = normalize_po_number(po_number)
+        if not normalized:
+            return None
+        return self._first(
+            position
+            for key in self._numbers.related(normalized)
+            for position in self._numbers.keys[key]
+        )
+
+    def find_by_vendor_and_amount(self, vendor_name: str, total_amount: float) -> Optional[PurchaseOrder]:
+        """PO of the same vendor whose total is within tolerance of ``total_amount``"""
+        vendor = vendor_names.canonical(vendor_name)
+        if not vendor or not total_amount or total_amount <= 0:
+            return None
+        # |total - po| <= po * tolerance  <=>  total / (1 + t) <= po <= total / (1 - t)
+        low = total_amount / (1 + AMOUNT_TOLERANCE)
+        high = total_amount / (1 - AMOUNT_TOLERANCE)
+        matches = []
+        for key in self._vendors.vendors(vendor):
+            if key not in self._amounts:
+                continue
+            amounts, positions = self._amounts[key]
+            for at in range(bisect_left(amounts, low * (1 - 1e-9)), bisect_right(amounts, high * (1 + 1e-9))):
+                if abs(total_amount - amounts[at]) <= amounts[at] * AMOUNT_TOLERANCE:
+                    matches.append(positions[at])
+        return self._first(matches)
+
+    def match(
+        self,
+        po_numbers: List[str],
+        vendor_name: Optional[str],
+        total_amount: Optional[float]
+    ) -> Tuple[Optional[PurchaseOrder], Optional[str]]:
+        """
+        Best PO and the rule that found it ("exact", "fuzzy", "vendor_amount")
+
+        Rules are tried in order: exact number, then normalized number
+        containment, then vendor name + amount.
+        """
+        with self._lock:
+            for po_number in po_numbers:
+                po = self.find_exact(po_number)
+                if po is not None:
+                    return po, "exact"
+            for po_number in po_numbers:
+                po = self.find_fuzzy(po_number)
+                if po is not None:
+                    return po, "fuzzy"
+            po = self.find_by_vendor_and_amount(vendor_name, total_amount)
+            if po is not None:
+                return po, "vendor_amount"
+        return None, None
@@ -0,0 +1,353 @@
+"""
+PO Mirror - Keeps the local purchase_orders table in step with Plex
+Open POs are bulk-loaded with parallel page fetches, then only POs
+modified since the last poll are fetched and upserted in batches, so
+matching and sync read POs locally instead of calling Plex per invoice
+"""
+import asyncio
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+from sqlalchemy import func, text, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlmodel import Session, select
+from config import settings
+from core.plex_client import plex_client
+from core.matcher import po_matcher
+from core.po_index import OPEN_STATUSES
+from core.po_search import search_columns
+from models import PurchaseOrder
+from loguru import logger
+
+# Re-read changes this far before the last poll (clock skew with Plex)
+_DELTA_OVERLAP = timedelta(minutes=5)
+
+# Postgres advisory lock held by the one process that polls Plex
+_LEADER_LOCK_KEY = 0x504F4D52  # "POMR"
+
+
+def _first(data: Dict[str, Any], *keys: str) -> Any:
+    for key in keys:
+        value = data.get(key)
+        if value not in (None, ""):
+            return value
+    return None
+
+
+def _parse_date(value: Any) -> Optional[date]:
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(str(value)[:10])
+    except ValueError:
+        return None
+
+
+def _parse_amount(value: Any) -> float:
+    try:
+        return float(value or 0.0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def po_from_plex(data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """PurchaseOrder fields from a Plex PO record (None without a PO number)"""
+    po_number = _first(data, "poNumber", "pONumber", "po_number")
+    if not po_number:
+        return None
+    supplier = data.get("supplier") if isinstance(data.get("supplier"), dict) else {}
+    plex_id = _first(data, "id", "purchaseOrderId")
+    return {
+        "po_number": str(po_number),
+        "plex_po_id": str(plex_id) if plex_id is not None else None,
+        "vendor_code": _first(data, "supplierCode", "vendorCode") or supplier.get("code"),
+        "vendor_name": _first(data, "supplierName", "vendorName", "vendor_name") or supplier.get("name") or "",
+        "po_type": str(_first(data, "poType", "type") or "standard").lower(),
+        "po_date": _parse_date(_first(data, "poDate", "orderDate")),
+        "expected_delivery_date": _parse_date(_first(data, "dueDate", "expectedDeliveryDate")),
+        "total_amount": _parse_amount(_first(data, "totalAmount", "amount", "total_amount")),
+        "currency": _first(data, "currencyCode", "currency") or "USD",
+        "status": str(_first(data, "status") or "open").lower(),
+        "line_items": _first(data, "lineItems", "lines", "line_items") or [],
+        "plex_data": data,
+    }
+
+
+class POMirror:
+    """
+    Background worker mirroring Plex purchase orders
+
+    - ``full_sync``: all open POs, ``po_mirror_concurrency`` pages at a time;
+      local POs no longer open in Plex are marked closed
+    - ``delta_sync``: POs modified since the previous poll (any status)
+    - ``refresh_po``: one PO, for a number the mirror hasn't seen yet
+
+    With ``po_index_in_memory`` every upsert also updates the matcher's PO
+    index; otherwise matching queries the table (core.po_search).
+
+    Only one process polls Plex: on Postgres the loop runs in whichever
+    worker holds an advisory lock. On other databases, enable the mirror
+    (PO_MIRROR_ENABLED) in one process only.
+    """
+
+    def __init__(self, engine=None):
+        self._engine = engine
+        self.running = False
+        self.task: Optional[asyncio.Task] = None
+        self.watermark: Optional[datetime] = None
+        self.last_full_sync: Optional[datetime] = None
+        self.last_delta_sync: Optional[datetime] = None
+        self.last_error: Optional[str] = None
+        self.upserted = 0
+        self.leader = False
+        self._leader_connection = None
+
+    @property
+    def engine(self):
+        if self._engine is None:
+            from db.session import engine
+            self._engine = engine
+        return self._engine
+
+    async def fetch_all(self, **params) -> List[Dict[str, Any]]:
+        """Every page of a PO query, fetched in parallel waves"""
+        page_size = settings.po_mirror_page_size
+        concurrency = max(1, settings.po_mirror_concurrency)
+        records: List[Dict[str, Any]] = []
+        offset = 0
+        while True:
+            pages = await asyncio.gather(*(
+                plex_client.list_purchase_orders(offset=offset + i * page_size, limit=page_size, **params)
+                for i in range(concurrency)
+            ))
+            for page in pages:
+                records.extend(page)
+            if any(len(page) < page_size for page in pages):
+                return records
+            offset += page_size * concurrency
+
+    def _upsert(self, rows: List[Dict[str, Any]], close_missing: bool = False) -> int:
+        """INSERT ... ON CONFLICT (po_number) DO UPDATE in batches (runs in a worker thread)"""
+        rows = list({row["po_number"]: row for row in rows}.values())
+        batch_size = max(1, settings.po_mirror_batch_size)
+        now = datetime.now(timezone.utc)
+        dialect = postgresql if self.engine.dialect.name == "postgresql" else sqlite
+        table = PurchaseOrder.__table__
+
+        for start in range(0, len(rows), batch_size):
+            batch = [
+                {**row, **search_columns(row["po_number"], row["vendor_name"]), "updated_at": now}
+                for row in rows[start:start + batch_size]
+            ]
+            statement = dialect.insert(table).values([
+                {**row, "created_at": now, "received_items": {}} for row in batch
+            ])
+            # Core statements skip the ORM's mapper events, so the search
+            # columns are part of the rows; received_items is kept on update
+            statement = statement.on_conflict_do_update(
+                index_elements=["po_number"],
+                set_={column: statement.excluded[column] for column in batch[0]}
+            )
+            with Session(self.engine) as session:
+                session.execute(statement)
+                session.commit()
+
+            if settings.po_index_in_memory:
+                with Session(self.engine, expire_on_commit=False) as session:
+                    numbers = [row["po_number"] for row in batch]
+                    self._update_index(
+                        session.exec(select(PurchaseOrder).where(PurchaseOrder.po_number.in_(numbers))).all()
+                    )
+
+        if close_missing:
+            self._close_missing({row["po_number"] for row in rows}, now)
+        return len(rows)
+
+    def _close_missing(self, open_numbers: set, now: datetime):
+        """
+        Mark local open POs that Plex no longer lists as open (one UPDATE)
+
+        Skipped when Plex returned no open POs, or far fewer than are open
+        locally (po_mirror_close_min_ratio): an empty or truncated response
+        must not close the whole mirror.
+        """
+        with Session(self.engine) as session:
+            local_open = session.exec(
+                select(func.count()).select_from(PurchaseOrder).where(PurchaseOrder.status.in_(OPEN_STATUSES))
+            ).one()
+            if not open_numbers or len(open_numbers) < local_open * settings.po_mirror_close_min_ratio:
+                if local_open:
+                    logger.warning(
+                        f"Plex listed {len(open_numbers)} open PO(s) against {local_open} open locally - "
+                        "not closing missing POs"
+                    )
+                return
+            closed = session.execute(
+                update(PurchaseOrder)
+                .where(PurchaseOrder.status.in_(OPEN_STATUSES))
+                .where(PurchaseOrder.po_number.not_in(open_numbers))
+                .values(status="closed", updated_at=now)
+                .returning(PurchaseOrder.po_number)
+            ).scalars().all()
+            session.commit()
+        if settings.po_index_in_memory:
+            for po_number in closed:
+                po_matcher.index.remove(po_number)
+        if closed:
+            logger.info(f"Closed {len(closed)} PO(s) no longer open in Plex")
+
+    def _update_index(self, pos: List[PurchaseOrder]):
+        if not settings.po_index_in_memory:
+            return
+        for po in pos:
+            if po.status in OPEN_STATUSES:
+                po_matcher.index.add(po)
+            else:
+                po_matcher.index.remove(po.po_number)
+
+    def _load_index(self):
+        if not settings.po_index_in_memory:
+            return
+        with Session(self.engine, expire_on_commit=False) as session:
+            pos = session.exec(select(PurchaseOrder).where(PurchaseOrder.status.in_(OPEN_STATUSES))).all()
+        po_matcher.load_purchase_orders(pos)
+
+    @staticmethod
+    def _rows(records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return [row for row in (po_from_plex(record) for record in records) if row is not None]
+
+    async def full_sync(self) -> int:
+        """Bulk-load all open POs; returns the number upserted"""
+        started = datetime.now(timezone.utc)
+        await asyncio.to_thread(self._load_index)
+        records = await self.fetch_all(status=settings.plex_po_open_status)
+        count = await asyncio.to_thread(self._upsert, self._rows(records), True)
+        self.watermark = started
+        self.last_full_sync = datetime.now(timezone.utc)
+        self.upserted += count
+        logger.success(f"PO mirror loaded {count} open PO(s) in {(self.last_full_sync - started).total_seconds():.1f}s")
+        return count
+
+    async def delta_sync(self) -> int:
+        """Upsert POs modified since the last sync; returns the number upserted"""
+        if self.watermark is None:
+            return await self.full_sync()
+        started = datetime.now(timezone.utc)
+        since = (self.watermark - _DELTA_OVERLAP).isoformat()
+        records = await self.fetch_all(modified_since=since)
+        count = await asyncio.to_thread(self._upsert, self._rows(records))
+        self.watermark = started
+        self.last_delta_sync = datetime.now(timezone.utc)
+        self.upserted += count
+        if count:
+            logger.info(f"PO mirror updated {count} PO(s) modified since {since}")
+        return count
+
+    async def refresh_po(self, po_number: str) -> Optional[PurchaseOrder]:
+        """Fetch one PO from Plex into the mirror (None if Plex doesn't have it)"""
+        try:
+            data = await plex_client.get_purchase_order(po_number)
+        except Exception as e:
+            logger.warning(f"Failed to fetch PO {po_number} from Plex: {e}")
+            return None
+        records = data if isinstance(data, list) else [data]
+        rows = [row for row in self._rows(records) if row["po_number"] == po_number]
+        if not rows:
+            return None
+        await asyncio.to_thread(self._upsert, rows)
+        with Session(self.engine, expire_on_commit=False) as session:
+            return session.exec(select(PurchaseOrder).where(PurchaseOrder.po_number == po_number)).first()
+
+    def _acquire_leadership(self) -> bool:
+        """
+        Whether this process polls Plex: on Postgres the holder of a session
+        advisory lock (standbys retry every poll, so one takes over if the
+        leader exits); elsewhere every process with the mirror enabled
+        """
+        if self.leader:
+            return True
+        if self.engine.dialect.name != "postgresql":
+            self.leader = True
+            return True
+        connection = self.engine.connect()
+        acquired = connection.execute(
+            text("SELECT pg_try_advisory_lock(:key)"), {"key": _LEADER_LOCK_KEY}
+        ).scalar()
+        connection.commit()
+        if acquired:
+            self._leader_connection = connection
+            self.leader = True
+            logger.info("PO mirror leadership acquired - this process polls Plex")
+        else:
+            connection.close()
+        return self.leader
+
+    def _release_leadership(self):
+        if self._leader_connection is not None:
+            try:
+                self._leader_connection.execute(
+                    text("SELECT pg_advisory_unlock(:key)"), {"key": _LEADER_LOCK_KEY}
+                )
+                self._leader_connection.close()
+            except Exception as e:
+                logger.warning(f"Failed to release PO mirror lock: {e}")
+            self._leader_connection = None
+        self.leader = False
+
+    async def _sync_loop(self):
+        """Full load, then delta polls at the configured interval (leader only)"""
+        logger.info(f"PO mirror started - polling Plex every {settings.po_mirror_poll_interval} seconds")
+        while self.running:
+            try:
+                if not await asyncio.to_thread(self._acquire_leadership):
+                    # Another process polls Plex; just pick up its changes
+                    await asyncio.to_thread(self._load_index)
+                elif self.last_full_sync is None:
+                    await self.full_sync()
+                else:
+                    await self.delta_sync()
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+                logger.error(f"Error in PO mirror loop: {e}")
+
+            await asyncio.sleep(settings.po_mirror_poll_interval)
+
+    def start(self):
+        """Start the PO mirror"""
+        if self.running:
+            logger.warning("PO mirror is already running")
+            return
+
+        if not settings.po_mirror_enabled:
+            logger.info("PO mirror is disabled - worker not started")
+            return
+
+        self.running = True
+        self.task = asyncio.create_task(self._sync_loop())
+
+    def stop(self):
+        """Stop the PO mirror"""
+        if not self.running:
+            return
+
+        self.running = False
+        if self.task:
+            self.task.cancel()
+        self._release_leadership()
+        logger.info("PO mirror stopped")
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "leader": self.leader,
+            "indexed_open_pos": len(po_matcher.index),
+            "watermark": self.watermark.isoformat() if self.watermark else None,
+            "last_full_sync": self.last_full_sync.isoformat() if self.last_full_sync else None,
+            "last_delta_sync": self.last_delta_sync.isoformat() if self.last_delta_sync else None,
+            "upserted": self.upserted,
+            "last_error": self.last_error,
+        }
+
+
+# Singleton instance
+po_mirror = POMirror()
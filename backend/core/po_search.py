@@ -0,0 +1,233 @@
+"""
+PO Search - Database-side candidate retrieval for PO matching
+purchase_orders keeps a normalized PO number and a canonical vendor name,
+indexed for substring and similarity search (pg_trgm GIN on Postgres,
+an FTS5 trigram table on SQLite), so one query per invoice returns the
+few POs worth scoring
+
+The columns are filled by ORM mapper events; Core and bulk inserts skip
+those and must include search_columns() in their values.
+"""
+import math
+from typing import Dict, List, Optional, Sequence
+from sqlalchemy import bindparam, case, event, false, inspect, or_, select as sa_select, text, update
+from sqlmodel import Session, select
+from models import PurchaseOrder
+from core.po_index import AMOUNT_TOLERANCE, OPEN_STATUSES, normalize_po_number
+from core.vendor_names import VENDOR_SIMILARITY, canonicalize_vendor, trigrams, vendor_names
+from loguru import logger
+
+# Candidates returned per invoice
+CANDIDATE_LIMIT = 50
+
+_SQLITE_FTS = "purchase_orders_fts"
+
+
+def search_columns(po_number: Optional[str], vendor_name: Optional[str]) -> Dict[str, str]:
+    """Values of the search columns for a PO number and vendor name"""
+    return {
+        "po_number_normalized": normalize_po_number(po_number or ""),
+        "vendor_canonical": canonicalize_vendor(vendor_name or ""),
+    }
+
+
+@event.listens_for(PurchaseOrder, "before_insert")
+@event.listens_for(PurchaseOrder, "before_update")
+def _set_search_columns(mapper, connection, po: PurchaseOrder):
+    """
+    Keep the search columns in step with po_number and vendor_name
+
+    Mapper events only fire for ORM flushes: Core and bulk inserts/updates
+    must set the columns themselves (see search_columns).
+    """
+    for column, value in search_columns(po.po_number, po.vendor_name).items():
+        setattr(po, column, value)
+
+
+def migrate_search_columns(engine, batch_size: int = 1000) -> int:
+    """
+    Bring an existing purchase_orders table up to date (idempotent)
+
+    create_all doesn't alter existing tables, so the search columns and
+    their indexes are added here, and rows written before them (or by Core
+    statements that set neither) are backfilled. Returns the rows backfilled.
+    """
+    table = PurchaseOrder.__table__
+    existing = {column["name"] for column in inspect(engine).get_columns(table.name)}
+    with engine.begin() as connection:
+        for column in ("po_number_normalized", "vendor_canonical"):
+            if column not in existing:
+                logger.info(f"Adding purchase_orders.{column}")
+                connection.execute(text(
+                    f"ALTER TABLE purchase_orders ADD COLUMN {column} VARCHAR NOT NULL DEFAULT ''"
+                ))
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+
+    backfilled = 0
+    stale = or_(table.c.po_number_normalized == "", table.c.vendor_canonical == "")
+    last_id = 0
+    while True:
+        with engine.begin() as connection:
+            rows = connection.execute(
+                sa_select(table.c.id, table.c.po_number, table.c.vendor_name)
+                .where(stale, table.c.id > last_id)
+                .order_by(table.c.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            connection.execute(
+                update(table).where(table.c.id == bindparam("row_id")),
+                [{"row_id": row.id, **search_columns(row.po_number, row.vendor_name)} for row in rows]
+            )
+        backfilled += len(rows)
+        last_id = rows[-1].id
+    if backfilled:
+        logger.info(f"Backfilled search columns for {backfilled} purchase order(s)")
+    return backfilled
+
+
+def create_search_indexes(engine):
+    """Add and backfill the search columns, then create the dialect's substring/similarity indexes (idempotent)"""
+    migrate_search_columns(engine)
+    dialect = engine.dialect.name
+    with engine.begin() as connection:
+        if dialect == "postgresql":
+            connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+            for column in ("po_number_normalized", "vendor_canonical"):
+                connection.execute(text(
+                    f"CREATE INDEX IF NOT EXISTS ix_purchase_orders_{column}_trgm "
+                    f"ON purchase_orders USING gin ({column} gin_trgm_ops)"
+                ))
+        elif dialect == "sqlite":
+            connection.execute(text(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {_SQLITE_FTS} USING fts5("
+                "po_number_normalized, vendor_canonical, "
+                "content='purchase_orders', content_rowid='id', tokenize='trigram')"
+            ))
+            # External-content FTS tables are kept in sync by triggers
+            connection.execute(text(
+                f"CREATE TRIGGER IF NOT EXISTS {_SQLITE_FTS}_ai AFTER INSERT ON purchase_orders BEGIN "
+                f"INSERT INTO {_SQLITE_FTS}(rowid, po_number_normalized, vendor_canonical) "
+                "VALUES (new.id, new.po_number_normalized, new.vendor_canonical); END"
+            ))
+            connection.execute(text(
+                f"CREATE TRIGGER IF NOT EXISTS {_SQLITE_FTS}_ad AFTER DELETE ON purchase_orders BEGIN "
+                f"INSERT INTO {_SQLITE_FTS}({_SQLITE_FTS}, rowid, po_number_normalized, vendor_canonical) "
+                "VALUES ('delete', old.id, old.po_number_normalized, old.vendor_canonical); END"
+            ))
+            connection.execute(text(
+                f"CREATE TRIGGER IF NOT EXISTS {_SQLITE_FTS}_au AFTER UPDATE ON purchase_orders BEGIN "
+                f"INSERT INTO {_SQLITE_FTS}({_SQLITE_FTS}, rowid, po_number_normalized, vendor_canonical) "
+                "VALUES ('delete', old.id, old.po_number_normalized, old.vendor_canonical); "
+                f"INSERT INTO {_SQLITE_FTS}(rowid, po_number_normalized, vendor_canonical) "
+                "VALUES (new.id, new.po_number_normalized, new.vendor_canonical); END"
+            ))
+            connection.execute(text(f"INSERT INTO {_SQLITE_FTS}({_SQLITE_FTS}) VALUES ('rebuild')"))
+        else:
+            logger.info(f"No substring index for {dialect}; PO search falls back to LIKE scans")
+
+
+def _substrings(text_value: str) -> List[str]:
+    return sorted({
+        text_value[start:end]
+        for start in range(len(text_value))
+        for end in range(start + 1, len(text_value) + 1)
+    })
+
+
+def _fts_phrase(value: str) -> str:
+    return '"' + value.replace('"', '""') + '"'
+
+
+def _fts_match(query: str):
+    """PurchaseOrder ids matching an FTS5 query"""
+    return PurchaseOrder.id.in_(
+        sa_select(text("rowid")).select_from(text(_SQLITE_FTS)).where(
+            text(f"{_SQLITE_FTS} MATCH :query").bindparams(bindparam("query", query, unique=True))
+        )
+    )
+
+
+def _contains(session: Session, column, value: str):
+    """``column`` contains ``value``, through the dialect's substring index"""
+    dialect = session.get_bind().dialect.name
+    if dialect == "sqlite" and len(value) >= 3:
+        return _fts_match(f"{column.key}: {_fts_phrase(value)}")
+    # pg_trgm's GIN index serves LIKE '%value%' directly
+    return column.contains(value, autoescape=True)
+
+
+def _similar(session: Session, column, value: str):
+    """``column`` may be trigram-similar to ``value`` (verified afterwards)"""
+    dialect = session.get_bind().dialect.name
+    if dialect == "postgresql":
+        return column.op("%")(value)
+    grams = sorted(trigrams(value))
+    if dialect == "sqlite" and grams:
+        # A similar name shares ceil(threshold * n) of the n grams, so it
+        # contains one of any n - required + 1 of them
+        required = math.ceil(VENDOR_SIMILARITY * len(grams))
+        query = " OR ".join(_fts_phrase(gram) for gram in grams[:len(grams) - required + 1])
+        return _fts_match(f"{column.key}: ({query})")
+    return false()
+
+
+def find_candidates(
+    session: Session,
+    po_numbers: Sequence[str],
+    vendor_name: Optional[str],
+    total_amount: Optional[float],
+    limit: int = CANDIDATE_LIMIT
+) -> List[PurchaseOrder]:
+    """
+    Open POs that could match an invoice, in one query
+
+    Candidates share a PO number (exact, or normalized and contained
+    either way) or are the same vendor with a total within tolerance.
+    Number matches sort first, then by id, so the short list keeps the PO
+    the matching rules would pick.
+    """
+    po_numbers = [number for number in po_numbers or [] if number]
+    normalized = [value for value in {normalize_po_number(number) for number in po_numbers} if value]
+
+    exact = PurchaseOrder.po_number.in_(po_numbers) if po_numbers else false()
+    number_conditions = [exact]
+    for value in normalized:
+        number_conditions.append(PurchaseOrder.po_number_normalized.in_(_substrings(value)))
+        number_conditions.append(_contains(session, PurchaseOrder.po_number_normalized, value))
+    number_match = or_(*number_conditions)
+
+    conditions = [number_match]
+    vendor = vendor_names.canonical(vendor_name)
+    if vendor and total_amount and total_amount > 0:
+        conditions.append(
+            PurchaseOrder.total_amount.between(
+                total_amount / (1 + AMOUNT_TOLERANCE) * (1 - 1e-9),
+                total_amount / (1 - AMOUNT_TOLERANCE) * (1 + 1e-9)
+            )
+            & or_(
+                PurchaseOrder.vendor_canonical.in_(_substrings(vendor)),
+                _contains(session, PurchaseOrder.vendor_canonical, vendor),
+                _similar(session, PurchaseOrder.vendor_canonical, vendor),
+            )
+        )
+
+    query = (
+        select(PurchaseOrder)
+        .where(PurchaseOrder.status.in_(OPEN_STATUSES))
+        .where(or_(*conditions))
+        .order_by(case((exact, 0), (number_match, 1), else_=2), PurchaseOrder.id)
+        .limit(limit)
+    )
+    candidates = session.exec(query).all()
+
+    # Similarity prefilters are loose; keep only real vendor matches among the rest
+    return [
+        po for po in candidates
+        if po.po_number in po_numbers
+        or any(value and (value in po.po_number_normalized or po.po_number_normalized in value)
+               for value in normalized if po.po_number_normalized)
+        or vendor_names.same_vendor(vendor_name, po.vendor_name)
+    ]
@@ -0,0 +1,257 @@
+"""
+Text Layer Extractor - Deterministic invoice field extraction
+Pulls header fields from a PDF text layer with regex and layout rules,
+so machine-generated invoices can be parsed without an AI call
+"""
+import re
+from typing import Any, Dict, List, Optional, Tuple
+from dateutil.parser import parse as parse_date
+
+# Per-field confidence (0-100)
+LABELED_CONFIDENCE = 95.0
+HEURISTIC_CONFIDENCE = 60.0
+
+DEFAULT_REQUIRED_FIELDS = [
+    "invoice_number",
+    "vendor_name",
+    "invoice_date",
+    "total_amount",
+    "po_numbers",
+]
+
+_AMOUNT = r"\$?\s*(-?(?:\d{1,3}(?:,\d{3})+|\d+)\.\d{2})\b"
+_DATE = (
+    r"(\d{1,2}[/\-.]\d{1,2}[/\-.]\d{2,4}"
+    r"|\d{4}-\d{2}-\d{2}"
+    r"|[A-Za-z]{3,9}\.?\s+\d{1,2},?\s+\d{4}"
+    r"|\d{1,2}\s+[A-Za-z]{3,9}\.?,?\s+\d{4})"
+)
+
+INVOICE_NUMBER_RE = re.compile(
+    r"invoice\s*(?:no\.?|number|num\.?|#|id)\s*[:#.]?\s*#?\s*([A-Z0-9][A-Z0-9\-/_.]{1,30}[A-Z0-9])",
+    re.IGNORECASE
+)
+PO_NUMBER_RE = re.compile(
+    r"(?:\bP\.?\s?O\.?|purchase\s+order|customer\s+order|your\s+order)"
+    r"\s*(?:no\.?|number|num\.?|#|ref\.?)?\s*[:#.]?\s*#?\s*([A-Z0-9][A-Z0-9\-/_]{2,30})",
+    re.IGNORECASE
+)
+BARE_PO_RE = re.compile(r"\b(PO[-_]?\d[A-Z0-9\-]*)\b", re.IGNORECASE)
+INVOICE_DATE_RE = re.compile(r"(?:invoice\s+date|date\s+of\s+invoice|inv\.?\s+date)\s*[:.]?\s*" + _DATE, re.IGNORECASE)
+BARE_DATE_RE = re.compile(r"(?<!due )(?<!ship )(?<!order )(?<!delivery )\bdate\s*[:.]?\s*" + _DATE, re.IGNORECASE)
+DUE_DATE_RE = re.compile(r"(?:due\s+date|payment\s+due|due\s+by|due)\s*[:.]?\s*" + _DATE, re.IGNORECASE)
+
+# Most specific total labels first
+TOTAL_RES = [
+    re.compile(r"(?:invoice\s+total|total\s+due|amount\s+due|balance\s+due|total\s+amount|grand\s+total)\s*(?:\(?[A-Z]{3}\)?)?\s*[:.]?\s*" + _AMOUNT, re.IGNORECASE),
+    re.compile(r"(?<!sub)(?<!sub\s)(?<!sub-)\btotal\s*(?:\(?[A-Z]{3}\)?)?\s*[:.]?\s*" + _AMOUNT, re.IGNORECASE),
+]
+SUBTOTAL_RE = re.compile(r"sub\s*-?\s*total\s*[:.]?\s*" + _AMOUNT, re.IGNORECASE)
+TAX_RE = re.compile(r"(?:sales\s+tax|tax(?:\s+amount)?|vat|gst)\s*(?:\([^)]*\))?\s*[:.]?\s*" + _AMOUNT, re.IGNORECASE)
+
+VENDOR_LABEL_RE = re.compile(
+    r"^\s*(?:vendor|supplier|from|remit\s+to|sold\s+by|bill\s+from|payable\s+to)\s*[:.]\s*(.+?)\s*$",
+    re.IGNORECASE | re.MULTILINE
+)
+LEGAL_SUFFIX_RE = re.compile(
+    r"\b(?:inc|incorporated|llc|l\.l\.c|ltd|limited|corp|corporation|co|company|gmbh|plc|llp|lp|s\.a|ag|pty)\.?\s*$",
+    re.IGNORECASE
+)
+# Lines that are never the vendor name at the top of a page
+_NOT_VENDOR_RE = re.compile(r"^(?:invoice|tax\s+invoice|bill|statement|page\b|date\b|ship|sold\s+to|bill\s+to)", re.IGNORECASE)
+# Customer address blocks: the label line and the lines under it
+_CUSTOMER_BLOCK_RE = re.compile(r"^(?:bill|ship|sold|deliver)(?:ed)?\s*-?\s*to\b", re.IGNORECASE)
+_CUSTOMER_BLOCK_LINES = 4
+
+
+def _to_amount(value: str) -> float:
+    return float(value.replace(",", ""))
+
+
+def _to_iso_date(value: str) -> Optional[str]:
+    try:
+        return parse_date(value, fuzzy=False).date().isoformat()
+    except (ValueError, OverflowError):
+        return None
+
+
+def _find_date(pattern: re.Pattern, text: str) -> Optional[str]:
+    for match in pattern.finditer(text):
+        iso = _to_iso_date(match.group(1))
+        if iso:
+            return iso
+    return None
+
+
+def _top_lines(text: str, count: int = 8) -> List[str]:
+    """First non-empty lines, without Bill-To / Ship-To / Sold-To blocks"""
+    lines: List[str] = []
+    skip = 0
+    for line in text.splitlines():
+        line = line.strip()
+        if _CUSTOMER_BLOCK_RE.match(line):
+            skip = _CUSTOMER_BLOCK_LINES
+            continue
+        if not line:
+            skip = 0
+            continue
+        if skip:
+            skip -= 1
+            continue
+        lines.append(line)
+        if len(lines) == count:
+            break
+    return lines
+
+
+def _find_vendor(text: str) -> Tuple[Optional[str], float]:
+    """
+    Labeled vendor line, else a company-looking line near the top
+
+    Only an explicit vendor label is trusted; a line picked for its legal
+    suffix (or position) may still be the customer, so the model checks it.
+    """
+    match = VENDOR_LABEL_RE.search(text)
+    if match:
+        return match.group(1).strip(), LABELED_CONFIDENCE
+
+    top_lines = [
+        line for line in _top_lines(text)
+        if not _NOT_VENDOR_RE.match(line) and re.search(r"[A-Za-z]{2}", line)
+    ]
+    for line in top_lines:
+        if LEGAL_SUFFIX_RE.search(line):
+            return line, HEURISTIC_CONFIDENCE
+    if top_lines:
+        return top_lines[0], HEURISTIC_CONFIDENCE
+    return None, 0.0
+
+
+def _find_po_numbers(text: str, invoice_number: Optional[str]) -> List[str]:
+    po_numbers = []
+    candidates = [m.group(1) for m in PO_NUMBER_RE.finditer(text)]
+    candidates += [m.group(1) for m in BARE_PO_RE.finditer(text)]
+    for value in candidates:
+        value = value.strip("-/_")
+        # PO references always carry digits; skip words like "Date"
+        if not re.search(r"\d", value) or value == invoice_number:
+            continue
+        if value not in po_numbers:
+            po_numbers.append(value)
+    return po_numbers
+
+
+def extract_invoice_fields(text: str) -> Dict[str, Any]:
+    """
+    Extract invoice header fields from plain text
+
+    Returns:
+        {
+            "invoice_number": str | None,
+            "vendor_name": str | None,
+            "invoice_date": str (YYYY-MM-DD) | None,
+            "due_date": str (YYYY-MM-DD) | None,
+            "total_amount": float | None,
+            "tax_amount": float | None,
+            "subtotal": float | None,
+            "po_numbers": [str],
+            "field_confidence": {field: 0-100}
+        }
+    """
+    field_confidence: Dict[str, float] = {}
+
+    invoice_number = None
+    match = INVOICE_NUMBER_RE.search(text)
+    if match and re.search(r"\d", match.group(1)):
+        invoice_number = match.group(1)
+        field_confidence["invoice_number"] = LABELED_CONFIDENCE
+
+    vendor_name, vendor_confidence = _find_vendor(text)
+    if vendor_name:
+        field_confidence["vendor_name"] = vendor_confidence
+
+    invoice_date = _find_date(INVOICE_DATE_RE, text)
+    if invoice_date:
+        field_confidence["invoice_date"] = LABELED_CONFIDENCE
+    else:
+        invoice_date = _find_date(BARE_DATE_RE, text)
+        if invoice_date:
+            field_confidence["invoice_date"] = HEURISTIC_CONFIDENCE
+
+    due_date = _find_date(DUE_DATE_RE, text)
+    if due_date:
+        field_confidence["due_date"] = LABELED_CONFIDENCE
+
+    subtotal = None
+    match = SUBTOTAL_RE.search(text)
+    if match:
+        subtotal = _to_amount(match.group(1))
+        field_confidence["subtotal"] = LABELED_CONFIDENCE
+
+    tax_amount = None
+    match = TAX_RE.search(text)
+    if match:
+        tax_amount = _to_amount(match.group(1))
+        field_confidence["tax_amount"] = LABELED_CONFIDENCE
+
+    total_amount = None
+    for index, pattern in enumerate(TOTAL_RES):
+        # Totals usually repeat (summary box + footer); the last one wins
+        matches = pattern.findall(text)
+        if matches:
+            total_amount = _to_amount(matches[-1])
+            field_confidence["total_amount"] = LABELED_CONFIDENCE if index == 0 else HEURISTIC_CONFIDENCE
+            break
+
+    # Arithmetic check: subtotal + tax == total confirms (or refutes) the total
+    if total_amount is not None and subtotal is not None:
+        expected = subtotal + (tax_amount or 0.0)
+        if abs(expected - total_amount) <= 0.01:
+            field_confidence["total_amount"] = LABELED_CONFIDENCE
+        else:
+            field_confidence["total_amount"] = min(field_confidence["total_amount"], HEURISTIC_CONFIDENCE)
+
+    po_numbers = _find_po_numbers(text, invoice_number)
+    if po_numbers:
+        field_confidence["po_numbers"] = LABELED_CONFIDENCE
+
+    return {
+        "invoice_number": invoice_number,
+        "vendor_name": vendor_name,
+        "invoice_date": invoice_date,
+        "due_date": due_date,
+        "total_amount": total_amount,
+        "tax_amount": tax_amount,
+        "subtotal": subtotal,
+        "po_numbers": po_numbers,
+        "field_confidence": field_confidence,
+    }
+
+
+def fast_path_result(
+    text: str,
+    required_fields: List[str] = DEFAULT_REQUIRED_FIELDS,
+    min_confidence: float = 90.0
+) -> Optional[Dict[str, Any]]:
+    """
+    Return a complete parse result if every required field was found
+    with at least ``min_confidence``, otherwise None
+    """
+    if not text or not text.strip():
+        return None
+
+    fields = extract_invoice_fields(text)
+    field_confidence = fields["field_confidence"]
+
+    confidences = [field_confidence.get(field, 0.0) for field in required_fields]
+    if not confidences or min(confidences) < min_confidence:
+        return None
+
+    return {
+        **{key: value for key, value in fields.items() if key != "field_confidence"},
+        "line_items": [],
+        "raw_text": text,
+        "confidence": min(confidences),
+        "field_confidence": field_confidence,
+        "extraction_method": "text_layer",
+    }
@@ -0,0 +1,97 @@
+"""
+Vendor Names - Canonical vendor names for matching and learning
+"ACME Corp." and "Acme Corporation" both become "acme"; a learned alias
+table maps other spellings (trade names, divisions) onto one vendor
+"""
+import re
+import threading
+import unicodedata
+from functools import lru_cache
+from typing import Dict, Optional, Set
+
+# Trailing tokens dropped from names (after punctuation is removed)
+LEGAL_SUFFIXES = frozenset({
+    "inc", "incorporated", "corp", "corporation", "co", "cos", "company", "companies",
+    "llc", "llp", "lp", "lc", "pllc", "pc", "ltd", "limited", "plc", "gmbh", "mbh",
+    "ag", "kg", "sa", "sas", "sarl", "srl", "spa", "bv", "nv", "pty", "pte", "pvt",
+    "oy", "ab", "aps", "kk", "cv", "de", "and",
+})
+
+# Trigram Jaccard similarity at which two canonical names are the same vendor
+VENDOR_SIMILARITY = 0.6
+
+_JOINERS_RE = re.compile(r"[.'`’]")
+_SEPARATORS_RE = re.compile(r"[^\w\s]|_")
+
+
+@lru_cache(maxsize=65536)
+def canonicalize_vendor(name: str) -> str:
+    """Lowercase name without accents, punctuation, a leading "the" or legal suffixes"""
+    text = unicodedata.normalize("NFKD", name)
+    text = "".join(char for char in text if not unicodedata.combining(char)).casefold()
+    text = text.replace("&", " and ")
+    text = _SEPARATORS_RE.sub(" ", _JOINERS_RE.sub("", text))
+    tokens = text.split()
+    if len(tokens) > 1 and tokens[0] == "the":
+        tokens = tokens[1:]
+    while len(tokens) > 1 and tokens[-1] in LEGAL_SUFFIXES:
+        tokens.pop()
+    return " ".join(tokens)
+
+
+def trigrams(text: str) -> Set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def vendor_similarity(first: str, second: str) -> float:
+    """Trigram Jaccard similarity of two canonical names (0-1)"""
+    first_grams, second_grams = trigrams(first), trigrams(second)
+    if not first_grams or not second_grams:
+        return 0.0
+    shared = len(first_grams & second_grams)
+    return shared / (len(first_grams) + len(second_grams) - shared)
+
+
+class VendorNames:
+    """
+    Canonical vendor names plus learned aliases
+
+    Aliases map one canonical name onto another (e.g. an invoice's trading
+    name onto the PO vendor it was synced to).
+    """
+
+    def __init__(self):
+        self.aliases: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def canonical(self, name: Optional[str]) -> str:
+        """Canonical form of ``name`` with aliases applied ("" if none)"""
+        if not name:
+            return ""
+        canonical = canonicalize_vendor(name)
+        return self.aliases.get(canonical, canonical)
+
+    def add_alias(self, alias: str, vendor_name: str) -> bool:
+        """Map ``alias`` onto ``vendor_name``; False if they're already the same vendor"""
+        source = canonicalize_vendor(alias or "")
+        target = self.canonical(vendor_name)
+        if not source or not target or source == target or self.aliases.get(source) == target:
+            return False
+        with self._lock:
+            # Keep the table flat: anything pointing at the alias now points at the target
+            for name, mapped in self.aliases.items():
+                if mapped == source:
+                    self.aliases[name] = target
+            self.aliases[source] = target
+        return True
+
+    def same_vendor(self, first: Optional[str], second: Optional[str]) -> bool:
+        """Equal, contained or similar canonical names"""
+        first, second = self.canonical(first), self.canonical(second)
+        if not first or not second:
+            return False
+        return first in second or second in first or vendor_similarity(first, second) >= VENDOR_SIMILARITY
+
+
+# Singleton instance
+vendor_names = VendorNames()
@@ -14,7 +14,12 @@ from models import (
     PurchaseOrder,
     SyncOperation,
     User,
-    AuditLog
+    AuditLog,
+    POTypePattern,
+    VendorPattern,
+    VendorAlias,
+    CorrectionRecord,
+    LearningCounter
 )
 
 # Create engine
@@ -29,7 +34,9 @@ engine = create_engine(
 
 def create_db_and_tables():
     """Create all tables"""
+    from core.po_search import create_search_indexes
     SQLModel.metadata.create_all(engine)
+    create_search_indexes(engine)
 
 def get_session() -> Generator[Session, None, None]:
     """
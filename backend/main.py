@@ -4,6 +4,7 @@ Main entry point for the API
 """
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from config import settings
 from db.session import create_db_and_tables
 from loguru import logger
@@ -28,16 +29,27 @@ app.add_middleware(
 # Create database tables on startup
 @app.on_event("startup")
 async def startup_event():
-    """Initialize database and start email worker on startup"""
+    """Initialize database and start background workers on startup"""
     logger.info("Starting PlexSync AI...")
     create_db_and_tables()
     logger.success("Database initialized")
+
+    # Warm-start learned patterns from the learning tables
+    from core.learning import learning_system
+    if learning_system.persist:
+        learning_system.load()
+        learning_system.start()
     
     # Start email worker (PRIMARY DRIVER)
     from core.email_worker import email_worker
     email_worker.start()
     logger.success("Email worker started - invoices will be automatically processed from email")
 
+    # Mirror Plex purchase orders locally for matching and sync (one
+    # worker polls Plex, see POMirror._acquire_leadership)
+    from core.po_mirror import po_mirror
+    po_mirror.start()
+
 @app.on_event("shutdown")
 async def shutdown_event():
     """Cleanup on shutdown"""
@@ -46,6 +58,18 @@ async def shutdown_event():
     from core.email_worker import email_worker
     email_worker.stop()
 
+    # Stop learning cache refresh
+    from core.learning import learning_system
+    learning_system.stop()
+
+    # Stop PO mirror
+    from core.po_mirror import po_mirror
+    po_mirror.stop()
+
+    # Stop PDF render workers
+    from core.pdf_renderer import pdf_renderer
+    pdf_renderer.shutdown()
+
 # Health check endpoint
 @app.get("/health")
 async def health_check():
@@ -56,6 +80,13 @@ async def health_check():
         "environment": settings.environment
     }
 
+# Prometheus metrics endpoint
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Parse latency, token and cost counters in Prometheus text format"""
+    from core.parse_metrics import parse_metrics
+    return parse_metrics.render_prometheus()
+
 # Include routers
 from api import auth, invoices, sync, analytics, webhooks
 
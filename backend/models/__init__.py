@@ -8,6 +8,7 @@ from .purchase_order import PurchaseOrder
 from .sync_operation import SyncOperation
 from .user import User
 from .audit_log import AuditLog
+from .learning_pattern import POTypePattern, VendorPattern, VendorAlias, CorrectionRecord, LearningCounter
 
 __all__ = [
     "BaseModel",
@@ -17,5 +18,10 @@ __all__ = [
     "SyncOperation",
     "User",
     "AuditLog",
+    "POTypePattern",
+    "VendorPattern",
+    "VendorAlias",
+    "CorrectionRecord",
+    "LearningCounter",
 ]
 
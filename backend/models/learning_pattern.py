@@ -0,0 +1,53 @@
+"""
+Learning Pattern Models - Persisted LearningSystem state
+Counters are upserted in place and corrections kept in a fixed-size ring,
+so the tables grow with the number of patterns, not with history
+"""
+from sqlmodel import SQLModel, Field, Column, JSON
+from typing import Optional, Dict, Any
+from .base import BaseModel
+
+class POTypePattern(BaseModel, table=True):
+    """Sync outcomes per PO type"""
+    __tablename__ = "learning_po_type_patterns"
+
+    po_type: str = Field(unique=True, index=True)
+    success_count: int = 0
+    total_count: int = 0
+
+
+class VendorPattern(BaseModel, table=True):
+    """User corrections per canonical vendor name"""
+    __tablename__ = "learning_vendor_patterns"
+
+    vendor: str = Field(unique=True, index=True)
+    correction_count: int = 0
+    common_corrections: Dict[str, Any] = Field(default={}, sa_column=Column(JSON))
+
+
+class VendorAlias(BaseModel, table=True):
+    """Learned vendor spelling -> canonical vendor name"""
+    __tablename__ = "learning_vendor_aliases"
+
+    alias: str = Field(unique=True, index=True)
+    vendor: str = Field(index=True)
+
+
+class CorrectionRecord(BaseModel, table=True):
+    """One slot of the correction ring buffer (slot = sequence % capacity)"""
+    __tablename__ = "learning_corrections"
+
+    slot: int = Field(unique=True, index=True)
+    sequence: int = Field(index=True)
+    sync_op_id: Optional[int] = None
+    corrections: Dict[str, Any] = Field(default={}, sa_column=Column(JSON))
+    po_type: Optional[str] = None
+    vendor_pattern: Optional[str] = None
+
+
+class LearningCounter(BaseModel, table=True):
+    """Named counter shared by all workers (e.g. the correction ring's sequence)"""
+    __tablename__ = "learning_counters"
+
+    name: str = Field(unique=True, index=True)
+    value: int = 0
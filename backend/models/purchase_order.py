@@ -12,11 +12,13 @@ class PurchaseOrder(BaseModel, table=True):
 
     # PO Identification
     po_number: str = Field(unique=True, index=True)
+    po_number_normalized: str = Field(default="", index=True)  # set by core.po_search
     plex_po_id: Optional[str] = None
 
     # Vendor
     vendor_code: Optional[str] = None
     vendor_name: str = Field(index=True)
+    vendor_canonical: str = Field(default="", index=True)  # set by core.po_search
 
     # PO Type (for scenario handling)
     po_type: str = "standard"  # standard, blanket, service, freight
@@ -26,7 +28,7 @@ class PurchaseOrder(BaseModel, table=True):
     expected_delivery_date: Optional[date] = None
 
     # Amounts
-    total_amount: float
+    total_amount: float = Field(index=True)
     currency: str = "USD"
 
     # Status
@@ -13,6 +13,7 @@ from db.session import Session, engine, create_db_and_tables
 from models import VendorInvoice
 from sqlmodel import select, or_
 from core.ai_parser import ai_parser
+from core.parse_metrics import invoice_metadata
 from loguru import logger
 from config import settings
 from datetime import date
@@ -120,6 +121,7 @@ async def reparse_invoices():
                 invoice.parsed_data = parsed_data
                 invoice.confidence_score = parsed_data.get("confidence", 0.0)
                 invoice.raw_text = parsed_data.get("raw_text", "")
+                invoice.extra_metadata = invoice_metadata(invoice.extra_metadata, parsed_data)
                 invoice.status = "parsed"
                 
                 session.add(invoice)
@@ -153,6 +155,9 @@ async def reparse_invoices():
         print(f"   ✅ Successfully parsed: {success_count}")
         print(f"   ❌ Failed: {failed_count}")
         print(f"   📦 Total processed: {len(invoices_to_reparse)}")
+
+        cache_stats = ai_parser.cache.stats()
+        print(f"\n🗄️  Parse cache: {cache_stats['hits']} hit(s), {cache_stats['misses']} miss(es)")
         
     except Exception as e:
         logger.error(f"Error in re-parsing: {e}")
@@ -0,0 +1,43 @@
+"""
+Rebuild learned patterns from sync operation history
+Run this from the backend directory after changing the learning logic
+"""
+import argparse
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from db.session import engine, create_db_and_tables
+from core.learning_replay import rebuild_learning
+
+
+def main():
+    """Replay sync_operations into the learning tables"""
+    parser = argparse.ArgumentParser(description="Rebuild learning patterns from sync_operations")
+    parser.add_argument("--partitions", type=int, default=1, help="Parallel processes, one id range each")
+    parser.add_argument("--chunk-size", type=int, help="Rows per fetch (default: LEARNING_REPLAY_CHUNK_SIZE)")
+    parser.add_argument("--dry-run", action="store_true", help="Compute patterns without storing them")
+    args = parser.parse_args()
+
+    create_db_and_tables()
+    stats = rebuild_learning(
+        engine,
+        partitions=max(1, args.partitions),
+        chunk_size=args.chunk_size,
+        dry_run=args.dry_run
+    )
+
+    print(f"Replayed {stats['rows']} sync operation(s) in {stats['seconds']}s")
+    print(f"   PO types: {stats['po_types']}")
+    print(f"   Vendors: {stats['vendors']}")
+    print(f"   Corrections: {stats['corrections']}")
+    if not stats["stored"]:
+        print("   (dry run - patterns not stored)")
+    else:
+        print("Running workers pick up the new counters within LEARNING_CACHE_TTL seconds")
+
+
+if __name__ == "__main__":
+    main()
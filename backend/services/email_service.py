@@ -17,6 +17,7 @@ from db.session import Session, engine
 from models import VendorInvoice
 from services.storage_service import storage_service
 from core.ai_parser import ai_parser
+from core.parse_metrics import invoice_metadata
 
 
 class EmailService:
@@ -108,10 +109,19 @@ class EmailService:
         This is the core function that drives the entire workflow
         """
         session = Session(engine)
+        parse_task = None
         
         try:
+            # Parse the attachment from memory while it is saved to storage
+            storage_service.validate_file(attachment_data['payload'], attachment_data['filename'])
+            parse_task = asyncio.create_task(ai_parser.parse_invoice(
+                attachment_data['payload'],
+                file_type=Path(attachment_data['filename']).suffix[1:].lower()
+            ))
+
             # Save attachment file
-            file_path = storage_service.save_file(
+            file_path = await asyncio.to_thread(
+                storage_service.save_file,
                 file_content=attachment_data['payload'],
                 file_name=attachment_data['filename']
             )
@@ -137,7 +147,7 @@ class EmailService:
             
             # Parse invoice with AI (async)
             try:
-                parsed_data = await ai_parser.parse_invoice(file_path)
+                parsed_data = await parse_task
                 
                 # Update invoice with parsed data
                 invoice.invoice_number = parsed_data.get("invoice_number", "PENDING")
@@ -152,6 +162,7 @@ class EmailService:
                 invoice.parsed_data = parsed_data
                 invoice.confidence_score = parsed_data.get("confidence", 0.0)
                 invoice.raw_text = parsed_data.get("raw_text", "")
+                invoice.extra_metadata = invoice_metadata(invoice.extra_metadata, parsed_data)
                 invoice.status = "parsed"
                 
                 session.add(invoice)
@@ -173,6 +184,8 @@ class EmailService:
                 
         except Exception as e:
             logger.error(f"Failed to process invoice from email: {e}")
+            if parse_task is not None:
+                parse_task.cancel()
             session.rollback()
             return None
         finally:
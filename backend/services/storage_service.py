@@ -43,7 +43,7 @@ class StorageService:
             Path to saved file
         """
         # Validate file
-        self._validate_file(file_content, file_name)
+        self.validate_file(file_content, file_name)
 
         # Generate unique filename
         file_ext = Path(file_name).suffix.lower()
@@ -99,8 +99,8 @@ class StorageService:
             return True
         return False
 
-    def _validate_file(self, file_content: bytes, file_name: str):
-        """Validate file before saving"""
+    def validate_file(self, file_content: bytes, file_name: str):
+        """Validate file size and type (raises ValueError)"""
         # Check file size
         if len(file_content) > self.max_file_size:
             raise ValueError(
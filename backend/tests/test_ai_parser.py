@@ -5,6 +5,7 @@ import pytest
 from unittest.mock import AsyncMock, patch, MagicMock
 from pathlib import Path
 import sys
+import threading
 
 # Mock config before importing
 mock_settings = MagicMock()
@@ -12,10 +13,60 @@ mock_settings.openai_api_key = "test-key"
 mock_settings.openai_model = "gpt-4-vision-preview"
 mock_settings.openai_max_tokens = 2000
 mock_settings.openai_temperature = 0.1
+mock_settings.openai_requests_per_minute = 500
+mock_settings.openai_tokens_per_minute = 30000
+mock_settings.openai_lean_schema = True
+mock_settings.openai_prompt_price_per_million = 2.50
+mock_settings.openai_cached_prompt_price_per_million = 1.25
+mock_settings.openai_completion_price_per_million = 10.00
+mock_settings.openai_fast_model = ""
+mock_settings.openai_fast_prompt_price_per_million = 0.15
+mock_settings.openai_fast_cached_prompt_price_per_million = 0.075
+mock_settings.openai_fast_completion_price_per_million = 0.60
+mock_settings.model_cascade_required_fields = ["invoice_number", "vendor_name", "invoice_date", "total_amount"]
+mock_settings.low_confidence_threshold = 70.0
+mock_settings.max_concurrent_jobs = 5
+mock_settings.ai_retry_attempts = 2
+mock_settings.ai_timeout_seconds = 60
+mock_settings.pdf_render_dpi = 200
+mock_settings.pdf_max_pages = 5
+mock_settings.pdf_scan_pages = 40
+mock_settings.page_selection_enabled = True
+mock_settings.pdf_render_workers = 2
+mock_settings.pdf_render_backend = "auto"
+mock_settings.vision_image_format = "jpeg"
+mock_settings.vision_image_quality = 75
+mock_settings.vision_grayscale = True
+mock_settings.vision_autocrop = True
+mock_settings.vision_deskew = True
+mock_settings.vision_token_budget = 1105
+mock_settings.text_fast_path_enabled = True
+mock_settings.text_fast_path_min_confidence = 90.0
+mock_settings.text_fast_path_required_fields = [
+    "invoice_number", "vendor_name", "invoice_date", "total_amount", "po_numbers"
+]
+mock_settings.ocr_enabled = False
+mock_settings.ocr_language = "eng"
+mock_settings.ocr_dpi = 300
+mock_settings.ocr_min_confidence = 80.0
+mock_settings.high_confidence_threshold = 90.0
+mock_settings.layout_templates_enabled = False
+mock_settings.layout_template_path = "./test_storage/layout_templates"
+mock_settings.layout_template_min_agreement = 2
+mock_settings.layout_template_min_match = 0.8
+mock_settings.parse_cache_enabled = False
+mock_settings.parse_cache_dir = "./test_storage/parse_cache"
+mock_settings.parse_cache_max_entries = 100
+mock_settings.page_cache_enabled = False
+mock_settings.page_cache_dir = "./test_storage/page_cache"
+mock_settings.page_cache_max_mb = 10
 
 sys.modules['config'] = MagicMock(settings=mock_settings)
 
 from core.ai_parser import AIParser
+from core.image_encoder import EncodedImage
+from core.layout_templates import TextBlock, TextLayout
+from core.ocr_engine import OCRResult
 
 
 @pytest.fixture
@@ -108,3 +159,353 @@ async def test_parse_invoice_error_handling(sample_pdf_path):
         assert "error" in result
         assert result["confidence"] == 0.0
 
+
+
+@pytest.mark.asyncio
+async def test_parse_invoice_sends_all_rendered_pages(sample_pdf_path):
+    """Test multi-page PDFs are sent to the model in one request"""
+    parser = AIParser()
+
+    mock_response = MagicMock()
+    mock_response.choices = [
+        MagicMock(message=MagicMock(content='{"invoice_number": "INV-1", "confidence": 90.0}'))
+    ]
+
+    with patch("core.ai_parser.RENDERING_AVAILABLE", True), \
+         patch("core.ai_parser.pdf_renderer.render_pages", new_callable=AsyncMock) as mock_render, \
+         patch.object(parser.client.chat.completions, 'create', new_callable=AsyncMock) as mock_create:
+        mock_render.return_value = [
+            EncodedImage(data=b"page", mime_type="image/jpeg", width=768, height=994, original_bytes=4000)
+            for _ in range(3)
+        ]
+        mock_create.return_value = mock_response
+
+        result = await parser.parse_invoice(sample_pdf_path)
+
+        assert result["invoice_number"] == "INV-1"
+        assert mock_create.await_count == 1
+        metrics = result["parse_metrics"]
+        assert metrics["tier"] == "vision_model"
+        assert metrics["file_type"] == "pdf"
+        assert metrics["pages"] == 3
+        assert metrics["payload_bytes"] == 12
+        assert {"read", "encode", "api", "decode"} <= set(metrics["stages_ms"])
+        content = mock_create.call_args.kwargs["messages"][1]["content"]
+        images = [part for part in content if part["type"] == "image_url"]
+        assert len(images) == 3
+        assert images[0]["image_url"]["url"].startswith("data:image/jpeg;base64,")
+        mock_render.assert_awaited_once_with(
+            sample_pdf_path, max_pages=5, dpi=200, profile=parser.encoding, pages=None, file_digest=None
+        )
+
+
+@pytest.mark.asyncio
+async def test_parse_invoice_text_layer_fast_path(sample_pdf_path):
+    """Test digital PDFs with a complete text layer skip the model call"""
+    parser = AIParser()
+    text_layer = (
+        "Vendor: ACME Corporation\n"
+        "Invoice Number: INV-2024-001\n"
+        "Invoice Date: 2024-01-15\n"
+        "PO Number: PO-2024-100\n"
+        "Total Due: $1,500.00\n"
+    )
+
+    with patch.object(parser, "_extract_pdf_layout", return_value=TextLayout(text_layer, [])), \
+         patch.object(parser.client.chat.completions, 'create', new_callable=AsyncMock) as mock_create:
+        result = await parser.parse_invoice(sample_pdf_path)
+
+        mock_create.assert_not_awaited()
+        assert result["invoice_number"] == "INV-2024-001"
+        assert result["po_numbers"] == ["PO-2024-100"]
+        assert result["total_amount"] == 1500.00
+        assert result["extraction_method"] == "text_layer"
+        assert result["parse_metrics"]["tier"] == "text_layer"
+        assert result["parse_metrics"]["api_calls"] == 0
+        assert result["parse_metrics"]["cost_usd"] == 0
+
+
+@pytest.mark.asyncio
+async def test_parse_invoice_streams_fields(sample_pdf_path):
+    """Test fields are published while the response is still streaming"""
+    parser = AIParser()
+    pieces = [
+        '```json\n{"invoice_number": "INV-', '1", "po_numbers": ["PO-1',
+        '00"], "line_items": [{"description": "Widget, large"}',
+        '], "confidence": 90.0}\n```',
+    ]
+    published = []
+
+    async def stream():
+        for index, piece in enumerate(pieces):
+            published.append(("chunk", index))
+            yield MagicMock(usage=None, choices=[MagicMock(delta=MagicMock(content=piece))])
+        yield MagicMock(usage=MagicMock(total_tokens=1200), choices=[])
+
+    async def on_field(field, value):
+        published.append((field, value))
+
+    with patch("core.ai_parser.RENDERING_AVAILABLE", True), \
+         patch("core.ai_parser.pdf_renderer.render_pages", new_callable=AsyncMock) as mock_render, \
+         patch.object(parser.client.chat.completions, 'create', new_callable=AsyncMock) as mock_create:
+        mock_render.return_value = [
+            EncodedImage(data=b"page", mime_type="image/jpeg", width=768, height=994, original_bytes=4000)
+        ]
+        mock_create.return_value = stream()
+
+        result = await parser.parse_invoice(sample_pdf_path, on_field=on_field)
+
+    assert mock_create.call_args.kwargs["stream"] is True
+    assert result["po_numbers"] == ["PO-100"]
+    fields = [entry[0] for entry in published if entry[0] != "chunk"]
+    assert fields[:4] == ["invoice_number", "po_numbers", "line_items", "confidence"]
+    # po_numbers was published before the line items finished streaming
+    assert published.index(("po_numbers", ["PO-100"])) < published.index(("chunk", 3))
+
+
+@pytest.mark.asyncio
+async def test_lean_schema_uses_local_text_and_static_prefix(sample_pdf_path):
+    """Test raw_text comes from the text layer and the prompt prefix is static"""
+    parser = AIParser()
+    text_layer = "Blurry scan with a partial text layer\n"
+
+    mock_response = MagicMock()
+    mock_response.choices = [
+        MagicMock(message=MagicMock(content='{"invoice_number": "INV-1", "confidence": 80.0}'))
+    ]
+    mock_response.usage = MagicMock(
+        prompt_tokens=1500,
+        completion_tokens=120,
+        prompt_tokens_details=MagicMock(cached_tokens=1024)
+    )
+
+    with patch.object(parser, "_extract_pdf_layout", return_value=TextLayout(text_layer, [])), \
+         patch("core.ai_parser.RENDERING_AVAILABLE", True), \
+         patch("core.ai_parser.pdf_renderer.render_pages", new_callable=AsyncMock) as mock_render, \
+         patch.object(parser.client.chat.completions, 'create', new_callable=AsyncMock) as mock_create:
+        mock_render.return_value = [
+            EncodedImage(data=b"page", mime_type="image/jpeg", width=768, height=994, original_bytes=4000)
+        ]
+        mock_create.return_value = mock_response
+
+        result = await parser.parse_invoice(sample_pdf_path)
+
+    messages = mock_create.call_args.kwargs["messages"]
+    assert messages[0]["content"] == parser._create_system_prompt()
+    assert '"raw_text"' not in messages[0]["content"]
+    assert all(part["type"] == "image_url" for part in messages[1]["content"])
+    assert result["raw_text"] == text_layer
+    assert result["token_usage"] == {
+        "prompt_tokens": 1500,
+        "completion_tokens": 120,
+        "cached_tokens": 1024,
+        "total_tokens": 1620,
+    }
+
+
+@pytest.mark.asyncio
+async def test_scanned_pdf_uses_ocr_text_prompt(sample_pdf_path):
+    """Test legible OCR text is sent as a text-only prompt instead of images"""
+    ocr_text = "Globex Supply\nInvoice 7731\nPlease remit 1,200.00\n"
+    ocr = MagicMock(available=True)
+    ocr.ocr_pdf = AsyncMock(return_value=OCRResult(layout=TextLayout(ocr_text, []), confidence=91.0))
+    parser = AIParser(ocr=ocr)
+
+    mock_response = MagicMock()
+    mock_response.choices = [
+        MagicMock(message=MagicMock(content='{"invoice_number": "7731", "confidence": 85.0}'))
+    ]
+
+    with patch.object(parser, "_extract_pdf_layout", return_value=TextLayout("", [])), \
+         patch("core.ai_parser.pdf_renderer.render_pages", new_callable=AsyncMock) as mock_render, \
+         patch.object(parser.client.chat.completions, 'create', new_callable=AsyncMock) as mock_create:
+        mock_create.return_value = mock_response
+
+        result = await parser.parse_invoice(sample_pdf_path)
+
+    mock_render.assert_not_awaited()
+    user_content = mock_create.call_args.kwargs["messages"][1]["content"]
+    assert isinstance(user_content, str) and "Invoice 7731" in user_content
+    assert result["invoice_number"] == "7731"
+    assert result["text_source"] == "ocr"
+    assert result["raw_text"] == ocr_text
+
+
+@pytest.mark.asyncio
+async def test_illegible_ocr_falls_back_to_vision(sample_pdf_path):
+    """Test low-confidence OCR text is not trusted"""
+    ocr = MagicMock(available=True)
+    ocr.ocr_pdf = AsyncMock(return_value=OCRResult(layout=TextLayout("~~ l1 ~~\n", []), confidence=35.0))
+    parser = AIParser(ocr=ocr)
+
+    mock_response = MagicMock()
+    mock_response.choices = [
+        MagicMock(message=MagicMock(content='{"invoice_number": "INV-9", "confidence": 88.0}'))
+    ]
+
+    with patch.object(parser, "_extract_pdf_layout", return_value=TextLayout("", [])), \
+         patch("core.ai_parser.RENDERING_AVAILABLE", True), \
+         patch("core.ai_parser.pdf_renderer.render_pages", new_callable=AsyncMock) as mock_render, \
+         patch.object(parser.client.chat.completions, 'create', new_callable=AsyncMock) as mock_create:
+        mock_render.return_value = [
+            EncodedImage(data=b"page", mime_type="image/jpeg", width=768, height=994, original_bytes=4000)
+        ]
+        mock_create.return_value = mock_response
+
+        result = await parser.parse_invoice(sample_pdf_path)
+
+    mock_render.assert_awaited_once()
+    assert result["invoice_number"] == "INV-9"
+    assert "text_source" not in result
+
+
+def _completion(content):
+    response = MagicMock()
+    response.choices = [MagicMock(message=MagicMock(content=content))]
+    response.usage = None
+    return response
+
+
+@pytest.mark.asyncio
+async def test_cascade_keeps_confident_fast_answer(sample_pdf_path):
+    """Test a complete, consistent fast-model answer is not escalated"""
+    parser = AIParser()
+    parser.fast_model = "gpt-4o-mini"
+    answer = (
+        '{"invoice_number": "INV-1", "vendor_name": "Acme", "invoice_date": "2024-01-15", '
+        '"subtotal": 100.0, "tax_amount": 8.0, "total_amount": 108.0, '
+        '"line_items": [{"line_total": 60.0}, {"line_total": 40.0}], "confidence": 92}'
+    )
+
+    with patch.object(parser, "_extract_pdf_layout", return_value=TextLayout("Acme invoice text", [])), \
+         patch.object(parser.client.chat.completions, 'create', new_callable=AsyncMock) as mock_create:
+        mock_create.return_value = _completion(answer)
+        result = await parser.parse_invoice(sample_pdf_path)
+
+    assert mock_create.await_count == 1
+    assert mock_create.call_args.kwargs["model"] == "gpt-4o-mini"
+    assert result["parse_metrics"]["model"] == "gpt-4o-mini"
+    assert result["parse_metrics"]["escalation_reason"] is None
+
+
+@pytest.mark.asyncio
+async def test_cascade_escalates_when_totals_do_not_add_up(sample_pdf_path):
+    """Test the full model re-reads invoices whose fast answer fails arithmetic checks"""
+    parser = AIParser()
+    parser.fast_model = "gpt-4o-mini"
+    fast = (
+        '{"invoice_number": "INV-1", "vendor_name": "Acme", "invoice_date": "2024-01-15", '
+        '"subtotal": 100.0, "tax_amount": 8.0, "total_amount": 180.0, "confidence": 95}'
+    )
+    full = fast.replace("180.0", "108.0")
+    published = []
+
+    async def on_field(field, value):
+        published.append((field, value))
+
+    def respond(**kwargs):
+        content = fast if kwargs["model"] == "gpt-4o-mini" else full
+
+        async def stream():
+            yield MagicMock(usage=None, choices=[MagicMock(delta=MagicMock(content=content))])
+        return stream()
+
+    with patch.object(parser, "_extract_pdf_layout", return_value=TextLayout("Acme invoice text", [])), \
+         patch.object(parser.client.chat.completions, 'create', new_callable=AsyncMock) as mock_create:
+        mock_create.side_effect = respond
+        result = await parser.parse_invoice(sample_pdf_path, on_field=on_field)
+
+    assert [call.kwargs["model"] for call in mock_create.call_args_list] == ["gpt-4o-mini", parser.model]
+    assert result["total_amount"] == 108.0
+    assert result["parse_metrics"]["escalation_reason"] == "totals_mismatch"
+    assert result["parse_metrics"]["api_calls"] == 2
+    # The streamed fast-model total is corrected; unchanged fields are not re-sent
+    assert [value for field, value in published if field == "total_amount"] == [180.0, 108.0]
+    assert [field for field, _ in published].count("invoice_number") == 1
+
+
+@pytest.mark.asyncio
+async def test_parse_invoice_from_memory():
+    """Test in-memory contents are parsed without a file, type sniffed from the bytes"""
+    parser = AIParser()
+    data = memoryview(b"%PDF-1.4\n...")
+    text_layer = (
+        "Vendor: ACME Corporation\n"
+        "Invoice Number: INV-2024-001\n"
+        "Invoice Date: 2024-01-15\n"
+        "PO Number: PO-2024-100\n"
+        "Total Due: $1,500.00\n"
+    )
+
+    with patch.object(parser, "_extract_pdf_layout", return_value=TextLayout(text_layer, [])) as mock_layout:
+        result = await parser.parse_invoice(data)
+
+    assert mock_layout.call_args.args[0] == b"%PDF-1.4\n..."
+    assert result["invoice_number"] == "INV-2024-001"
+    assert result["parse_metrics"]["file_type"] == "pdf"
+
+
+@pytest.mark.asyncio
+async def test_long_pdf_sends_only_selected_pages(sample_pdf_path):
+    """Test attachments pages are skipped and the chosen pages recorded"""
+    parser = AIParser()
+    pages = [
+        "Invoice Number: INV-7\nBill To: Plant 2\n1 Widget 4 12.50 50.00\n2 Bolt 10 1.00 10.00\n3 Nut 10 0.50 5.00",
+        "PACKING LIST\nPO Number: PO-123\nWidget qty 4\nBolt qty 10",
+        "Certificate of Conformance\nWe certify PO-123 was made to spec.",
+        "4 Washer 10 0.25 2.50\n5 Gasket 2 3.75 7.50\n6 Pin 20 0.10 2.00\nSubtotal: 77.00\nTotal Due: 83.16",
+    ]
+    layout = TextLayout("".join(page + "\n" for page in pages), [], pages)
+
+    with patch("core.ai_parser.RENDERING_AVAILABLE", True), \
+         patch.object(parser, "_extract_pdf_layout", return_value=layout), \
+         patch("core.ai_parser.pdf_renderer.render_pages", new_callable=AsyncMock) as mock_render, \
+         patch.object(parser.client.chat.completions, 'create', new_callable=AsyncMock) as mock_create:
+        mock_render.return_value = [
+            EncodedImage(data=b"page", mime_type="image/jpeg", width=768, height=994, original_bytes=4000)
+            for _ in range(2)
+        ]
+        mock_create.return_value = _completion('{"invoice_number": "INV-7", "confidence": 90.0}')
+
+        result = await parser.parse_invoice(sample_pdf_path)
+
+    assert mock_render.call_args.kwargs["pages"] == [1, 4]
+    assert result["selected_pages"] == [1, 4]
+    assert "PACKING LIST" in result["raw_text"]
+
+
+@pytest.mark.asyncio
+async def test_layout_template_extract_runs_off_event_loop():
+    """Test template lookups (which may re-read template files) run in a worker thread"""
+    parser = AIParser()
+    parser.text_fast_path_enabled = False
+    loop_thread = threading.get_ident()
+    extract_threads = []
+
+    def extract(blocks, required_fields):
+        extract_threads.append(threading.get_ident())
+        return {"invoice_number": "INV-7"}
+
+    parser.templates = MagicMock(extract=extract)
+    result = await parser._parse_locally("Invoice INV-7", [TextBlock("INV-7", 1, 0.8, 0.1)])
+
+    assert result["invoice_number"] == "INV-7"
+    assert result["raw_text"] == "Invoice INV-7"
+    assert extract_threads and extract_threads[0] != loop_thread
+
+
+def test_payload_log_does_not_claim_savings_over_raw_bitmaps():
+    """Test rendered pages are logged against their raw bitmap, not as a saving"""
+    messages = []
+    with patch("core.ai_parser.logger") as mock_logger:
+        mock_logger.info.side_effect = messages.append
+        AIParser._log_payload([
+            EncodedImage(data=b"page", mime_type="image/jpeg", width=768, height=994,
+                         original_bytes=4000, raw_bitmap=True)
+        ])
+        AIParser._log_payload([
+            EncodedImage(data=b"page", mime_type="image/jpeg", width=768, height=994, original_bytes=4000)
+        ])
+
+    assert "raw bitmap" in messages[0] and "smaller" not in messages[0]
+    assert "4,000 -> 4 bytes" in messages[1] and "smaller" in messages[1]
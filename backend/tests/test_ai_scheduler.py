@@ -0,0 +1,129 @@
+"""
+AI Scheduler Tests
+"""
+import asyncio
+import time
+import httpx
+import pytest
+from unittest.mock import MagicMock
+import sys
+
+# Mock config before importing
+mock_settings = MagicMock()
+sys.modules['config'] = MagicMock(settings=mock_settings)
+
+from openai import RateLimitError
+from core.ai_scheduler import AIScheduler, TokenBucket
+
+
+def _rate_limit_error(headers):
+    request = httpx.Request("POST", "https://api.openai.test/v1/chat/completions")
+    response = httpx.Response(429, headers=headers, request=request)
+    return RateLimitError("Rate limit reached", response=response, body=None)
+
+
+@pytest.mark.asyncio
+async def test_concurrency_is_capped():
+    """Test no more than max_concurrency calls run at once"""
+    scheduler = AIScheduler(max_concurrency=2, requests_per_minute=0, tokens_per_minute=0)
+    running = 0
+    peak = 0
+
+    async def call():
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return "ok"
+
+    results = await asyncio.gather(*[scheduler.run(call) for _ in range(8)])
+
+    assert results == ["ok"] * 8
+    assert peak == 2
+    assert scheduler.stats()["completed"] == 8
+    assert scheduler.stats()["queue_depth"] == 0
+
+
+@pytest.mark.asyncio
+async def test_retries_rate_limit_using_retry_after():
+    """Test 429s are retried after the server-provided delay"""
+    scheduler = AIScheduler(requests_per_minute=0, tokens_per_minute=0, retry_attempts=2)
+    attempts = 0
+
+    async def call():
+        nonlocal attempts
+        attempts += 1
+        if attempts == 1:
+            raise _rate_limit_error({"retry-after-ms": "20"})
+        return "ok"
+
+    start = time.monotonic()
+    result = await scheduler.run(call)
+
+    assert result == "ok"
+    assert attempts == 2
+    assert time.monotonic() - start >= 0.02
+    stats = scheduler.stats()
+    assert stats["retries"] == 1
+    assert stats["rate_limited"] == 1
+
+
+@pytest.mark.asyncio
+async def test_gives_up_after_retry_attempts():
+    """Test timeouts are retried, then raised"""
+    scheduler = AIScheduler(
+        requests_per_minute=0, tokens_per_minute=0,
+        timeout_seconds=0.01, retry_attempts=1, base_delay=0.001
+    )
+
+    async def call():
+        await asyncio.sleep(1)
+
+    with pytest.raises(asyncio.TimeoutError):
+        await scheduler.run(call)
+
+    assert scheduler.stats()["retries"] == 1
+    assert scheduler.stats()["failed"] == 1
+
+
+@pytest.mark.asyncio
+async def test_non_retryable_errors_raise_immediately():
+    """Test other errors are not retried"""
+    scheduler = AIScheduler(requests_per_minute=0, tokens_per_minute=0, retry_attempts=3)
+    attempts = 0
+
+    async def call():
+        nonlocal attempts
+        attempts += 1
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        await scheduler.run(call)
+
+    assert attempts == 1
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_waits_for_refill():
+    """Test an empty bucket delays the caller until it refills"""
+    bucket = TokenBucket(per_minute=6000)  # 100 tokens/second
+    await bucket.acquire(6000)
+
+    start = time.monotonic()
+    await bucket.acquire(5)
+
+    assert time.monotonic() - start >= 0.04
+
+
+@pytest.mark.asyncio
+async def test_actual_usage_is_charged_to_token_bucket():
+    """Test the estimate is corrected with the response's reported usage"""
+    scheduler = AIScheduler(requests_per_minute=0, tokens_per_minute=60000)
+
+    async def call():
+        return MagicMock(usage=MagicMock(total_tokens=1500))
+
+    await scheduler.run(call, estimated_tokens=500)
+
+    assert scheduler.token_bucket.tokens == pytest.approx(60000 - 1500, abs=60)  # refill during the call
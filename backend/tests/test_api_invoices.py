@@ -53,6 +53,26 @@ def test_upload_invoice(authenticated_client, temp_storage):
         assert data["status"] in ["received", "parsed"]
 
 
+def test_upload_stream_rejects_invalid_file(authenticated_client, temp_storage):
+    """Test a file failing validation is a 400 and never reaches the parser"""
+    if authenticated_client is None:
+        pytest.skip("main.py not yet created")
+
+    with patch('api.invoices.ai_parser.parse_invoice', new_callable=AsyncMock) as mock_parse:
+        files = {
+            "file": ("invoice.exe", BytesIO(b"MZ not an invoice"), "application/octet-stream")
+        }
+
+        response = authenticated_client.post(
+            "/api/invoices/upload/stream",
+            files=files
+        )
+
+        assert response.status_code == 400
+        assert "not allowed" in response.json()["detail"]
+        mock_parse.assert_not_called()
+
+
 def test_list_invoices(authenticated_client, session, sample_invoice_data):
     """Test listing invoices"""
     if authenticated_client is None:
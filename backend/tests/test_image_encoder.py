@@ -0,0 +1,106 @@
+"""
+Image Encoder Tests
+"""
+from io import BytesIO
+from PIL import Image, ImageDraw
+import sys
+from unittest.mock import MagicMock
+
+# Mock config before importing
+mock_settings = MagicMock()
+sys.modules['config'] = MagicMock(settings=mock_settings)
+
+from core.image_encoder import (
+    EncodingProfile,
+    PNG_PROFILE,
+    encode_image,
+    encode_image_bytes,
+    estimate_image_tokens,
+)
+
+
+def _scanned_page(skew: float = 0.0) -> Image.Image:
+    """Letter page at 200 dpi with wide white margins"""
+    page = Image.new("RGB", (1700, 2200), "white")
+    draw = ImageDraw.Draw(page)
+    for row in range(40):
+        y = 400 + row * 35
+        draw.text((300, y), f"{row:>3}  Widget {row:04d}  qty 10  @ 12.50  = 125.00  " * 3, fill="black")
+        draw.line((300, y + 20, 1400, y + 20), fill="black", width=2)
+    return page.rotate(skew, fillcolor="white") if skew else page
+
+
+def test_token_estimate_matches_tiling():
+    """Test token estimate follows the high-detail tiling rules"""
+    # 1700x2200 -> 1582x2048 -> 768x994 -> 2x2 tiles
+    assert estimate_image_tokens(1700, 2200) == 85 + 170 * 4
+    assert estimate_image_tokens(512, 512) == 85 + 170
+
+
+def test_encoding_shrinks_payload_within_budget():
+    """Test default profile crops, grays and fits the token budget"""
+    page = _scanned_page()
+    png = BytesIO()
+    page.save(png, format="PNG")
+
+    encoded = encode_image(page, EncodingProfile(token_budget=765), original_bytes=len(png.getvalue()))
+
+    assert encoded.mime_type in ("image/jpeg", "image/png")
+    assert estimate_image_tokens(encoded.width, encoded.height) <= 765
+    assert len(encoded.data) < encoded.original_bytes
+    assert Image.open(BytesIO(encoded.data)).mode in ("L", "P")
+
+
+def test_renders_without_file_size_are_flagged_raw_bitmap():
+    """Test the raw bitmap fallback for original_bytes is labelled as such"""
+    page = Image.new("RGB", (200, 100), "white")
+
+    rendered = encode_image(page, PNG_PROFILE)
+    uploaded = encode_image(page, PNG_PROFILE, original_bytes=1234)
+
+    assert rendered.raw_bitmap and rendered.original_bytes == 200 * 100 * 3
+    assert not uploaded.raw_bitmap and uploaded.original_bytes == 1234
+
+
+def test_autocrop_removes_blank_margins():
+    """Test blank margins are trimmed before resizing"""
+    encoded = encode_image(_scanned_page(), EncodingProfile(format="png", deskew=False, token_budget=0))
+
+    # Content spans x 300-1400, y 400-1767; only the 16px padding remains
+    assert encoded.width < 1200
+    assert encoded.height < 1420
+
+
+def test_deskew_straightens_rotated_scan():
+    """Test a skewed scan is rotated back"""
+    profile = EncodingProfile(format="png", token_budget=0)
+    straight = encode_image(_scanned_page(), profile)
+    deskewed = encode_image(_scanned_page(skew=2.0), profile)
+    skewed = encode_image(_scanned_page(skew=2.0), EncodingProfile(format="png", deskew=False, token_budget=0))
+
+    # A rotated block has a taller bounding box; straightening shrinks it back
+    assert deskewed.height < skewed.height
+    assert abs(deskewed.height - straight.height) < abs(skewed.height - straight.height)
+
+
+def test_png_profile_is_lossless_passthrough():
+    """Test PNG profile keeps size and color"""
+    page = _scanned_page()
+
+    encoded = encode_image(page, PNG_PROFILE)
+
+    assert encoded.mime_type == "image/png"
+    assert (encoded.width, encoded.height) == page.size
+    assert Image.open(BytesIO(encoded.data)).mode == "RGB"
+
+
+def test_multi_page_tiff_respects_page_cap():
+    """Test each TIFF frame becomes a page, up to max_pages"""
+    frames = [_scanned_page() for _ in range(3)]
+    tiff = BytesIO()
+    frames[0].save(tiff, format="TIFF", save_all=True, append_images=frames[1:])
+
+    pages = encode_image_bytes(tiff.getvalue(), EncodingProfile(), max_pages=2)
+
+    assert len(pages) == 2
+    assert all(page.mime_type in ("image/jpeg", "image/png") for page in pages)
@@ -0,0 +1,58 @@
+"""
+Incremental JSON Decoder Tests
+"""
+import sys
+from unittest.mock import MagicMock
+
+# Mock config before importing
+sys.modules.setdefault('config', MagicMock(settings=MagicMock()))
+
+from core.json_stream import IncrementalJSONDecoder
+
+
+def feed_all(decoder, text, size):
+    members = []
+    for start in range(0, len(text), size):
+        members.extend(decoder.feed(text[start:start + size]))
+    return members
+
+
+def test_members_emitted_as_they_complete():
+    """Test each member is emitted once the next one starts"""
+    decoder = IncrementalJSONDecoder()
+
+    assert decoder.feed('{"invoice_number": "INV-1"') == []
+    assert decoder.feed(', "po_numbers": ["PO-1", "PO-2"], ') == [
+        ("invoice_number", "INV-1"),
+        ("po_numbers", ["PO-1", "PO-2"]),
+    ]
+    assert decoder.feed('"total_amount": 12.5}') == [("total_amount", 12.5)]
+    assert decoder.done
+
+
+def test_strings_with_delimiters_and_escapes():
+    """Test commas, braces and escaped quotes inside strings don't split members"""
+    text = '{"raw_text": "Total, {net} \\"due\\" ]", "vendor_name": "A, B & Co"}'
+
+    members = feed_all(IncrementalJSONDecoder(), text, 3)
+
+    assert members == [
+        ("raw_text", 'Total, {net} "due" ]'),
+        ("vendor_name", "A, B & Co"),
+    ]
+
+
+def test_nested_values_and_surrounding_text():
+    """Test fenced output and nested line items decode the same at any chunk size"""
+    text = (
+        'Here is the data:\n```json\n'
+        '{"line_items": [{"description": "Bolt, M8", "quantity": 2}], "confidence": 90}\n'
+        '```'
+    )
+
+    for size in (1, 7, len(text)):
+        members = feed_all(IncrementalJSONDecoder(), text, size)
+        assert members == [
+            ("line_items", [{"description": "Bolt, M8", "quantity": 2}]),
+            ("confidence", 90),
+        ]
@@ -0,0 +1,208 @@
+"""
+Layout Template Tests
+"""
+import sys
+from unittest.mock import MagicMock
+
+# Mock config before importing
+sys.modules.setdefault('config', MagicMock(settings=MagicMock()))
+
+import pytest
+from core.layout_templates import LayoutTemplateStore, extract_text_layout
+
+REQUIRED = ["invoice_number", "vendor_name", "invoice_date", "total_amount", "po_numbers"]
+
+
+def make_text_pdf(path, lines, width=612, height=792):
+    """Write a one-page PDF with text at (x, y) points"""
+    ops = []
+    for x, y, text in lines:
+        text = text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+        ops.append(f"BT /F1 10 Tf {x} {y} Td ({text}) Tj ET")
+    stream = "\n".join(ops).encode("latin-1")
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {width} {height}] "
+        f"/Resources << /Font << /F1 5 0 R >> >> /Contents 4 0 R >>".encode(),
+        b"<< /Length " + str(len(stream)).encode() + b" >>\nstream\n" + stream + b"\nendstream",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for offset in offsets:
+        out += f"{offset:010d} 00000 n \n".encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    path.write_bytes(bytes(out))
+    return str(path)
+
+
+def acme_invoice(tmp_path, number, po, date, items):
+    """Acme's layout: totals move down with the number of line items"""
+    lines = [
+        (50, 740, "Acme Tools Inc."),
+        (50, 726, "100 Industrial Way, Springfield"),
+        (400, 740, f"Invoice # {number}"),
+        (400, 726, f"Date: {date}"),
+        (400, 712, f"PO Number: {po}"),
+        (50, 660, "Description"),
+        (400, 660, "Qty"),
+        (480, 660, "Amount"),
+    ]
+    y = 640
+    total = 0.0
+    for description, qty, amount in items:
+        lines += [(50, y, description), (400, y, str(qty)), (480, y, f"{amount:,.2f}")]
+        total += amount
+        y -= 14
+    lines += [(400, y - 20, "Total Due"), (480, y - 20, f"{total:,.2f}")]
+    return make_text_pdf(tmp_path / f"{number}.pdf", lines), total
+
+
+def ai_result(number, po, iso_date, total):
+    return {
+        "invoice_number": number,
+        "vendor_name": "Acme Tools Inc",
+        "invoice_date": iso_date,
+        "total_amount": total,
+        "po_numbers": [po],
+        "line_items": [],
+        "confidence": 96.0,
+    }
+
+
+@pytest.fixture
+def store(tmp_path):
+    return LayoutTemplateStore(str(tmp_path / "templates"), min_agreement=2)
+
+
+def test_extract_text_layout_positions(tmp_path):
+    """Test blocks carry page-relative positions measured from the top"""
+    path = make_text_pdf(tmp_path / "a.pdf", [(306, 396, "Middle"), (0, 792, "Corner")])
+
+    layout = extract_text_layout(path)
+
+    blocks = {block.text: block for block in layout.blocks}
+    assert blocks["Middle"].x == pytest.approx(0.5)
+    assert blocks["Middle"].y == pytest.approx(0.5)
+    assert blocks["Corner"].y == pytest.approx(0.0)
+    assert "Middle" in layout.text
+
+    with open(path, "rb") as f:
+        assert extract_text_layout(f.read()).blocks == layout.blocks
+
+
+def test_known_layout_extracted_after_agreeing_parses(tmp_path, store):
+    """Test a layout is used once AI parses agree with its rules"""
+    samples = [
+        ("A-1001", "PO-5001", "01/15/2024", "2024-01-15", [("Hex bolts", 10, 125.0), ("Washers", 5, 20.0)]),
+        ("A-1002", "PO-5002", "02/03/2024", "2024-02-03", [("Drill bits", 2, 48.5)]),
+    ]
+    for number, po, date, iso_date, items in samples:
+        path, total = acme_invoice(tmp_path, number, po, date, items)
+        blocks = extract_text_layout(path).blocks
+        assert store.extract(blocks, REQUIRED) is None
+        store.learn(blocks, ai_result(number, po, iso_date, total))
+
+    path, total = acme_invoice(
+        tmp_path, "A-1003", "PO-5003", "03/20/2024",
+        [("Saw blades", 4, 60.0), ("Clamps", 2, 30.0), ("Glue", 1, 9.99)]
+    )
+    result = store.extract(extract_text_layout(path).blocks, REQUIRED)
+
+    assert result is not None
+    assert result["extraction_method"] == "layout_template"
+    assert result["invoice_number"] == "A-1003"
+    assert result["vendor_name"] == "Acme Tools Inc."
+    assert result["invoice_date"] == "2024-03-20"
+    assert result["po_numbers"] == ["PO-5003"]
+    assert result["total_amount"] == pytest.approx(total)
+
+    # Templates persist across restarts
+    reloaded = LayoutTemplateStore(str(store.path), min_agreement=2)
+    assert reloaded.extract(extract_text_layout(path).blocks, REQUIRED)["invoice_number"] == "A-1003"
+
+
+def test_single_sample_is_not_trusted(tmp_path, store):
+    """Test one AI parse is not enough to skip the model"""
+    path, total = acme_invoice(tmp_path, "A-1001", "PO-5001", "01/15/2024", [("Hex bolts", 10, 125.0)])
+    blocks = extract_text_layout(path).blocks
+    store.learn(blocks, ai_result("A-1001", "PO-5001", "2024-01-15", total))
+
+    assert store.extract(blocks, REQUIRED) is None
+
+
+def test_disagreement_resets_rule(tmp_path, store):
+    """Test a rule the AI contradicts must earn agreement again"""
+    for number, items in (("A-1001", [("Bolts", 1, 10.0)]), ("A-1002", [("Nuts", 1, 5.0)])):
+        path, total = acme_invoice(tmp_path, number, "PO-1", "01/15/2024", items)
+        store.learn(extract_text_layout(path).blocks, ai_result(number, "PO-1", "2024-01-15", total))
+
+    path, total = acme_invoice(tmp_path, "A-1003", "PO-1", "01/15/2024", [("Pins", 1, 7.0)])
+    blocks = extract_text_layout(path).blocks
+    assert store.extract(blocks, REQUIRED) is not None
+
+    # The AI reads a different total on this layout: rule is no longer trusted
+    store.learn(blocks, ai_result("A-1003", "PO-1", "2024-01-15", 999.0))
+    assert store.extract(blocks, REQUIRED) is None
+
+
+def test_unknown_layout_falls_through(tmp_path, store):
+    """Test other vendors' layouts don't match"""
+    for number in ("A-1001", "A-1002"):
+        path, total = acme_invoice(tmp_path, number, "PO-1", "01/15/2024", [("Bolts", 1, 10.0)])
+        store.learn(extract_text_layout(path).blocks, ai_result(number, "PO-1", "2024-01-15", total))
+
+    other = make_text_pdf(tmp_path / "other.pdf", [
+        (50, 740, "Globex Supply LLC"),
+        (50, 700, "Bill To: Plex Customer"),
+        (300, 740, "INVOICE"),
+        (300, 720, "Number B-77"),
+        (300, 700, "Issued 01/15/2024"),
+        (300, 400, "Balance 10.00"),
+    ])
+    blocks = extract_text_layout(other).blocks
+
+    assert store.extract(blocks, REQUIRED) is None
+    assert store.stats()["templates"] == 1
+
+
+def test_workers_share_templates(tmp_path, store):
+    """Test stores on one directory keep each other's templates and pick them up"""
+    other_worker = LayoutTemplateStore(str(store.path), min_agreement=2)
+    assert other_worker.stats()["templates"] == 0
+
+    for number in ("A-1001", "A-1002"):
+        path, total = acme_invoice(tmp_path, number, "PO-1", "01/15/2024", [("Bolts", 1, 10.0)])
+        store.learn(extract_text_layout(path).blocks, ai_result(number, "PO-1", "2024-01-15", total))
+    globex = make_text_pdf(tmp_path / "globex.pdf", [
+        (50, 740, "Globex Supply LLC"),
+        (300, 720, "Number B-77"),
+        (300, 400, "Balance 10.00"),
+    ])
+    other_worker.learn(extract_text_layout(globex).blocks, {**ai_result("B-77", "PO-2", "2024-01-15", 10.0),
+                                                            "vendor_name": "Globex Supply LLC"})
+
+    # Neither write replaced the other's template
+    assert LayoutTemplateStore(str(store.path)).stats()["vendors"] == 2
+    assert store.stats()["templates"] == 2
+
+    # The other worker extracts with the layout learned here, without a restart
+    path, _ = acme_invoice(tmp_path, "A-1003", "PO-1", "01/15/2024", [("Pins", 1, 7.0)])
+    assert other_worker.extract(extract_text_layout(path).blocks, REQUIRED)["invoice_number"] == "A-1003"
+
+
+def test_extract_does_not_wait_for_disk_writes(tmp_path, store):
+    """Test lookups don't block behind a template being written"""
+    path, total = acme_invoice(tmp_path, "A-1001", "PO-1", "01/15/2024", [("Bolts", 1, 10.0)])
+    blocks = extract_text_layout(path).blocks
+    store.learn(blocks, ai_result("A-1001", "PO-1", "2024-01-15", total))
+
+    with store._save_lock:
+        assert store.extract(blocks, REQUIRED) is None
+        assert store.stats()["templates"] == 1
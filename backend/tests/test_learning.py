@@ -0,0 +1,155 @@
+"""
+Learning System Tests
+"""
+import sys
+from unittest.mock import MagicMock, patch
+
+# Mock config before importing
+sys.modules.setdefault('config', MagicMock(settings=MagicMock()))
+
+from sqlalchemy import event
+from sqlmodel import Session, select
+from models import CorrectionRecord, POTypePattern, SyncOperation
+from core.learning import LearningSystem
+from core.vendor_names import vendor_names
+
+
+def _sync_op(success=True, po_type="standard", vendor_pattern="ACME Corp.", corrections=None) -> SyncOperation:
+    return SyncOperation(
+        vendor_invoice_id=1,
+        plex_invoice_id=1,
+        operation_type="update_invoice_number",
+        success=success,
+        po_type=po_type,
+        vendor_pattern=vendor_pattern,
+        user_corrections=corrections or {}
+    )
+
+
+def test_po_type_success_rate_adjusts_confidence():
+    """Test reliable PO types raise confidence and unreliable ones lower it"""
+    learning = LearningSystem()
+    for _ in range(10):
+        learning.learn_from_sync_operation(_sync_op(po_type="standard"))
+        learning.learn_from_sync_operation(_sync_op(success=False, po_type="blanket"))
+
+    assert learning.get_confidence_adjustment("standard", "x") == 5.0
+    assert learning.get_confidence_adjustment("blanket", "x") == -5.0
+
+
+def test_vendor_corrections_use_canonical_names():
+    """Test corrections recorded under one spelling apply to the others"""
+    learning = LearningSystem()
+    for name in ("ACME Corp.", "Acme Corporation", "acme", "ACME, Inc."):
+        learning.learn_from_sync_operation(_sync_op(po_type=None, vendor_pattern=name, corrections={"invoice_number": "X"}))
+
+    assert list(learning.patterns["vendor_patterns"]) == ["acme"]
+    assert learning.get_confidence_adjustment("none", "Acme Corp") == -3.0
+    # Misspelling found through the trigram index
+    assert learning.get_confidence_adjustment("none", "Acmee") == -3.0
+    assert learning.get_confidence_adjustment("none", "Globex") == 0.0
+
+
+def test_correction_history_is_bounded():
+    """Test only the newest corrections are kept"""
+    learning = LearningSystem(history_size=3)
+    for n in range(10):
+        learning.learn_from_sync_operation(_sync_op(vendor_pattern=f"Vendor {n}", corrections={"n": n}))
+
+    assert [record["corrections"]["n"] for record in learning.patterns["correction_history"]] == [7, 8, 9]
+
+
+def test_patterns_survive_restart(engine):
+    """Test persisted counters, aliases and the correction ring reload into a new instance"""
+    learning = LearningSystem(engine=engine, history_size=3, persist=True)
+    for _ in range(9):
+        learning.learn_from_sync_operation(_sync_op(po_type="standard"))
+    learning.learn_from_sync_operation(_sync_op(success=False, po_type="standard"))
+    for n in range(5):
+        learning.learn_from_sync_operation(_sync_op(po_type=None, corrections={"n": n}))
+    learning.learn_vendor_alias("Roadrunner Supply", "ACME Corp.")
+
+    with Session(engine) as session:
+        assert len(session.exec(select(CorrectionRecord)).all()) == 3
+        assert session.exec(select(POTypePattern)).one().total_count == 10
+
+    vendor_names.aliases.clear()
+    restarted = LearningSystem(engine=engine, history_size=3, persist=True)
+    restarted.load()
+
+    assert restarted.patterns["po_type_patterns"] == {"standard": {"success_count": 9, "total_count": 10}}
+    assert restarted.patterns["vendor_patterns"]["acme"]["correction_count"] == 5
+    assert [record["corrections"]["n"] for record in restarted.patterns["correction_history"]] == [2, 3, 4]
+    assert vendor_names.canonical("Roadrunner Supply") == "acme"
+
+    # The ring keeps its place after a restart
+    restarted.learn_from_sync_operation(_sync_op(po_type=None, corrections={"n": 5}))
+    with Session(engine) as session:
+        kept = session.exec(select(CorrectionRecord).order_by(CorrectionRecord.sequence)).all()
+    assert [record.corrections["n"] for record in kept] == [3, 4, 5]
+    vendor_names.aliases.clear()
+
+
+def test_workers_share_counters(engine):
+    """Test two instances on one database converge after a refresh"""
+    first = LearningSystem(engine=engine, persist=True)
+    second = LearningSystem(engine=engine, persist=True)
+    for _ in range(6):
+        first.learn_from_sync_operation(_sync_op(po_type="blanket"))
+    for _ in range(6):
+        second.learn_from_sync_operation(_sync_op(success=False, po_type="blanket"))
+        second.learn_from_sync_operation(_sync_op(po_type=None, corrections={"field": "x"}))
+
+    # Each worker only knows its own half until it re-reads the shared table
+    assert first.get_confidence_adjustment("blanket", "Globex") == 5.0
+    assert first.get_confidence_adjustment("none", "Acme") == 0.0
+    first.refresh()
+    assert first.patterns["po_type_patterns"]["blanket"] == {"success_count": 6, "total_count": 12}
+    assert first.get_confidence_adjustment("blanket", "Globex") == 0.0
+    assert first.get_confidence_adjustment("none", "Acme") == -3.0
+
+    # Both workers write corrections into one ring without clobbering slots
+    first.learn_from_sync_operation(_sync_op(po_type=None, corrections={"field": "y"}))
+    with Session(engine) as session:
+        assert sorted(record.sequence for record in session.exec(select(CorrectionRecord))) == list(range(7))
+
+
+def test_confidence_adjustment_lookup_is_cached():
+    """Test repeated lookups don't re-resolve vendor names"""
+    learning = LearningSystem()
+    for _ in range(4):
+        learning.learn_from_sync_operation(_sync_op(po_type=None, corrections={"field": "x"}))
+    assert learning.get_confidence_adjustment("standard", "Acmee") == -3.0
+
+    with patch.object(learning, "_find_vendor", side_effect=AssertionError):
+        assert learning.get_confidence_adjustment("standard", "Acmee") == -3.0
+
+    # New corrections invalidate the memo
+    learning.learn_from_sync_operation(_sync_op(po_type=None, vendor_pattern="Globex", corrections={"f": 1}))
+    assert "Acmee" not in learning._vendor_adjustments
+
+
+def test_sync_operation_persisted_in_one_transaction(engine, session):
+    """Test one sync operation's counters, correction and alias are written together"""
+    learning = LearningSystem(engine=engine, persist=True)
+    sync_op = _sync_op(po_type="standard", vendor_pattern="Roadrunner Supply", corrections={"field": "x"})
+    session.add(sync_op)
+    session.commit()
+    session.refresh(sync_op)
+
+    transactions = []
+    def count(connection):
+        transactions.append(connection)
+    event.listen(engine, "begin", count)
+    try:
+        with learning.batch():
+            learning.learn_from_sync_operation(sync_op)
+            learning.learn_vendor_alias("Roadrunner Supply", "ACME Corp.")
+    finally:
+        event.remove(engine, "begin", count)
+
+    assert len(transactions) == 1
+    with Session(engine) as check:
+        assert check.exec(select(CorrectionRecord)).one().sync_op_id == sync_op.id
+        assert check.exec(select(POTypePattern)).one().total_count == 1
+    vendor_names.aliases.clear()
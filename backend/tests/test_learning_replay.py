@@ -0,0 +1,132 @@
+"""
+Learning Replay Tests
+"""
+import random
+import sys
+from unittest.mock import MagicMock, patch
+
+# Mock config before importing
+sys.modules.setdefault('config', MagicMock(settings=MagicMock()))
+
+from sqlmodel import Session, SQLModel, create_engine, select
+from models import CorrectionRecord, LearningCounter, SyncOperation
+from core.learning import LearningSystem
+from core.learning_replay import rebuild_learning, replay_range
+
+
+def _sync_ops(count: int, seed: int = 3):
+    rng = random.Random(seed)
+    vendors = ["ACME Corp.", "Acme Corporation", "Globex", "Initech LLC", None]
+    return [
+        SyncOperation(
+            vendor_invoice_id=1,
+            plex_invoice_id=1,
+            operation_type="update_invoice_number",
+            success=rng.random() < 0.7,
+            po_type=rng.choice(["standard", "blanket", "service", None]),
+            vendor_pattern=rng.choice(vendors),
+            user_corrections={"invoice_number": n} if rng.random() < 0.3 else {}
+        )
+        for n in range(count)
+    ]
+
+
+def _seed(engine, count: int):
+    with Session(engine) as session:
+        session.add_all(_sync_ops(count))
+        session.commit()
+        return session.exec(select(SyncOperation).order_by(SyncOperation.id)).all()
+
+
+def _live(sync_ops, history_size: int) -> LearningSystem:
+    learning = LearningSystem(history_size=history_size)
+    for sync_op in sync_ops:
+        learning.learn_from_sync_operation(sync_op)
+    return learning
+
+
+def test_replay_matches_live_learning(engine):
+    """Test a streamed replay builds the same patterns as learning op by op"""
+    sync_ops = _seed(engine, 500)
+    live = _live(sync_ops, history_size=20)
+
+    replayed, rows, corrections = replay_range(engine, history_size=20, chunk_size=7)
+
+    assert rows == 500
+    assert corrections == sum(1 for op in sync_ops if op.user_corrections)
+    assert replayed.patterns["po_type_patterns"] == live.patterns["po_type_patterns"]
+    assert replayed.patterns["vendor_patterns"] == live.patterns["vendor_patterns"]
+    assert list(replayed.patterns["correction_history"]) == list(live.patterns["correction_history"])
+
+
+def test_rebuild_stores_patterns(engine):
+    """Test a rebuild replaces the persisted patterns and a warm start loads them"""
+    sync_ops = _seed(engine, 200)
+    stale = LearningSystem(engine=engine, history_size=10, persist=True)
+    stale.learn_from_sync_operation(SyncOperation(
+        vendor_invoice_id=1, plex_invoice_id=1, operation_type="x", success=True, po_type="obsolete"
+    ))
+
+    stats = rebuild_learning(engine, chunk_size=50, history_size=10)
+    assert stats["rows"] == 200 and stats["stored"]
+
+    # Counters not backed by history are dropped
+    loaded = LearningSystem(engine=engine, history_size=10, persist=True)
+    loaded.load()
+    live = _live(sync_ops, history_size=10)
+    assert "obsolete" not in loaded.patterns["po_type_patterns"]
+    assert loaded.patterns["po_type_patterns"] == live.patterns["po_type_patterns"]
+    assert loaded.patterns["vendor_patterns"] == live.patterns["vendor_patterns"]
+    assert [r["sync_op_id"] for r in loaded.patterns["correction_history"]] == [
+        r["sync_op_id"] for r in live.patterns["correction_history"]
+    ]
+    with Session(engine) as session:
+        assert len(session.exec(select(CorrectionRecord)).all()) == 10
+        counter = session.exec(
+            select(LearningCounter).where(LearningCounter.name == "correction_sequence")
+        ).one()
+        assert counter.value == stats["corrections"]
+
+
+def test_partitioned_replay_matches_sequential(tmp_path):
+    """Test replaying id ranges in parallel processes gives the sequential result"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'replay.db'}")
+    SQLModel.metadata.create_all(engine)
+    _seed(engine, 300)
+
+    sequential, _, _ = replay_range(engine, history_size=15, chunk_size=40)
+    with patch("core.learning_replay.MAX_PARTITIONS", 4):
+        stats = rebuild_learning(engine, partitions=4, chunk_size=40, history_size=15)
+    assert stats["rows"] == 300 and stats["partitions"] == 4
+
+    loaded = LearningSystem(engine=engine, history_size=15, persist=True)
+    loaded.load()
+    assert loaded.patterns["po_type_patterns"] == sequential.patterns["po_type_patterns"]
+    assert loaded.patterns["vendor_patterns"] == sequential.patterns["vendor_patterns"]
+    assert list(loaded.patterns["correction_history"]) == list(sequential.patterns["correction_history"])
+    engine.dispose()
+
+
+def test_other_workers_reload_ring_after_rebuild(engine):
+    """Test a worker's refresh picks up the correction ring a replay rewrote"""
+    _seed(engine, 100)
+    worker = LearningSystem(engine=engine, history_size=5, persist=True)
+    worker.load()
+    assert list(worker.patterns["correction_history"]) == []
+
+    rebuild_learning(engine, chunk_size=30, history_size=5)
+    worker.refresh()
+
+    ring = list(worker.patterns["correction_history"])
+    assert len(ring) == 5 and all(record["sync_op_id"] for record in ring)
+
+
+def test_partitions_are_capped(tmp_path):
+    """Test the process count never exceeds MAX_PARTITIONS"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'replay.db'}")
+    SQLModel.metadata.create_all(engine)
+    _seed(engine, 20)
+    with patch("core.learning_replay.MAX_PARTITIONS", 2):
+        stats = rebuild_learning(engine, partitions=10_000, chunk_size=10, history_size=5, dry_run=True)
+    assert stats["partitions"] == 2 and stats["rows"] == 20
+    engine.dispose()
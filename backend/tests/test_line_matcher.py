@@ -0,0 +1,152 @@
+"""
+Line Item Matcher Tests
+"""
+import itertools
+import random
+import sys
+import time
+from unittest.mock import MagicMock, patch
+import numpy as np
+import pytest
+
+# Mock config before importing
+sys.modules.setdefault('config', MagicMock(settings=MagicMock()))
+
+from core.line_matcher import _hungarian, match_line_items, solve_assignment
+
+
+def _po_lines():
+    return [
+        {"lineNumber": 1, "description": "Hex bolt M8 x 40 zinc", "quantity": 100, "unitPrice": 0.42},
+        {"lineNumber": 2, "description": "Flat washer M8", "quantity": 200, "unitPrice": 0.05},
+        {"lineNumber": 3, "description": "Nylon lock nut M8", "quantity": 100, "unitPrice": 0.11},
+    ]
+
+
+def test_hungarian_is_optimal():
+    """Test the NumPy solver finds the minimum-cost assignment"""
+    rng = np.random.default_rng(5)
+    for _ in range(100):
+        rows, cols = int(rng.integers(1, 6)), int(rng.integers(1, 6))
+        cost = rng.random((rows, cols))
+        if rows <= cols:
+            row_index, col_index = _hungarian(cost)
+            best = min(sum(cost[i, p[i]] for i in range(rows)) for p in itertools.permutations(range(cols), rows))
+        else:
+            row_index, col_index = solve_assignment(cost)
+            best = min(sum(cost[p[j], j] for j in range(cols)) for p in itertools.permutations(range(rows), cols))
+        assert len(set(row_index)) == len(set(col_index)) == min(rows, cols)
+        assert cost[row_index, col_index].sum() == pytest.approx(best)
+
+
+def test_lines_paired_regardless_of_order():
+    """Test invoice lines find their PO lines by description, price and quantity"""
+    invoice_lines = [
+        {"line_number": 1, "description": "LOCK NUT, NYLON, M8", "quantity": 50, "unit_price": 0.11},
+        {"line_number": 2, "description": "M8x40 HEX BOLT ZINC", "quantity": 50, "unit_price": 0.42},
+    ]
+    result = match_line_items(invoice_lines, _po_lines(), {"1": 60, "3": {"quantity": 50}})
+
+    assert [line["po_line_number"] for line in result["lines"]] == ["3", "1"]
+    assert result["unmatched_po_lines"] == ["2"]
+    # Partial shipment: invoiced quantities are within what was received
+    assert all(line["within_tolerance"] for line in result["lines"])
+    assert result["auto_approvable"]
+
+
+def test_variances_reported():
+    """Test price and quantity variances flag a line"""
+    invoice_lines = [{"description": "Hex bolt M8 x 40 zinc", "quantity": 80, "unit_price": 0.50}]
+    result = match_line_items(invoice_lines, _po_lines(), {"1": 60})
+
+    line = result["lines"][0]
+    assert line["po_line_number"] == "1"
+    assert line["price_variance"] == pytest.approx(0.08)
+    assert line["price_variance_pct"] == pytest.approx(19.05)
+    assert line["quantity_variance"] == 20
+    assert line["amount_variance"] == pytest.approx(6.4)
+    assert not line["within_tolerance"]
+    assert not result["auto_approvable"]
+
+
+def test_nothing_received_is_not_approvable():
+    """Test lines for goods with no receipt need one before approval"""
+    invoice_lines = [{"description": "Hex bolt M8 x 40 zinc", "quantity": 100, "unit_price": 0.42}]
+    result = match_line_items(invoice_lines, _po_lines(), {})
+
+    line = result["lines"][0]
+    assert line["po_line_number"] == "1"
+    assert line["needs_receipt"]
+    assert line["received_quantity"] is None
+    assert line["quantity_variance"] == 100
+    assert not line["within_tolerance"]
+    assert not result["auto_approvable"]
+
+
+def test_unrelated_lines_stay_unmatched():
+    """Test a line with nothing similar on the PO is not forced onto one"""
+    result = match_line_items([{"description": "Freight charge", "quantity": 1, "unit_price": 85.0}], _po_lines())
+    assert result["lines"][0]["po_line"] is None
+    assert not result["auto_approvable"]
+    assert match_line_items([], _po_lines())["auto_approvable"] is False
+
+
+def test_large_blanket_po_is_fast():
+    """Test a 500-line PO matches quickly and correctly"""
+    rng = random.Random(2)
+    words = ["bolt", "nut", "washer", "hex", "steel", "zinc", "bracket", "plate", "gasket", "seal", "valve"]
+    po_lines = [
+        {"lineNumber": n + 1, "description": f"{' '.join(rng.sample(words, 3))} P{n:04d}",
+         "quantity": rng.randint(1, 100), "unitPrice": round(rng.uniform(1, 500), 2)}
+        for n in range(500)
+    ]
+    invoice_lines = [
+        {"description": line["description"].upper(), "quantity": line["quantity"], "unit_price": line["unitPrice"]}
+        for line in po_lines
+    ]
+    rng.shuffle(invoice_lines)
+
+    started = time.perf_counter()
+    result = match_line_items(invoice_lines, po_lines, {str(n + 1): 100 for n in range(500)})
+    elapsed = time.perf_counter() - started
+
+    assert all(
+        po_lines[line["po_line"]]["description"].upper() == line["description"] for line in result["lines"]
+    )
+    assert result["auto_approvable"]
+    assert elapsed < 2.0
+
+
+def _identical_lines(count: int):
+    po_lines = [{"lineNumber": n + 1, "description": "Hex bolt M8", "quantity": 10, "unitPrice": 1.0}
+                for n in range(count)]
+    invoice_lines = [{"description": "HEX BOLT M8", "quantity": 10, "unit_price": 1.0} for _ in range(count)]
+    received = {str(n + 1): 10 for n in range(count)}
+    return invoice_lines, po_lines, received
+
+
+def test_degenerate_500_line_po_is_fast():
+    """Test 500 identical lines (the Hungarian worst case) match in milliseconds"""
+    pytest.importorskip("scipy")
+    invoice_lines, po_lines, received = _identical_lines(500)
+
+    started = time.perf_counter()
+    result = match_line_items(invoice_lines, po_lines, received)
+    elapsed = time.perf_counter() - started
+
+    assert len({line["po_line"] for line in result["lines"]}) == 500
+    assert result["auto_approvable"]
+    assert elapsed < 0.5
+
+
+def test_large_matrix_without_scipy_is_paired_greedily():
+    """Test the fallback keeps the exact solver to small matrices"""
+    invoice_lines, po_lines, _ = _identical_lines(500)
+    with patch("core.line_matcher.SCIPY_AVAILABLE", False), \
+            patch("core.line_matcher._hungarian", side_effect=AssertionError):
+        started = time.perf_counter()
+        result = match_line_items(invoice_lines, po_lines)
+        elapsed = time.perf_counter() - started
+
+    assert len({line["po_line"] for line in result["lines"]}) == 500
+    assert elapsed < 2.0
@@ -0,0 +1,209 @@
+"""
+PO Matcher and PO Index Tests
+"""
+import random
+import sys
+import time
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+import pytest
+
+# Mock config before importing
+sys.modules.setdefault('config', MagicMock(settings=MagicMock()))
+
+from models import PurchaseOrder, VendorInvoice
+from core.matcher import POMatcher
+from core.po_index import POIndex
+
+
+def _po(po_number: str, vendor_name: str = "Acme Corp", total_amount: float = 1000.0) -> PurchaseOrder:
+    return PurchaseOrder(po_number=po_number, vendor_name=vendor_name, total_amount=total_amount)
+
+
+def _invoice(po_numbers, vendor_name: str = "Acme Corp", total_amount: float = 1000.0) -> VendorInvoice:
+    return VendorInvoice(
+        invoice_number="INV-1",
+        vendor_name=vendor_name,
+        total_amount=total_amount,
+        po_numbers=po_numbers,
+        file_path="/tmp/x.pdf",
+        file_type="pdf",
+        file_size=1
+    )
+
+
+def _scan_match(invoice: VendorInvoice, pos):
+    """The nested scans the index replaces"""
+    matcher = POMatcher()
+    for po_number in invoice.po_numbers:
+        for po in pos:
+            if po.po_number == po_number:
+                return po
+    for po_number in invoice.po_numbers:
+        for po in pos:
+            if matcher._fuzzy_match_po_number(po_number, po.po_number):
+                return po
+    for po in pos:
+        if matcher._match_by_vendor_and_amount(invoice, po):
+            return po
+    return None
+
+
+def test_exact_match_wins_over_fuzzy():
+    """Test an exact number beats an earlier containment match"""
+    pos = [_po("PO-12345"), _po("12345")]
+    assert POMatcher().match_invoice_to_po(_invoice(["12345"]), pos).po_number == "12345"
+
+
+def test_po_list_is_scanned_without_indexing():
+    """Test a per-call PO list is matched directly, not indexed first"""
+    pos = [_po(f"PO-{n:04d}", total_amount=100.0 + n) for n in range(200)]
+    matcher = POMatcher()
+    with patch("core.matcher.POIndex", side_effect=AssertionError):
+        assert matcher.match_invoice_to_po(_invoice(["PO-0150"]), pos) is pos[150]
+        assert matcher.match_invoice_to_po(_invoice(["po 0042"]), pos) is pos[42]
+        assert matcher.match_invoice_to_po(_invoice(["ZZZZ"], total_amount=160.0), pos) is pos[53]
+
+
+def test_unloaded_index_is_an_error():
+    """Test matching without POs, a session or a loaded index doesn't silently miss"""
+    matcher = POMatcher()
+    with pytest.raises(RuntimeError):
+        matcher.match_invoice_to_po(_invoice(["PO-1"]))
+
+    matcher.load_purchase_orders([])
+    assert matcher.match_invoice_to_po(_invoice(["PO-1"])) is None
+
+
+def test_fuzzy_match_by_containment():
+    """Test normalized numbers match when one contains the other"""
+    matcher = POMatcher()
+    matcher.load_purchase_orders([_po("PO-2024-0042", vendor_name="Other")])
+    assert matcher.match_invoice_to_po(_invoice(["po 20240042"], vendor_name="x")).po_number == "PO-2024-0042"
+    assert matcher.match_invoice_to_po(_invoice(["2024-0042"], vendor_name="x")).po_number == "PO-2024-0042"
+    assert matcher.match_invoice_to_po(_invoice(["XPO20240042Z"], vendor_name="x")).po_number == "PO-2024-0042"
+
+
+def test_vendor_and_amount_match_within_tolerance():
+    """Test vendor containment plus a total within 5% of the PO"""
+    index = POIndex([_po("A1", "Acme Corporation", 1000.0), _po("B1", "Acme", 2000.0)])
+    po, method = index.match(["ZZZZ"], "ACME", 1049.0)
+    assert (po.po_number, method) == ("A1", "vendor_amount")
+    assert index.match(["ZZZZ"], "Acme", 1051.0) == (None, None)
+    assert index.match(["ZZZZ"], "Globex", 1000.0) == (None, None)
+
+
+def test_incremental_updates():
+    """Test add, update and remove keep the index consistent"""
+    index = POIndex([_po("PO-1", total_amount=100.0), _po("PO-2", total_amount=500.0)])
+    assert index.match(["x"], "acme corp", 500.0)[0].po_number == "PO-2"
+
+    index.update(_po("PO-2", total_amount=900.0))
+    assert index.match(["x"], "acme corp", 500.0) == (None, None)
+    assert index.match(["x"], "acme corp", 900.0)[0].po_number == "PO-2"
+
+    assert index.remove("PO-1")
+    assert not index.remove("PO-1")
+    assert "PO-1" not in index
+    assert index.match(["PO-1"], "x", 0) == (None, None)
+    assert len(index) == 1
+
+
+def test_index_agrees_with_scan():
+    """Test the index picks the same PO as scanning the list in order"""
+    rng = random.Random(7)
+    vendors = ["Acme Corp", "Acme", "Globex Inc", "Initech", "Umbrella Co", "Globex"]
+    pos = [
+        _po(
+            f"{rng.choice(['PO-', 'PO ', '', 'po'])}{rng.randint(1, 400):04d}",
+            rng.choice(vendors),
+            round(rng.uniform(50, 5000), 2)
+        )
+        for _ in range(300)
+    ]
+    pos = list({po.po_number: po for po in pos}.values())
+    index = POIndex(pos)
+
+    for _ in range(300):
+        invoice = _invoice(
+            [f"{rng.choice(['', 'PO', 'P0-'])}{rng.randint(1, 500):0{rng.choice([2, 4, 5])}d}"
+             for _ in range(rng.randint(1, 2))],
+            rng.choice(vendors + ["acme", "Soylent"]),
+            round(rng.uniform(50, 5000), 2)
+        )
+        expected = _scan_match(invoice, pos)
+        po, _ = index.match(invoice.po_numbers, invoice.vendor_name, invoice.total_amount)
+        assert po is expected
+
+
+def test_match_is_fast_on_large_index():
+    """Test matching against 40k POs stays well under a millisecond on average"""
+    rng = random.Random(3)
+    words = ["".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(4, 9))) for _ in range(600)]
+    vendors = [f"{rng.choice(words)} {rng.choice(words)} {rng.choice(['Inc', 'LLC', 'Corp', ''])}" for _ in range(2000)]
+    index = POIndex(
+        SimpleNamespace(po_number=f"PO-{n:06d}", vendor_name=vendors[n % 2000], total_amount=100.0 + n)
+        for n in range(40000)
+    )
+    started = time.perf_counter()
+    for n in range(1000):
+        index.match([f"PO-{n * 37:06d}"], vendors[n % 2000], 100.0 + n)
+        index.match(["UNKNOWN"], vendors[n % 2000], 100.0 + n)
+    assert (time.perf_counter() - started) / 2000 < 0.001
+
+
+def test_match_batch_agrees_with_pairwise_confidence():
+    """Test batch scores equal calculate_match_confidence for every pair"""
+    rng = random.Random(11)
+    vendors = ["Acme Corp", "Acme", "acme corp", "Globex Inc", "Initech", ""]
+    pos = [
+        _po(f"{rng.choice(['PO-', ''])}{rng.randint(1, 60):03d}", rng.choice(vendors[:-1]),
+            rng.choice([1000.0, 1030.0, 990.0, 2000.0, 0.0]))
+        for _ in range(80)
+    ]
+    invoices = [
+        _invoice(
+            [f"{rng.choice(['PO', ''])}{rng.randint(1, 80):03d}" for _ in range(rng.randint(0, 2))],
+            rng.choice(vendors),
+            rng.choice([1000.0, 1040.0, 2000.0, 0.0])
+        )
+        for _ in range(60)
+    ]
+    matcher = POMatcher()
+    results = matcher.match_batch(invoices, pos, top_k=len(pos))
+
+    for invoice, ranked in zip(invoices, results):
+        expected = sorted(
+            ((i, matcher.calculate_match_confidence(invoice, po)) for i, po in enumerate(pos)),
+            key=lambda pair: (-pair[1], pair[0])
+        )
+        expected = [(pos[i], score) for i, score in expected if score > 0]
+        assert [(po.po_number, score) for po, score in ranked] == \
+            [(po.po_number, score) for po, score in expected]
+
+
+def test_match_batch_top_k_and_chunking():
+    """Test top-k ranking is unchanged when invoices are scored in chunks"""
+    pos = [_po(f"PO-{n:04d}", f"Vendor {n % 5}", 100.0 * (n + 1)) for n in range(50)]
+    invoices = [_invoice([f"PO-{n:04d}"], f"Vendor {n % 5}", 100.0 * (n + 1)) for n in range(50)]
+    matcher = POMatcher()
+
+    whole = matcher.match_batch(invoices, pos, top_k=2)
+    with patch("core.matcher._BATCH_CELLS", 120):
+        chunked = matcher.match_batch(invoices, pos, top_k=2)
+
+    assert [[(po.po_number, score) for po, score in ranked] for ranked in whole] == \
+        [[(po.po_number, score) for po, score in ranked] for ranked in chunked]
+    assert whole[7][0] == (pos[7], 100.0)
+    assert len(whole[7]) == 2
+    assert matcher.match_batch(invoices, [], top_k=2) == [[] for _ in invoices]
+
+
+def test_vendor_names_are_canonicalized():
+    """Test legal suffixes and punctuation don't prevent a vendor match"""
+    index = POIndex([_po("A1", "Acme Corporation", 1000.0)])
+    assert index.match(["ZZZZ"], "ACME Corp.", 1000.0)[0].po_number == "A1"
+    assert index.match(["ZZZZ"], "Acme Corp", 1000.0)[0].po_number == "A1"
+
+    matcher = POMatcher()
+    assert matcher.calculate_match_confidence(_invoice(["ZZZZ"], "ACME Corp."), _po("A1", "Acme Corporation")) == 50.0
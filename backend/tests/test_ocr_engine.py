@@ -0,0 +1,52 @@
+"""
+OCR Engine Tests
+"""
+import sys
+from unittest.mock import MagicMock
+
+# Mock config before importing
+sys.modules.setdefault('config', MagicMock(settings=MagicMock()))
+
+from PIL import Image
+from core import ocr_engine
+from core.ocr_engine import OCREngine, _combine, _ocr_image
+
+
+def test_words_grouped_into_positioned_lines(monkeypatch):
+    """Test Tesseract words become one block per line, top to bottom"""
+    tesseract = MagicMock()
+    tesseract.image_to_data.return_value = {
+        "text": ["Total", "Due", "", "Invoice", "#A-17", "noise"],
+        "conf": ["96", "94", "-1", "91", "89", "-1"],
+        "block_num": [2, 2, 2, 1, 1, 1],
+        "par_num": [1, 1, 1, 1, 1, 1],
+        "line_num": [1, 1, 1, 1, 1, 1],
+        "left": [500, 560, 0, 100, 180, 0],
+        "top": [900, 900, 0, 100, 100, 0],
+    }
+    monkeypatch.setattr(ocr_engine, "pytesseract", tesseract, raising=False)
+
+    page = _ocr_image(Image.new("RGB", (1000, 1000), "white"), page_number=1, lang="eng")
+
+    assert [block.text for block in page.blocks] == ["Invoice #A-17", "Total Due"]
+    assert (page.blocks[0].x, page.blocks[0].y) == (0.1, 0.1)
+    assert page.text == "Invoice #A-17\nTotal Due"
+    assert page.confidence == (96 + 94 + 91 + 89) / 4
+
+
+def test_combine_pages():
+    """Test blank pages don't drag down the overall confidence"""
+    pages = [
+        ocr_engine.OCRPage(text="Invoice 1", blocks=[], confidence=90.0),
+        ocr_engine.OCRPage(text="", blocks=[], confidence=0.0),
+    ]
+
+    result = _combine(pages)
+
+    assert result.confidence == 90.0
+    assert result.layout.text.startswith("Invoice 1")
+
+
+def test_disabled_engine_is_unavailable():
+    """Test the OCR tier can be switched off"""
+    assert not OCREngine(renderer=MagicMock(), enabled=False).available
@@ -0,0 +1,122 @@
+"""
+Page Cache Tests
+"""
+import pytest
+import sys
+from unittest.mock import MagicMock, patch
+
+# Mock config before importing
+sys.modules.setdefault('config', MagicMock(settings=MagicMock()))
+
+from core.image_encoder import EncodedImage, EncodingProfile, PNG_PROFILE
+from core.page_cache import PageImageCache
+from core.pdf_renderer import PDFRenderer, PDFIUM_AVAILABLE
+
+JPEG_PROFILE = EncodingProfile()
+
+
+def _image(size: int = 100) -> EncodedImage:
+    return EncodedImage(data=b"x" * size, mime_type="image/jpeg", width=10, height=20, original_bytes=size * 2)
+
+
+def test_put_and_get_pages_roundtrip(temp_storage):
+    """Test stored pages come back intact, keyed by DPI and profile"""
+    cache = PageImageCache(str(temp_storage / "pages"))
+    cache.put_pages("abc", 200, JPEG_PROFILE, {1: _image(), 3: _image(50)}, page_count=4)
+
+    found = cache.get_pages("abc", 200, JPEG_PROFILE, [1, 2, 3])
+    assert sorted(found) == [1, 3]
+    assert found[3].data == b"x" * 50
+    assert found[1].width == 10 and found[1].original_bytes == 200
+    assert cache.page_count("abc", 200, JPEG_PROFILE) == 4
+
+    # Different DPI or profile is a different entry
+    assert cache.get_pages("abc", 150, JPEG_PROFILE, [1]) == {}
+    assert cache.get_pages("abc", 200, PNG_PROFILE, [1]) == {}
+    assert cache.page_count("abc", 150, JPEG_PROFILE) is None
+
+    stats = cache.stats()
+    assert stats["hits"] == 2
+    assert stats["misses"] == 3
+
+
+def test_put_pages_merges_with_existing_entry(temp_storage):
+    """Test later renders add pages without losing earlier ones"""
+    cache = PageImageCache(str(temp_storage / "pages"))
+    cache.put_pages("abc", 200, JPEG_PROFILE, {1: _image()}, page_count=2)
+    cache.put_pages("abc", 200, JPEG_PROFILE, {2: _image()})
+
+    assert sorted(cache.get_pages("abc", 200, JPEG_PROFILE, [1, 2])) == [1, 2]
+    assert cache.page_count("abc", 200, JPEG_PROFILE) == 2
+
+
+def test_evicts_least_recently_used_entries(temp_storage):
+    """Test size-based eviction keeps recently used entries"""
+    cache = PageImageCache(str(temp_storage / "pages"), max_bytes=2500)
+    cache.put_pages("a", 200, JPEG_PROFILE, {1: _image(1000)})
+    cache.put_pages("b", 200, JPEG_PROFILE, {1: _image(1000)})
+    cache.get_pages("a", 200, JPEG_PROFILE, [1])
+    cache.put_pages("c", 200, JPEG_PROFILE, {1: _image(1000)})
+
+    assert cache.get_pages("b", 200, JPEG_PROFILE, [1]) == {}
+    assert 1 in cache.get_pages("a", 200, JPEG_PROFILE, [1])
+    assert 1 in cache.get_pages("c", 200, JPEG_PROFILE, [1])
+    assert cache.stats()["evictions"] == 1
+
+
+def test_index_is_rebuilt_from_disk(temp_storage):
+    """Test a new process finds pages cached by an earlier one"""
+    PageImageCache(str(temp_storage / "pages")).put_pages("abc", 200, JPEG_PROFILE, {1: _image()}, page_count=1)
+
+    cache = PageImageCache(str(temp_storage / "pages"))
+    assert 1 in cache.get_pages("abc", 200, JPEG_PROFILE, [1])
+    assert cache.stats()["entries"] == 1
+
+
+def test_sees_pages_cached_by_another_process(temp_storage):
+    """Test a loaded index doesn't hide entries another worker wrote later"""
+    worker_a = PageImageCache(str(temp_storage / "pages"))
+    worker_b = PageImageCache(str(temp_storage / "pages"))
+    assert worker_a.get_pages("abc", 200, JPEG_PROFILE, [1]) == {}
+
+    worker_b.put_pages("abc", 200, JPEG_PROFILE, {1: _image()}, page_count=3)
+
+    assert 1 in worker_a.get_pages("abc", 200, JPEG_PROFILE, [1])
+    assert worker_a.page_count("abc", 200, JPEG_PROFILE) == 3
+
+
+def test_max_bytes_bounds_the_shared_directory(temp_storage):
+    """Test eviction counts entries written by other workers"""
+    worker_a = PageImageCache(str(temp_storage / "pages"), max_bytes=2500)
+    worker_b = PageImageCache(str(temp_storage / "pages"), max_bytes=2500)
+    worker_a.put_pages("a", 200, JPEG_PROFILE, {1: _image(1000)})
+    worker_a.put_pages("b", 200, JPEG_PROFILE, {1: _image(1000)})
+    worker_b.put_pages("c", 200, JPEG_PROFILE, {1: _image(1000)})
+
+    assert worker_a.get_pages("a", 200, JPEG_PROFILE, [1]) == {}
+    assert 1 in worker_a.get_pages("c", 200, JPEG_PROFILE, [1])
+    assert worker_b.stats()["evictions"] == 1
+
+
+@pytest.mark.asyncio
+@pytest.mark.skipif(not PDFIUM_AVAILABLE, reason="pypdfium2 not installed")
+async def test_second_render_is_served_from_cache(temp_storage):
+    """Test re-rendering the same file skips rasterization"""
+    from PIL import Image
+    pages = [Image.new("RGB", (612, 792), color) for color in ("white", "gray")]
+    pdf_path = str(temp_storage / "two_pages.pdf")
+    pages[0].save(pdf_path, save_all=True, append_images=pages[1:])
+
+    cache = PageImageCache(str(temp_storage / "pages"))
+    renderer = PDFRenderer(max_workers=1, backend="pdfium", page_cache=cache)
+    try:
+        first = await renderer.render_pages(pdf_path, max_pages=5, dpi=72)
+        with patch.object(renderer, "map_pages") as mock_map, patch.object(renderer, "run_in_pool") as mock_pool:
+            second = await renderer.render_pages(pdf_path, max_pages=5, dpi=72)
+    finally:
+        renderer.shutdown()
+
+    assert len(first) == 2
+    assert [page.data for page in second] == [page.data for page in first]
+    mock_map.assert_not_called()
+    mock_pool.assert_not_called()
@@ -0,0 +1,45 @@
+"""
+Page Selector Tests
+"""
+from core.page_selector import score_page, select_pages
+
+INVOICE = "Invoice Number: INV-1\nInvoice Date: 01/15/2024\nBill To: Acme\nPO Number: PO-4001"
+LINES = "\n".join(f"{n} Widget {n} 12.50 {12.5 * n:.2f}" for n in range(1, 20))
+TOTALS = "Subtotal: 100.00\nTax: 8.00\nTotal Due: 108.00"
+PACKING = "PACKING SLIP\nPO Number: PO-4001\nWidget 1 pcs\nWidget 2 pcs"
+CERTIFICATE = "CERTIFICATE OF CONFORMANCE\nParts for PO-4001 conform to drawing rev C."
+
+
+def test_packing_lists_and_certificates_are_not_relevant():
+    """Test attachments with no money on them are recognized"""
+    assert not score_page(1, PACKING).relevant
+    assert not score_page(1, CERTIFICATE).relevant
+    assert score_page(1, INVOICE).relevant
+    assert score_page(1, TOTALS).totals
+    assert score_page(1, LINES).table_rows >= 3
+
+
+def test_selects_invoice_pages_from_long_document():
+    """Test invoice, line-item and totals pages are kept, attachments skipped"""
+    pages = [INVOICE + "\n" + LINES, LINES, LINES + "\n" + TOTALS] + [PACKING] * 5 + [CERTIFICATE] * 10
+
+    assert select_pages(pages, max_pages=5) == [1, 2, 3]
+
+
+def test_prefers_header_totals_and_po_pages_when_over_budget():
+    """Test the header and last totals page win over extra line-item pages"""
+    pages = [INVOICE] + [LINES] * 8 + [TOTALS]
+
+    selected = select_pages(pages, max_pages=3)
+
+    assert selected[0] == 1
+    assert selected[-1] == 10
+    assert len(selected) == 3
+
+
+def test_scans_and_unclassifiable_text_fall_back():
+    """Test no text means no selection, and no signal means the first pages"""
+    assert select_pages(["", "  "], max_pages=5) is None
+    assert select_pages([PACKING] * 8, max_pages=5) == [1, 2, 3, 4, 5]
+    # Image-only pages of a partly digital PDF are kept
+    assert select_pages([INVOICE, "", CERTIFICATE], max_pages=5) == [1, 2]
@@ -0,0 +1,118 @@
+"""
+Parse Cache Tests
+"""
+import asyncio
+import pytest
+import sys
+from unittest.mock import MagicMock
+
+# Mock config before importing
+mock_settings = MagicMock()
+sys.modules['config'] = MagicMock(settings=mock_settings)
+
+from core.parse_cache import ParseCache, hash_bytes, hash_file
+
+
+def test_key_depends_on_model_and_prompt_version():
+    """Test cache key changes with model and prompt version"""
+    digest = hash_bytes(b"invoice bytes")
+
+    key = ParseCache.make_key(digest, "gpt-4o", "1")
+
+    assert key == ParseCache.make_key(digest, "gpt-4o", "1")
+    assert key != ParseCache.make_key(digest, "gpt-4o-mini", "1")
+    assert key != ParseCache.make_key(digest, "gpt-4o", "2")
+
+
+def test_hash_file_matches_hash_bytes(temp_storage):
+    """Test file hashing matches in-memory hashing"""
+    path = temp_storage / "invoice.pdf"
+    path.write_bytes(b"x" * 3_000_000)
+
+    assert hash_file(str(path), chunk_size=1024) == hash_bytes(b"x" * 3_000_000)
+
+
+def test_persists_across_instances(temp_storage):
+    """Test entries survive a restart"""
+    cache = ParseCache(str(temp_storage))
+    cache.set("abc", {"invoice_number": "INV-1", "confidence": 90.0})
+
+    reloaded = ParseCache(str(temp_storage))
+
+    assert reloaded.get("abc") == {"invoice_number": "INV-1", "confidence": 90.0}
+
+
+def test_sees_entries_written_by_another_process(temp_storage):
+    """Test a loaded index doesn't hide entries another worker wrote later"""
+    worker_a = ParseCache(str(temp_storage))
+    worker_b = ParseCache(str(temp_storage))
+    assert worker_a.get("abc") is None
+
+    worker_b.set("abc", {"invoice_number": "INV-1"})
+
+    assert worker_a.get("abc") == {"invoice_number": "INV-1"}
+
+
+def test_eviction_counts_other_processes_entries(temp_storage):
+    """Test max_entries bounds the shared directory, not each worker's writes"""
+    worker_a = ParseCache(str(temp_storage), max_entries=3)
+    worker_b = ParseCache(str(temp_storage), max_entries=3)
+    for n in range(3):
+        worker_a.set(f"a{n}", {"n": n})
+    for n in range(3):
+        worker_b.set(f"b{n}", {"n": n})
+
+    assert len(list(temp_storage.glob("*.json"))) == 3
+    assert worker_a.get("b2") == {"n": 2}
+    assert worker_b.evictions == 3
+
+
+def test_lru_eviction(temp_storage):
+    """Test least recently used entry is evicted"""
+    cache = ParseCache(str(temp_storage), max_entries=2)
+    cache.set("a", {"n": 1})
+    cache.set("b", {"n": 2})
+    cache.get("a")
+    cache.set("c", {"n": 3})
+
+    assert cache.get("b") is None
+    assert cache.get("a") == {"n": 1}
+    assert cache.get("c") == {"n": 3}
+    assert cache.evictions == 1
+
+
+@pytest.mark.asyncio
+async def test_in_flight_requests_share_one_parse(temp_storage):
+    """Test concurrent identical requests call the parser once"""
+    cache = ParseCache(str(temp_storage))
+    calls = 0
+
+    async def parse():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return {"invoice_number": "INV-1", "confidence": 95.0}
+
+    results = await asyncio.gather(*[cache.get_or_parse("k", parse) for _ in range(5)])
+    again = await cache.get_or_parse("k", parse)
+
+    assert calls == 1
+    assert all(r["invoice_number"] == "INV-1" for r in results)
+    assert again["invoice_number"] == "INV-1"
+    stats = cache.stats()
+    assert stats["misses"] == 1
+    assert stats["coalesced"] == 4
+    assert stats["hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_failed_results_not_stored(temp_storage):
+    """Test results rejected by should_store are not cached"""
+    cache = ParseCache(str(temp_storage))
+
+    async def parse():
+        return {"error": "API Error", "confidence": 0.0}
+
+    await cache.get_or_parse("k", parse, should_store=lambda r: "error" not in r)
+
+    assert cache.get("k") is None
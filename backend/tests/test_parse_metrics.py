@@ -0,0 +1,135 @@
+"""
+Parse Metrics Tests
+"""
+import sys
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+# Mock config before importing
+mock_settings = MagicMock()
+mock_settings.openai_prompt_price_per_million = 2.50
+mock_settings.openai_cached_prompt_price_per_million = 1.25
+mock_settings.openai_completion_price_per_million = 10.00
+mock_settings.openai_fast_model = "gpt-4o-mini"
+mock_settings.openai_fast_prompt_price_per_million = 0.15
+mock_settings.openai_fast_cached_prompt_price_per_million = 0.075
+mock_settings.openai_fast_completion_price_per_million = 0.60
+
+sys.modules.setdefault('config', MagicMock(settings=mock_settings))
+
+from core.parse_metrics import (
+    ParseMetrics, ParseTrace, current_trace, invoice_metadata, stage, summarize_parse_costs, tracing
+)
+
+
+@pytest.fixture(autouse=True)
+def prices():
+    with patch("core.parse_metrics.settings", mock_settings):
+        yield
+
+
+def test_trace_cost_uses_cached_price():
+    """Test cached prompt tokens are billed at the cached rate"""
+    trace = ParseTrace("pdf")
+    trace.add_call("gpt-4o", 1200.0, {"prompt_tokens": 1_000_000, "completion_tokens": 100_000, "cached_tokens": 400_000})
+
+    # 600k uncached * 2.50 + 400k cached * 1.25 + 100k completion * 10.00
+    assert trace.cost_usd == pytest.approx(1.5 + 0.5 + 1.0)
+    assert trace.to_dict()["model"] == "gpt-4o"
+    assert trace.to_dict()["api_calls"] == 1
+
+
+def test_stages_are_recorded_only_inside_a_trace():
+    """Test stage timing attaches to the current trace and is a no-op outside"""
+    with stage("read"):
+        pass
+    assert current_trace() is None
+
+    trace = ParseTrace("png")
+    with tracing(trace):
+        assert current_trace() is trace
+        with stage("read"):
+            pass
+        with stage("read"):
+            pass
+    assert current_trace() is None
+
+    assert list(trace.stages) == ["read"]
+    assert trace.total_ms >= trace.stages["read"]
+    assert trace.to_dict()["model"] is None
+
+
+def test_prometheus_export():
+    """Test process totals render as Prometheus text"""
+    metrics = ParseMetrics()
+    trace = ParseTrace("pdf")
+    trace.tier = "vision_model"
+    trace.add_stage("api", 1500.0)
+    trace.add_call("gpt-4o", 1500.0, {"prompt_tokens": 1000, "completion_tokens": 200, "cached_tokens": 0})
+    trace.total_ms = 2000.0
+    metrics.record(trace)
+
+    text = metrics.render_prometheus()
+    assert 'plexsync_parse_total{tier="vision_model",file_type="pdf"} 1' in text
+    assert 'plexsync_parse_seconds_sum{tier="vision_model",file_type="pdf"} 2.000000' in text
+    assert 'plexsync_parse_stage_seconds_sum{stage="api"} 1.500000' in text
+    assert 'plexsync_parse_tokens_total{kind="prompt"} 1000' in text
+    assert 'plexsync_model_call_seconds_count{model="gpt-4o"} 1' in text
+
+
+def test_cascade_cost_and_escalation_rate():
+    """Test each call is priced by its own model and escalations are counted"""
+    metrics = ParseMetrics()
+    usage = {"prompt_tokens": 1_000_000, "completion_tokens": 0, "cached_tokens": 0}
+
+    kept = ParseTrace("pdf")
+    kept.add_call("gpt-4o-mini", 400.0, usage)
+    metrics.record(kept)
+
+    escalated = ParseTrace("pdf")
+    escalated.add_call("gpt-4o-mini", 400.0, usage)
+    escalated.escalation_reason = "low_confidence"
+    escalated.add_call("gpt-4o", 1600.0, usage)
+    metrics.record(escalated)
+
+    assert kept.cost_usd == pytest.approx(0.15)
+    assert escalated.cost_usd == pytest.approx(0.15 + 2.50)
+    assert escalated.to_dict()["model"] == "gpt-4o"
+
+    stats = metrics.cascade_stats()
+    assert stats["escalation_rate"] == 0.5
+    assert stats["escalation_reasons"] == {"low_confidence": 1}
+    assert stats["models"]["gpt-4o-mini"] == {"calls": 2, "avg_latency_ms": 400.0}
+
+
+def test_summarize_parse_costs_groups_by_vendor_and_file_type():
+    """Test stored metrics aggregate per vendor and file type"""
+    records = [
+        ("Acme", {"tier": "vision_model", "file_type": "pdf", "total_ms": 3000.0, "cost_usd": 0.02}),
+        ("Acme", {"tier": "text_layer", "file_type": "pdf", "total_ms": 100.0, "cost_usd": 0.0}),
+        ("Globex", {"tier": "ocr_text", "file_type": "png", "total_ms": 900.0, "cost_usd": 0.004}),
+        ("Initech", None),
+    ]
+
+    groups = summarize_parse_costs(records)
+
+    assert [(g["vendor_name"], g["file_type"]) for g in groups] == [("Acme", "pdf"), ("Globex", "png")]
+    acme = groups[0]
+    assert acme["parses"] == 2
+    assert acme["tiers"] == {"vision_model": 1, "text_layer": 1}
+    assert acme["avg_cost_usd"] == pytest.approx(0.01)
+    assert acme["avg_latency_ms"] == pytest.approx(1550.0)
+    assert acme["p95_latency_ms"] == 3000.0
+
+    by_tier = summarize_parse_costs(records, group_by=("vendor_name", "tier"))
+    assert len(by_tier) == 3
+
+
+def test_invoice_metadata_keeps_existing_keys():
+    """Test parse metrics are merged into an invoice's extra_metadata"""
+    parsed = {"parse_metrics": {"tier": "cache"}, "selected_pages": [1, 3]}
+    assert invoice_metadata({"source": "email"}, parsed) == {
+        "source": "email", "parse_metrics": {"tier": "cache"}, "selected_pages": [1, 3]
+    }
+    assert invoice_metadata(None, {}) == {"parse_metrics": None, "selected_pages": None}
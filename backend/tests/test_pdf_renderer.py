@@ -0,0 +1,102 @@
+"""
+PDF Renderer Tests
+"""
+import pytest
+from io import BytesIO
+from PIL import Image
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock
+
+# Mock config before importing
+mock_settings = MagicMock()
+sys.modules['config'] = MagicMock(settings=mock_settings)
+
+from core.pdf_renderer import PDFRenderer, PDFIUM_AVAILABLE
+
+
+@pytest.fixture
+def three_page_pdf(temp_storage):
+    """Create a real 3-page PDF"""
+    pages = [Image.new("RGB", (612, 792), color) for color in ("white", "gray", "black")]
+    pdf_path = temp_storage / "three_pages.pdf"
+    pages[0].save(pdf_path, save_all=True, append_images=pages[1:])
+    return str(pdf_path)
+
+
+@pytest.mark.asyncio
+@pytest.mark.skipif(not PDFIUM_AVAILABLE, reason="pypdfium2 not installed")
+async def test_pdfium_renders_pages_in_order(three_page_pdf):
+    """Test pages are rendered in memory, capped and in page order"""
+    renderer = PDFRenderer(max_workers=2, backend="pdfium")
+    try:
+        pages = await renderer.render_pages(three_page_pdf, max_pages=2, dpi=72)
+    finally:
+        renderer.shutdown()
+
+    assert len(pages) == 2
+    first, second = (Image.open(BytesIO(page.data)) for page in pages)
+    assert first.size == (612, 792)
+    assert first.convert("L").getpixel((10, 10)) > second.convert("L").getpixel((10, 10))
+
+
+@pytest.mark.asyncio
+@pytest.mark.skipif(not PDFIUM_AVAILABLE, reason="pypdfium2 not installed")
+async def test_pdfium_renders_in_memory_pdf(three_page_pdf):
+    """Test PDF bytes render without a file on disk"""
+    with open(three_page_pdf, "rb") as f:
+        data = f.read()
+
+    renderer = PDFRenderer(max_workers=2, backend="pdfium")
+    try:
+        pages = await renderer.render_pages(data, max_pages=5, dpi=72)
+    finally:
+        renderer.shutdown()
+
+    assert len(pages) == 3
+    assert Image.open(BytesIO(pages[0].data)).size == (612, 792)
+
+
+@pytest.mark.asyncio
+async def test_render_fails_without_backend(three_page_pdf):
+    """Test a clear error when no backend is installed"""
+    renderer = PDFRenderer(max_workers=1)
+    renderer._backend_order = lambda: []
+
+    with pytest.raises(RuntimeError):
+        await renderer.render_pages(three_page_pdf)
+
+
+class _RecordingExecutor(ThreadPoolExecutor):
+    """Runs pool tasks in threads and records their arguments"""
+
+    def __init__(self):
+        super().__init__(max_workers=2)
+        self.calls = []
+
+    def submit(self, fn, *args, **kwargs):
+        self.calls.append(args)
+        return super().submit(fn, *args, **kwargs)
+
+
+@pytest.mark.asyncio
+@pytest.mark.skipif(not PDFIUM_AVAILABLE, reason="pypdfium2 not installed")
+async def test_in_memory_pdf_is_shared_once(three_page_pdf):
+    """Test a memoryview source reaches page tasks via shared memory, not as bytes"""
+    with open(three_page_pdf, "rb") as f:
+        data = f.read()
+
+    renderer = PDFRenderer(backend="pdfium")
+    executor = _RecordingExecutor()
+    renderer._get_executor = lambda: executor
+    try:
+        pages = await renderer.render_pages(memoryview(data), max_pages=5, dpi=72)
+    finally:
+        executor.shutdown()
+
+    assert len(pages) == 3
+    assert Image.open(BytesIO(pages[2].data)).size == (612, 792)
+    # One count task plus one task per page, none carrying the file itself
+    assert len(executor.calls) == 4
+    assert not any(isinstance(arg, (bytes, memoryview)) for args in executor.calls for arg in args)
+    assert len({args[2] for args in executor.calls[1:]}) == 1
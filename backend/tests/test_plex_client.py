@@ -112,3 +112,17 @@ async def test_sync_invoice_no_received():
         assert result["success"] is False
         assert "No RECEIVED invoices" in result["message"]
 
+
+
+@pytest.mark.asyncio
+async def test_list_purchase_orders_rejects_unknown_envelope():
+    """Test an unrecognised PO response is an error, not an empty page"""
+    client = PlexClient()
+
+    with patch.object(client, '_request', new_callable=AsyncMock) as mock_request:
+        mock_request.return_value = {"items": [{"poNumber": "PO-1"}]}
+        assert await client.list_purchase_orders() == [{"poNumber": "PO-1"}]
+
+        mock_request.return_value = {"data": [{"poNumber": "PO-1"}]}
+        with pytest.raises(ValueError):
+            await client.list_purchase_orders()
@@ -0,0 +1,160 @@
+"""
+PO Mirror Tests
+"""
+import pytest
+import sys
+from unittest.mock import AsyncMock, MagicMock, patch
+
+# Mock config before importing
+sys.modules.setdefault('config', MagicMock(settings=MagicMock()))
+
+from sqlmodel import select
+from models import PurchaseOrder
+from core.matcher import POMatcher
+from core.po_mirror import POMirror, po_from_plex
+
+
+def _plex_po(number: int, status: str = "Open", total: float = 100.0) -> dict:
+    return {
+        "id": f"uuid-{number}",
+        "poNumber": f"PO-{number:04d}",
+        "supplierName": f"Vendor {number % 3}",
+        "totalAmount": total,
+        "currencyCode": "USD",
+        "status": status,
+        "poDate": "2024-03-01T00:00:00Z",
+        "lineItems": [{"description": "Widget", "quantity": 2}],
+    }
+
+
+@pytest.fixture
+def mirror_settings():
+    settings = MagicMock()
+    settings.po_mirror_page_size = 10
+    settings.po_mirror_concurrency = 3
+    settings.po_mirror_batch_size = 7
+    settings.po_mirror_close_min_ratio = 0.5
+    settings.plex_po_open_status = "Open"
+    settings.po_index_in_memory = True
+    with patch("core.po_mirror.settings", settings):
+        yield settings
+
+
+@pytest.fixture
+def matcher():
+    matcher = POMatcher()
+    with patch("core.po_mirror.po_matcher", matcher):
+        yield matcher
+
+
+def _paged(records):
+    async def list_purchase_orders(offset=0, limit=10, **params):
+        return records[offset:offset + limit]
+    return AsyncMock(side_effect=list_purchase_orders)
+
+
+def test_po_from_plex():
+    """Test Plex records map onto PurchaseOrder fields"""
+    row = po_from_plex(_plex_po(7, total="1250.50"))
+    assert row["po_number"] == "PO-0007"
+    assert row["plex_po_id"] == "uuid-7"
+    assert row["vendor_name"] == "Vendor 1"
+    assert row["total_amount"] == 1250.5
+    assert row["status"] == "open"
+    assert str(row["po_date"]) == "2024-03-01"
+    assert po_from_plex({"status": "Open"}) is None
+
+
+@pytest.mark.asyncio
+async def test_full_sync_pages_in_parallel_and_upserts(engine, session, mirror_settings, matcher):
+    """Test the bulk load reads every page and fills table and index"""
+    records = [_plex_po(n) for n in range(45)]
+    mirror = POMirror(engine=engine)
+    with patch("core.po_mirror.plex_client.list_purchase_orders", _paged(records)) as mock_list:
+        assert await mirror.full_sync() == 45
+
+    # 45 records in pages of 10, three pages per wave: two waves
+    assert mock_list.await_count == 6
+    assert {call.kwargs["status"] for call in mock_list.await_args_list} == {"Open"}
+    assert len(session.exec(select(PurchaseOrder)).all()) == 45
+    assert len(matcher.index) == 45
+    assert mirror.watermark is not None
+
+
+@pytest.mark.asyncio
+async def test_delta_sync_updates_and_closes(engine, session, mirror_settings, matcher):
+    """Test deltas upsert changed POs and drop closed ones from the index"""
+    mirror = POMirror(engine=engine)
+    with patch("core.po_mirror.plex_client.list_purchase_orders", _paged([_plex_po(n) for n in range(5)])):
+        await mirror.full_sync()
+
+    changes = [_plex_po(1, total=999.0), _plex_po(2, status="Closed"), _plex_po(9)]
+    with patch("core.po_mirror.plex_client.list_purchase_orders", _paged(changes)) as mock_list:
+        assert await mirror.delta_sync() == 3
+
+    assert "modified_since" in mock_list.await_args.kwargs
+    rows = {po.po_number: po for po in session.exec(select(PurchaseOrder)).all()}
+    assert len(rows) == 6
+    assert rows["PO-0001"].total_amount == 999.0
+    assert rows["PO-0002"].status == "closed"
+    assert "PO-0002" not in matcher.index
+    assert matcher.index.get("PO-0001").total_amount == 999.0
+    assert "PO-0009" in matcher.index
+
+
+@pytest.mark.asyncio
+async def test_full_sync_closes_pos_no_longer_open(engine, session, mirror_settings, matcher):
+    """Test a reload marks local open POs missing from Plex as closed"""
+    mirror = POMirror(engine=engine)
+    with patch("core.po_mirror.plex_client.list_purchase_orders", _paged([_plex_po(n) for n in range(3)])):
+        await mirror.full_sync()
+    with patch("core.po_mirror.plex_client.list_purchase_orders", _paged([_plex_po(0), _plex_po(1)])):
+        await mirror.full_sync()
+
+    po = session.exec(select(PurchaseOrder).where(PurchaseOrder.po_number == "PO-0002")).first()
+    session.refresh(po)
+    assert po.status == "closed"
+    assert len(matcher.index) == 2
+
+
+@pytest.mark.asyncio
+async def test_full_sync_keeps_pos_when_plex_lists_too_few(engine, session, mirror_settings, matcher):
+    """Test an empty or truncated reload doesn't close the local open POs"""
+    mirror = POMirror(engine=engine)
+    with patch("core.po_mirror.plex_client.list_purchase_orders", _paged([_plex_po(n) for n in range(10)])):
+        await mirror.full_sync()
+    for records in ([], [_plex_po(0), _plex_po(1)]):
+        with patch("core.po_mirror.plex_client.list_purchase_orders", _paged(records)):
+            await mirror.full_sync()
+
+    statuses = {po.status for po in session.exec(select(PurchaseOrder)).all()}
+    assert statuses == {"open"}
+    assert len(matcher.index) == 10
+
+
+@pytest.mark.asyncio
+async def test_refresh_po(engine, mirror_settings, matcher):
+    """Test a single unknown PO is fetched into the mirror"""
+    mirror = POMirror(engine=engine)
+    with patch("core.po_mirror.plex_client.get_purchase_order", AsyncMock(return_value=[_plex_po(42)])):
+        po = await mirror.refresh_po("PO-0042")
+    assert po.plex_po_id == "uuid-42"
+    assert "PO-0042" in matcher.index
+
+    with patch("core.po_mirror.plex_client.get_purchase_order", AsyncMock(side_effect=Exception("404"))):
+        assert await mirror.refresh_po("PO-0043") is None
+
+
+def test_upsert_tolerates_rows_inserted_elsewhere(engine, session, mirror_settings, matcher):
+    """Test two mirrors upserting the same new PO don't collide on po_number"""
+    first, second = POMirror(engine=engine), POMirror(engine=engine)
+    assert first._upsert([po_from_plex(_plex_po(5))]) == 1
+    assert second._upsert([po_from_plex(_plex_po(5, total=75.0)), po_from_plex(_plex_po(6))]) == 2
+
+    rows = {po.po_number: po for po in session.exec(select(PurchaseOrder)).all()}
+    assert len(rows) == 2
+    assert rows["PO-0005"].total_amount == 75.0
+    # Core upserts fill the search columns themselves
+    assert rows["PO-0005"].po_number_normalized == "PO0005"
+    assert rows["PO-0005"].vendor_canonical == "vendor 2"
+    assert second.leader is False and second._acquire_leadership() is True
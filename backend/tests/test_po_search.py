@@ -0,0 +1,167 @@
+"""
+PO Search Tests
+"""
+import random
+import sys
+from unittest.mock import MagicMock
+
+# Mock config before importing
+sys.modules.setdefault('config', MagicMock(settings=MagicMock()))
+
+import pytest
+from sqlalchemy import event, inspect, text
+from sqlmodel import Session, SQLModel, create_engine, select
+from sqlmodel.pool import StaticPool
+from models import PurchaseOrder, VendorInvoice
+from core.matcher import POMatcher
+from core.po_index import POIndex
+from core.po_search import create_search_indexes, find_candidates
+
+
+@pytest.fixture
+def search_session(engine, session):
+    create_search_indexes(engine)
+    return session
+
+
+def _add(session, *pos):
+    for po in pos:
+        session.add(po)
+    session.commit()
+
+
+def _invoice(po_numbers, vendor_name="Acme Corp", total_amount=1000.0) -> VendorInvoice:
+    return VendorInvoice(
+        invoice_number="INV-1",
+        vendor_name=vendor_name,
+        total_amount=total_amount,
+        po_numbers=po_numbers,
+        file_path="/tmp/x.pdf",
+        file_type="pdf",
+        file_size=1
+    )
+
+
+def test_search_columns_follow_updates(search_session):
+    """Test normalized columns are set on insert and update"""
+    po = PurchaseOrder(po_number="po-12 345", vendor_name="The Acme Corp.", total_amount=10.0)
+    _add(search_session, po)
+    assert po.po_number_normalized == "PO12345"
+    assert po.vendor_canonical == "acme"
+
+    po.vendor_name = "Globex, Inc."
+    _add(search_session, po)
+    assert search_session.exec(
+        select(PurchaseOrder).where(PurchaseOrder.vendor_canonical == "globex")
+    ).first() is po
+
+
+def test_find_candidates_rules(search_session):
+    """Test number, contained-number and vendor+amount candidates"""
+    _add(
+        search_session,
+        PurchaseOrder(po_number="PO-1001", vendor_name="Acme Corp", total_amount=1000.0),
+        PurchaseOrder(po_number="PO-2002", vendor_name="Acme Corporation", total_amount=980.0),
+        PurchaseOrder(po_number="PO-3003", vendor_name="Globex", total_amount=1000.0),
+        PurchaseOrder(po_number="PO-4004", vendor_name="Acme Corp", total_amount=5000.0),
+        PurchaseOrder(po_number="PO-5005", vendor_name="Acme Corp", total_amount=1000.0, status="closed"),
+    )
+
+    exact = find_candidates(search_session, ["PO-4004"], None, None)
+    assert [po.po_number for po in exact] == ["PO-4004"]
+
+    # "PO 10 01" normalizes to PO1001; "2002" is contained in PO2002
+    fuzzy = find_candidates(search_session, ["PO 10 01", "2002"], None, None)
+    assert {po.po_number for po in fuzzy} == {"PO-1001", "PO-2002"}
+
+    by_vendor = find_candidates(search_session, ["X-1"], "ACME, Inc.", 1000.0)
+    assert [po.po_number for po in by_vendor] == ["PO-1001", "PO-2002"]
+
+    assert find_candidates(search_session, ["PO-5005"], None, None) == []
+
+
+def test_find_candidates_similar_vendor(search_session):
+    """Test trigram-similar vendor names are found through the FTS table"""
+    _add(
+        search_session,
+        PurchaseOrder(po_number="PO-1", vendor_name="Northwind Traders", total_amount=500.0),
+        PurchaseOrder(po_number="PO-2", vendor_name="Contoso Pharmaceuticals", total_amount=500.0),
+    )
+    found = find_candidates(search_session, [], "Northwind Trader", 510.0)
+    assert [po.po_number for po in found] == ["PO-1"]
+
+
+def test_find_candidates_is_one_query(engine, search_session):
+    """Test candidate retrieval issues a single SELECT"""
+    _add(search_session, *(
+        PurchaseOrder(po_number=f"PO-{n:05d}", vendor_name=f"Vendor {n % 7}", total_amount=100.0 + n)
+        for n in range(200)
+    ))
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        found = find_candidates(search_session, ["PO-00042"], "Vendor 3", 150.0, limit=10)
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+    assert len([s for s in statements if s.lstrip().upper().startswith("SELECT")]) == 1
+    assert found[0].po_number == "PO-00042"
+    assert len(found) <= 10
+
+
+def test_match_with_session_agrees_with_index(search_session):
+    """Test database-side matching picks the same PO as the in-memory index"""
+    rng = random.Random(7)
+    vendors = ["Acme Corp", "Globex Inc", "Initech LLC", "Umbrella Co", "Hooli", "Stark Industries"]
+    pos = [
+        PurchaseOrder(
+            po_number=f"PO-{n:04d}", vendor_name=rng.choice(vendors),
+            total_amount=float(rng.randint(100, 2000)),
+            status=rng.choice(["open", "open", "partial", "closed"])
+        )
+        for n in range(300)
+    ]
+    _add(search_session, *pos)
+    open_pos = [po for po in search_session.exec(select(PurchaseOrder).order_by(PurchaseOrder.id))
+                if po.status in ("open", "partial")]
+    index = POIndex(open_pos)
+    matcher = POMatcher()
+
+    for _ in range(100):
+        numbers = rng.choice([
+            [f"PO-{rng.randrange(400):04d}"],
+            [f"po {rng.randrange(300):04d}"],
+            [str(rng.randrange(1000, 9999))],
+        ])
+        invoice = _invoice(numbers, rng.choice(vendors + ["Acme Corporation"]), float(rng.randint(100, 2000)))
+        expected, _ = index.match(invoice.po_numbers, invoice.vendor_name, invoice.total_amount)
+        assert matcher.match_invoice_to_po(invoice, session=search_session) is expected
+
+
+def test_existing_table_is_migrated_and_backfilled():
+    """Test a purchase_orders table from before the search columns is upgraded in place"""
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    with engine.begin() as connection:
+        connection.execute(text(
+            "CREATE TABLE purchase_orders (id INTEGER PRIMARY KEY, created_at DATETIME, updated_at DATETIME, "
+            "po_number VARCHAR UNIQUE, plex_po_id VARCHAR, vendor_code VARCHAR, vendor_name VARCHAR, "
+            "po_type VARCHAR, po_date DATE, expected_delivery_date DATE, total_amount FLOAT, currency VARCHAR, "
+            "status VARCHAR, line_items JSON, received_items JSON, plex_data JSON, department VARCHAR, "
+            "project_code VARCHAR, notes VARCHAR)"
+        ))
+        connection.execute(text(
+            "INSERT INTO purchase_orders (po_number, vendor_name, total_amount, status, po_type, currency) "
+            "VALUES ('po-77 01', 'The Acme Corp.', 250.0, 'open', 'standard', 'USD')"
+        ))
+    SQLModel.metadata.create_all(engine)
+
+    create_search_indexes(engine)
+    create_search_indexes(engine)  # idempotent
+
+    columns = {column["name"] for column in inspect(engine).get_columns("purchase_orders")}
+    assert {"po_number_normalized", "vendor_canonical"} <= columns
+    indexes = {index["name"] for index in inspect(engine).get_indexes("purchase_orders")}
+    assert "ix_purchase_orders_po_number_normalized" in indexes
+    with Session(engine) as session:
+        assert [po.po_number for po in find_candidates(session, ["7701"], None, None)] == ["po-77 01"]
+        assert [po.po_number for po in find_candidates(session, [], "ACME Inc", 250.0)] == ["po-77 01"]
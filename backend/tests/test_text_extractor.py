@@ -0,0 +1,98 @@
+"""
+Text Layer Extractor Tests
+"""
+import pytest
+import sys
+from unittest.mock import MagicMock
+
+# Mock config before importing
+mock_settings = MagicMock()
+sys.modules['config'] = MagicMock(settings=mock_settings)
+
+from core.text_extractor import extract_invoice_fields, fast_path_result
+
+DIGITAL_INVOICE_TEXT = """
+ACME Corporation
+123 Main St, P.O. Box 55
+Springfield, IL 62701
+INVOICE
+Invoice Number: INV-2024-001     Invoice Date: 01/15/2024
+Due Date: Feb 14, 2024
+Customer PO: PO-2024-100
+Remit To: ACME Corporation
+Bill To: Plex Customer Inc.
+Qty  Description   Unit Price   Amount
+10   Widget A      100.00       1,000.00
+5    Widget B      70.00        350.00
+Subtotal: 1,350.00
+Sales Tax (8%): 150.00
+Total Due: $1,500.00
+"""
+
+
+def test_extracts_header_fields():
+    """Test labeled header fields are found and normalized"""
+    fields = extract_invoice_fields(DIGITAL_INVOICE_TEXT)
+
+    assert fields["invoice_number"] == "INV-2024-001"
+    assert fields["vendor_name"] == "ACME Corporation"
+    assert fields["invoice_date"] == "2024-01-15"
+    assert fields["due_date"] == "2024-02-14"
+    assert fields["subtotal"] == 1350.00
+    assert fields["tax_amount"] == 150.00
+    assert fields["total_amount"] == 1500.00
+    assert fields["po_numbers"] == ["PO-2024-100"]
+
+
+def test_po_box_is_not_a_po_number():
+    """Test P.O. Box addresses are not mistaken for PO references"""
+    fields = extract_invoice_fields("Remit to: P.O. Box 1234\nInvoice # 5567")
+
+    assert fields["po_numbers"] == []
+
+
+def test_arithmetic_mismatch_lowers_total_confidence():
+    """Test subtotal + tax != total blocks the fast path"""
+    text = DIGITAL_INVOICE_TEXT.replace("Total Due: $1,500.00", "Total Due: $1,900.00")
+
+    fields = extract_invoice_fields(text)
+
+    assert fields["field_confidence"]["total_amount"] < 90.0
+    assert fast_path_result(text) is None
+
+
+def test_fast_path_result_when_all_required_fields_found():
+    """Test a complete, confident result skips the model"""
+    result = fast_path_result(DIGITAL_INVOICE_TEXT)
+
+    assert result is not None
+    assert result["extraction_method"] == "text_layer"
+    assert result["confidence"] >= 90.0
+    assert result["line_items"] == []
+    assert "field_confidence" in result
+
+
+def test_unlabeled_vendor_is_not_trusted():
+    """Test the customer block is skipped and suffix guesses go to the model"""
+    text = """
+Bill To:
+PlexSync Customer Inc.
+9 Plant Road
+INVOICE
+Invoice Number: INV-9   Invoice Date: 01/15/2024
+PO Number: PO-2024-100
+Total Due: $1,500.00
+"""
+    fields = extract_invoice_fields(text)
+    assert fields["vendor_name"] != "PlexSync Customer Inc."
+    assert fast_path_result(text) is None
+
+    fields = extract_invoice_fields(DIGITAL_INVOICE_TEXT.replace("Remit To: ACME Corporation\n", ""))
+    assert fields["vendor_name"] == "ACME Corporation"
+    assert fields["field_confidence"]["vendor_name"] < 90.0
+
+
+@pytest.mark.parametrize("text", ["", "   ", "Thank you for your business"])
+def test_fast_path_declines_incomplete_text(text):
+    """Test missing fields fall through to the model"""
+    assert fast_path_result(text) is None
@@ -0,0 +1,57 @@
+"""
+Vendor Name Canonicalization Tests
+"""
+import pytest
+import sys
+from unittest.mock import MagicMock
+
+# Mock config before importing
+sys.modules.setdefault('config', MagicMock(settings=MagicMock()))
+
+from core.vendor_names import VendorNames, canonicalize_vendor, vendor_similarity
+
+
+@pytest.mark.parametrize("name,expected", [
+    ("ACME Corp.", "acme"),
+    ("Acme Corporation", "acme"),
+    ("The Boeing Company", "boeing"),
+    ("Smith & Co.", "smith"),
+    ("Grupo Bimbo, S.A. de C.V.", "grupo bimbo"),
+    ("Müller GmbH", "muller"),
+    ("O'Reilly Auto Parts, Inc", "oreilly auto parts"),
+    ("Johnson & Johnson", "johnson and johnson"),
+    ("Inc", "inc"),
+])
+def test_canonicalize_vendor(name, expected):
+    """Test legal suffixes, punctuation and accents are removed"""
+    assert canonicalize_vendor(name) == expected
+
+
+def test_vendor_similarity():
+    """Test trigram similarity tolerates small spelling differences"""
+    assert vendor_similarity("acme tools", "acme tools") == 1.0
+    assert vendor_similarity("acme tools", "acme tool") > 0.6
+    assert vendor_similarity("acme", "globex") == 0.0
+    assert vendor_similarity("ab", "ab") == 0.0
+
+
+def test_aliases_map_onto_one_vendor():
+    """Test learned aliases resolve to the canonical vendor, transitively"""
+    names = VendorNames()
+    assert names.add_alias("Roadrunner Supply", "ACME Corp")
+    assert not names.add_alias("Roadrunner Supply LLC", "Acme Corporation")
+    assert names.canonical("ROADRUNNER SUPPLY, LLC") == "acme"
+
+    assert names.add_alias("Acme", "Acme Holdings")
+    assert names.canonical("Roadrunner Supply") == "acme holdings"
+    assert names.canonical(None) == ""
+
+
+def test_same_vendor():
+    """Test containment, similarity and aliases all count as the same vendor"""
+    names = VendorNames()
+    assert names.same_vendor("ACME Corp.", "Acme Corporation")
+    assert names.same_vendor("Acme", "Acme Industrial Supply")
+    assert names.same_vendor("Fastenal Company", "Fastenall")
+    assert not names.same_vendor("Acme", "Globex")
+    assert not names.same_vendor("", "Acme")